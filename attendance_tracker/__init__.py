@@ -3,6 +3,7 @@
 import csv
 import datetime
 import functools
+import os
 import pathlib
 import random
 import sqlite3
@@ -12,12 +13,34 @@ import flask
 from flask_apscheduler import APScheduler
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from attendance_tracker import assets
+from attendance_tracker.analytics.admission import AdmissionController
+from attendance_tracker.analytics.cache import ResultCache
+from attendance_tracker.analytics.columnar import ColumnarSnapshot
+from attendance_tracker.analytics.live import ChangeFeed
 from attendance_tracker.app import AttendanceTracker
+from attendance_tracker.compression import CompressionMiddleware
 from attendance_tracker.controllers.admin import ADMIN
-from attendance_tracker.controllers.analytics import ANALYTICS
+from attendance_tracker.controllers.analytics import ANALYTICS, single_flight, warm_cache_in_background
 from attendance_tracker.controllers.auth import AUTH
 from attendance_tracker.controllers.ingest import INGEST
+from attendance_tracker.db import (
+    archive,
+    backfill,
+    backup,
+    bulk_import,
+    calendar,
+    export,
+    jobs_lock,
+    maintenance,
+    migrations,
+    rooms,
+    search,
+    upload_jobs,
+)
+from attendance_tracker.db.ingest_log import on_ingest
 from attendance_tracker.email.emailList import send_error_email, send_report_email
+from attendance_tracker.email.idle_watch import IdleWatcher
 from attendance_tracker.types import tables
 
 
@@ -26,15 +49,113 @@ def _init_db(db_path: pathlib.Path) -> None:
     init_db = pathlib.Path("./sqlite/init.sql")
 
     with (
+        jobs_lock.exclusive(db_path),
         sqlite3.connect(db_path) as conn,
         init_db.open("r", encoding="utf-8") as sql,
     ):
         script = sql.read()
         conn.executescript(script)
+        rooms.seed_aliases(conn)
+        calendar.fill(conn)
+        search.build_index(conn)
+        migrations.stamp(conn)  # init.sql already has every migration in it
         show_tables = "SELECT name FROM sqlite_master WHERE type = 'table';"
         print(f"created tables: {conn.execute(show_tables).fetchall()}\n")
 
 
+def _migrate(db_path: pathlib.Path, to: int | None, chunk_rows: int, pause: float) -> None:
+    """Apply pending schema migrations to the db in place, keeping all data."""
+    applied = migrations.migrate(db_path, to, chunk_rows, pause)
+    if not applied:
+        print(f"db is at schema version {migrations.LATEST}, nothing to migrate")
+
+
+def _archive_old_data(db_path: pathlib.Path, archive_dir: pathlib.Path, horizon_days: int) -> None:
+    """Move input_data older than the horizon into compressed monthly partitions."""
+    result = archive.archive_old_rows(db_path, archive_dir, horizon_days)
+    print(f"archived {result.rows} rows older than {result.cutoff} into {result.partitions} partitions")
+
+
+def _backup_db(db_path: pathlib.Path, backup_dir: pathlib.Path, keep: int, pages: int, sleep: float) -> None:
+    """Copy the live db into a gzipped backup without stopping the app, keeping the newest `keep` backups."""
+    result = backup.backup(db_path, backup_dir, keep, pages, sleep)
+    print(
+        f"backed up {result.db_bytes / 2**20:.1f} MiB to {result.path} ({result.backup_bytes / 2**20:.1f} MiB) "
+        f"in {result.seconds:.1f}s, {result.restarts} restarts, {result.rotated} old backups removed"
+    )
+
+
+def _restore_backup(backup_path: str, to: str, force: bool) -> None:
+    """Restore a backup into a db after checking it, a scratch path by default so it can be looked at first."""
+    restored = backup.restore(pathlib.Path(backup_path), pathlib.Path(to), force)
+    print(f"restored {restored} tables from {backup_path} into {to}")
+
+
+def _maintain_db(db_path: pathlib.Path, budget_seconds: float, vacuum_pages: int) -> None:
+    """Refresh planner stats, free unused pages and truncate the WAL, each in small steps."""
+    result = maintenance.run(db_path, budget_seconds, vacuum_pages)
+    for step in result.steps:
+        print(f"{step['step']}: {step.get('error') or step.get('detail', 'done')} in {step['seconds']:.2f}s")
+    before, after = result.bytes_before / 2**20, result.bytes_after / 2**20
+    print(f"db went from {before:.1f} to {after:.1f} MiB in {result.seconds:.1f}s")
+
+
+def _export_data(db_path: pathlib.Path, export_dir: pathlib.Path, retain_days: int | None) -> None:
+    """Export input_data rows added since the last export, optionally deleting old exported rows."""
+    result = export.export_new_rows(db_path, export_dir, retain_days)
+    print(f"export {result.export_id} wrote {result.rows} rows to {len(result.chunks)} chunks, purged {result.purged}")
+
+
+def _backfill(db_path: pathlib.Path, source: str, workers: int | None) -> None:
+    """Load a directory or glob of raw and cleaned report csvs, skipping files already loaded."""
+    files = backfill.find_files(source)
+    if not files:
+        print(f"no csv files found at {source}")
+        return
+
+    stats = backfill.backfill(db_path, files, workers)
+    print(
+        f"loaded {stats.files_loaded} files ({stats.files_skipped} skipped, {stats.files_failed} failed), "
+        f"{stats.rows_inserted} rows inserted, {stats.rows_duplicate} duplicates, "
+        f"{stats.bytes_read / 2**20:.1f} MiB in {stats.seconds:.1f}s"
+    )
+
+
+def _import_clubs(db_path: pathlib.Path, path: str, overwrite: bool) -> None:
+    """Add or update clubs from a csv in club_data column order, all in one transaction."""
+    with sqlite3.connect(db_path) as conn:
+        result = bulk_import.import_clubs(conn, bulk_import.read_csv(pathlib.Path(path)), overwrite)
+    _print_import(result)
+
+
+def _import_rooms(db_path: pathlib.Path, path: str, overwrite: bool) -> None:
+    """Assign rooms to clubs from a building, room_num, club csv, all in one transaction."""
+    with sqlite3.connect(db_path) as conn:
+        result = bulk_import.import_room_assignments(conn, bulk_import.read_csv(pathlib.Path(path)), overwrite)
+    _print_import(result)
+
+
+def _print_import(result: bulk_import.ImportResult) -> None:
+    print(result.summary())
+    for message in result.conflict_messages:
+        print(f"conflict {message}")
+    for message in result.error_messages:
+        print(f"rejected {message}")
+
+
+def _overwrite_option() -> click.Option:
+    return click.Option(
+        ["--overwrite"],
+        is_flag=True,
+        help="apply conflicting rows instead of skipping them, conflicts are reported either way",
+    )
+
+
+def _build_assets(static_dir: pathlib.Path, skip_css: bool) -> None:
+    """Build hashed, precompressed static files for nginx, restart the app afterwards to pick up the new names."""
+    assets.build_assets(static_dir, css=not skip_css)
+
+
 def _load_from_email(db_path: pathlib.Path) -> None:
     """Check the email and download csvs, then loads them into the db."""
     import attendance_tracker.email.download_csv as download_csv
@@ -42,6 +163,12 @@ def _load_from_email(db_path: pathlib.Path) -> None:
     download_csv._load_from_email(db_path)
 
 
+def _watch_email(db_path: pathlib.Path) -> None:
+    """Load report emails as they arrive using IMAP IDLE, runs until interrupted."""
+    with jobs_lock.hold_shared(db_path):  # keeps offline migrations and restore-backup off the db while it runs
+        IdleWatcher(db_path).run()
+
+
 def _send_email_test(db_path: pathlib.Path) -> None:
     """Send a test email to all admin emails."""
     import attendance_tracker.email.emailList as emailList
@@ -95,6 +222,14 @@ def _model_data_with_date():
                 csv_writer.writerow(row)
 
 
+def _serving() -> bool:
+    """Check the app is being created to serve requests, not for a flask cli command like migrate."""
+    if os.environ.get("FLASK_RUN_FROM_CLI") != "true":
+        return True  # gunicorn or a script calling create_app itself
+    ctx = click.get_current_context(silent=True)
+    return ctx is not None and ctx.info_name == "run"
+
+
 def create_app() -> AttendanceTracker:
     """Entry point for flask app."""
     app = AttendanceTracker(__name__, instance_relative_config=True)
@@ -106,6 +241,97 @@ def create_app() -> AttendanceTracker:
         db_path.parent.mkdir(exist_ok=True)
         db_path.touch()
 
+    # get secret to save in config for session handling
+    with pathlib.Path("./.env").open("r", encoding="utf-8") as env:
+        super_secret_key = env.read().strip()
+
+    # register close db to happen at clean up
+    app.teardown_appcontext(app.close_db)
+    app.config.from_mapping(
+        DATABASE=db_path,
+        SECRET_KEY=super_secret_key,
+        ANALYTICS_QUERY_TIMEOUT=5.0,  # seconds before an analytics query is cancelled
+        ANALYTICS_BACKEND="sql",  # "columnar" runs analytics on numpy snapshots, needs numpy
+        COLUMNAR_DIR="./sqlite/columnar",
+        RESULT_CACHE_ENTRIES=256,
+        RESULT_CACHE_BYTES=32 * 1024 * 1024,
+        # set to a path like ./sqlite/result_cache.db to share cached results between workers
+        RESULT_CACHE_DISK=None,
+        RESULT_CACHE_WARM_WORKERS=2,  # max queries run at once while warming after a load
+        SINGLE_FLIGHT_MAX_WAITERS=32,  # requests allowed to wait on one identical in flight query
+        # analytics queries are priced in room days, days in the date range times rooms covered
+        ADMISSION_HEAVY_COST=10_000,  # queries at or above this many room days count as heavy
+        ADMISSION_HEAVY_SLOTS=2,  # heavy queries allowed to run at once per worker, more get a 429
+        ADMISSION_BUCKET_SIZE=100_000,  # room days a client can spend in a burst
+        ADMISSION_REFILL_RATE=1_000,  # room days per second a client's budget refills at
+        ARCHIVE_DIR="./sqlite/archive",
+        ARCHIVE_HORIZON_DAYS=730,  # whole months older than this move out of input_data
+        EXPORT_DIR="./sqlite/exports",
+        UPLOAD_SPOOL_DIR="./sqlite/spool",  # uploaded csvs wait here until a background job loads them
+        UPLOAD_POLL_SECONDS=2,
+        BACKGROUND_JOBS=True,  # scheduler and email watcher, flask cli commands other than run never start them
+        EMAIL_IDLE=False,  # watch the inbox with IMAP IDLE and load reports as soon as they arrive
+        LIVE_POLL_SECONDS=1.0,  # how often each worker checks for loads made by other workers
+        LIVE_MAX_SUBSCRIBERS=200,  # live analytics pages per worker, each holds a thread
+        LIVE_STREAM_SECONDS=300,  # event streams are closed after this, browsers reconnect on their own
+        BACKUP_DIR="./sqlite/backups",  # copy these off the host, they sit on the same volume as the db
+        BACKUP_KEEP=7,  # newest backups kept, older ones are deleted after each backup
+        BACKUP_PAGES_PER_STEP=256,  # db pages copied at a time, other connections get the db in between
+        BACKUP_STEP_SLEEP=0.005,  # seconds slept between steps
+        MAINTENANCE_SECONDS=60,  # time budget for freeing pages in the nightly maintenance run
+        MAINTENANCE_VACUUM_PAGES=512,  # pages freed per step, loads get the db in between steps
+        COMPRESS_MIN_SIZE=500,  # bytes, smaller responses aren't worth compressing
+        COMPRESS_GZIP_LEVEL=6,
+        COMPRESS_BROTLI_QUALITY=4,  # used when brotli is installed, higher gets slow for on the fly compression
+    )
+    app.config.from_prefixed_env()  # FLASK_<NAME> env vars override any of the above
+
+    disk_cache = app.config["RESULT_CACHE_DISK"]
+    app.result_cache = ResultCache(
+        max_entries=app.config["RESULT_CACHE_ENTRIES"],
+        max_bytes=app.config["RESULT_CACHE_BYTES"],
+        disk_path=pathlib.Path(disk_cache) if disk_cache else None,
+    )
+    single_flight.max_waiters = app.config["SINGLE_FLIGHT_MAX_WAITERS"]
+    app.admission = AdmissionController(
+        heavy_cost=app.config["ADMISSION_HEAVY_COST"],
+        heavy_slots=app.config["ADMISSION_HEAVY_SLOTS"],
+        bucket_size=app.config["ADMISSION_BUCKET_SIZE"],
+        refill_rate=app.config["ADMISSION_REFILL_RATE"],
+    )
+    app.wsgi_app = CompressionMiddleware(  # type: ignore
+        app.wsgi_app,
+        min_size=app.config["COMPRESS_MIN_SIZE"],
+        gzip_level=app.config["COMPRESS_GZIP_LEVEL"],
+        brotli_quality=app.config["COMPRESS_BROTLI_QUALITY"],
+    )
+    static_dir = pathlib.Path(app.static_folder)  # type: ignore
+    # url_for("static", ...) points at the hashed files once build-assets has run, plain names until then
+    app.url_defaults(assets.hashed_static_urls(assets.load_manifest(static_dir)))
+    app.jinja_env.globals["chart_js_src"] = assets.chart_js_src(static_dir)
+    app.columnar_snapshot = None
+    if app.config["ANALYTICS_BACKEND"] == "columnar":
+        app.columnar_snapshot = ColumnarSnapshot(pathlib.Path(app.config["COLUMNAR_DIR"]))
+    # recompute dashboard presets as soon as new data lands instead of on first page load
+    warm_after_ingest = functools.partial(
+        warm_cache_in_background,
+        db_path,
+        app.result_cache,
+        app.config["ANALYTICS_QUERY_TIMEOUT"] * 6,  # nobody is waiting, allow longer queries
+        app.config["RESULT_CACHE_WARM_WORKERS"],
+        app.columnar_snapshot,
+    )
+    on_ingest(warm_after_ingest)
+    # open analytics pages hear about new data from this feed, loads in this worker skip the poll wait
+    app.change_feed = ChangeFeed(
+        db_path,
+        poll_seconds=app.config["LIVE_POLL_SECONDS"],
+        max_subscribers=app.config["LIVE_MAX_SUBSCRIBERS"],
+    )
+    on_ingest(app.change_feed.poke)
+    if app.columnar_snapshot is not None:
+        warm_after_ingest()  # catch snapshot up with anything loaded while the app was down
+
     # schedule email jobs for first min of 9am on mondays and 1st of month
     scheduler.add_job(
         func=send_error_email,
@@ -123,7 +349,7 @@ def create_app() -> AttendanceTracker:
         day=1,
         hour=9,
         minute=0,
-        args=[db_path],
+        args=[db_path, app.columnar_snapshot],
     )
     # schedule email job for every day at 3am to load new data
     scheduler.add_job(
@@ -134,30 +360,170 @@ def create_app() -> AttendanceTracker:
         minute=0,
         args=[db_path],
     )
-    scheduler.start()
-
-    # get secret to save in config for session handling
-    with pathlib.Path("./.env").open("r", encoding="utf-8") as env:
-        super_secret_key = env.read().strip()
-
-    # register close db to happen at clean up
-    app.teardown_appcontext(app.close_db)
-    app.config.from_mapping(
-        DATABASE=db_path,
-        SECRET_KEY=super_secret_key,
+    # schedule archiving for 2am on the 1st of the month, before the load at 3am
+    archive_args = [db_path, pathlib.Path(app.config["ARCHIVE_DIR"]), int(app.config["ARCHIVE_HORIZON_DAYS"])]
+    scheduler.add_job(
+        func=_archive_old_data,
+        trigger="cron",
+        id="monthly_archive",
+        day=1,
+        hour=2,
+        minute=0,
+        args=archive_args,
+    )
+    # nightly backup at 1am, before archiving and the email load
+    backup_args = [
+        db_path,
+        pathlib.Path(app.config["BACKUP_DIR"]),
+        int(app.config["BACKUP_KEEP"]),
+        int(app.config["BACKUP_PAGES_PER_STEP"]),
+        float(app.config["BACKUP_STEP_SLEEP"]),
+    ]
+    scheduler.add_job(
+        func=_backup_db,
+        trigger="cron",
+        id="nightly_backup",
+        hour=1,
+        minute=0,
+        args=backup_args,
     )
+    # nightly maintenance at 4am, after the load at 3am has changed the stats
+    maintenance_args = [db_path, float(app.config["MAINTENANCE_SECONDS"]), int(app.config["MAINTENANCE_VACUUM_PAGES"])]
+    scheduler.add_job(
+        func=_maintain_db,
+        trigger="cron",
+        id="nightly_maintenance",
+        hour=4,
+        minute=0,
+        args=maintenance_args,
+    )
+    # pick up queued csv uploads, also resumes uploads cut off by a restart
+    scheduler.add_job(
+        func=upload_jobs.run_pending,
+        trigger="interval",
+        id="upload_jobs",
+        seconds=app.config["UPLOAD_POLL_SECONDS"],
+        max_instances=1,
+        coalesce=True,
+        args=[db_path],
+    )
+    if app.config["BACKGROUND_JOBS"] and _serving():
+        # held until the process exits, offline migrations and restore-backup refuse to run while it is
+        app.jobs_lock = jobs_lock.hold_shared(db_path)
+        scheduler.start()
+        if app.config["EMAIL_IDLE"]:
+            IdleWatcher(db_path).start()  # daily load stays scheduled as a safety net
+
     init_db_cmd = click.Command(
         "init-db",
         callback=functools.partial(_init_db, db_path),
     )
     app.cli.add_command(init_db_cmd)  # register init-db as flask cli cmd
 
+    migrate_cmd = click.Command(
+        "migrate",
+        callback=functools.partial(_migrate, db_path),
+        params=[
+            click.Option(["--to"], type=int, default=None, help="stop after this migration, defaults to the newest"),
+            click.Option(
+                ["--chunk-rows"],
+                type=int,
+                default=migrations.BACKFILL_CHUNK_ROWS,
+                help="rows backfilled per commit",
+            ),
+            click.Option(["--pause"], type=float, default=0.0, help="seconds to wait between backfill commits"),
+        ],
+    )
+    app.cli.add_command(migrate_cmd)  # register schema migrations as flask cmd
+
+    archive_cmd = click.Command(
+        "archive-old-data",
+        callback=functools.partial(_archive_old_data, *archive_args),
+    )
+    app.cli.add_command(archive_cmd)  # register archiving as flask cmd
+
+    backup_cmd = click.Command(
+        "backup-db",
+        callback=functools.partial(_backup_db, *backup_args),
+    )
+    app.cli.add_command(backup_cmd)  # register online backup as flask cmd
+
+    restore_cmd = click.Command(
+        "restore-backup",
+        callback=_restore_backup,
+        params=[
+            click.Argument(["backup_path"]),
+            click.Option(["--to"], default="./sqlite/restored.db", help="db to restore into"),
+            click.Option(["--force"], is_flag=True, help="overwrite the db at --to if it already exists"),
+        ],
+    )
+    app.cli.add_command(restore_cmd)  # register backup restore as flask cmd
+
+    maintain_cmd = click.Command(
+        "maintain-db",
+        callback=functools.partial(_maintain_db, *maintenance_args),
+    )
+    app.cli.add_command(maintain_cmd)  # register db maintenance as flask cmd
+
+    export_cmd = click.Command(
+        "export-data",
+        callback=functools.partial(_export_data, db_path, pathlib.Path(app.config["EXPORT_DIR"])),
+        params=[
+            click.Option(
+                ["--retain-days"],
+                type=int,
+                default=None,
+                help="delete exported rows older than this many days, nothing is deleted if left out",
+            )
+        ],
+    )
+    app.cli.add_command(export_cmd)  # register incremental export as flask cmd
+
+    backfill_cmd = click.Command(
+        "backfill",
+        callback=functools.partial(_backfill, db_path),
+        params=[
+            click.Argument(["source"]),
+            click.Option(["--workers"], type=int, default=None, help="worker processes, defaults to cpu count"),
+        ],
+    )
+    app.cli.add_command(backfill_cmd)  # register bulk load of archived reports as flask cmd
+
+    import_clubs_cmd = click.Command(
+        "import-clubs",
+        callback=functools.partial(_import_clubs, db_path),
+        params=[click.Argument(["path"]), _overwrite_option()],
+    )
+    app.cli.add_command(import_clubs_cmd)  # register bulk club import as flask cmd
+
+    import_rooms_cmd = click.Command(
+        "import-rooms",
+        callback=functools.partial(_import_rooms, db_path),
+        params=[click.Argument(["path"]), _overwrite_option()],
+    )
+    app.cli.add_command(import_rooms_cmd)  # register bulk room assignment import as flask cmd
+
+    build_assets_cmd = click.Command(
+        "build-assets",
+        callback=functools.partial(_build_assets, static_dir),
+        params=[
+            click.Option(["--skip-css"], is_flag=True, help="reuse the existing style.css instead of running tailwind")
+        ],
+    )
+    app.cli.add_command(build_assets_cmd)  # register static asset build as flask cmd
+
     load_db_cmd = click.Command(
         "load-from-email",
         callback=functools.partial(_load_from_email, db_path),
     )
     app.cli.add_command(load_db_cmd)  # register data load as flask cmd
 
+    watch_email_cmd = click.Command(
+        "watch-email",
+        callback=functools.partial(_watch_email, db_path),
+    )
+    app.cli.add_command(watch_email_cmd)  # register imap idle watcher as flask cmd
+
     send_email_cmd = click.Command(
         "send-email-test",
         callback=functools.partial(_send_email_test, db_path),
@@ -0,0 +1,144 @@
+"""Admission control for analytics queries, priced by how much data they have to scan."""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import date
+from typing import Iterator
+
+MAX_CLIENTS = 10_000  # buckets kept before full (idle) ones get dropped
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a query is turned away, retry_after is how many seconds to wait."""
+
+    def __init__(self, reason: str, retry_after: int):
+        """Keep the reason and retry hint for the 429 response."""
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+@dataclass
+class AdmissionStats:
+    """Counters for admitted and rejected queries."""
+
+    admitted_cheap: int = 0
+    admitted_heavy: int = 0
+    rejected_rate: int = 0  # client bucket ran dry
+    rejected_busy: int = 0  # all heavy query slots taken
+    heavy_running: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        """Convert stats to a dict so they can be sent as JSON."""
+        return asdict(self)
+
+
+def estimate_cost(start: str, end: str, rooms: int) -> int:
+    """Estimate query cost in room days, days in the range times rooms it covers."""
+    try:
+        days = (date.fromisoformat(end) - date.fromisoformat(start)).days + 1
+    except ValueError:
+        return 1  # bad dates match nothing, so cost nothing
+    return max(days, 1) * max(rooms, 1)
+
+
+class AdmissionController:
+    """Per client token buckets plus a cap on heavy queries running at once.
+
+    Every query spends its cost from the client's bucket, which refills at `refill_rate`
+    room days per second up to `bucket_size`. Queries costing at least `heavy_cost` also
+    need one of `heavy_slots` slots, taken without waiting so cheap queries never end up
+    queued behind heavy ones. `budget` and `heavy_slot` can be taken apart when several
+    clients share one run of a query, `admit` takes both. Limits are per process.
+    """
+
+    def __init__(
+        self,
+        heavy_cost: int = 10_000,
+        heavy_slots: int = 2,
+        bucket_size: int = 100_000,
+        refill_rate: float = 1_000.0,
+    ):
+        """Create with every bucket full and every heavy slot free."""
+        self.heavy_cost = heavy_cost
+        self.bucket_size = bucket_size
+        self.refill_rate = refill_rate
+        self._heavy = threading.BoundedSemaphore(heavy_slots)
+        self._buckets: dict[str, tuple[float, float]] = {}  # client -> (tokens, last refill)
+        self._lock = threading.Lock()
+        self._stats = AdmissionStats()
+
+    @contextmanager
+    def admit(self, client: str, cost: int) -> Iterator[None]:
+        """Hold admission for one query, raises AdmissionRejectedError if it has to wait."""
+        with self.budget(client, cost), self.heavy_slot(cost):
+            yield
+
+    @contextmanager
+    def budget(self, client: str, cost: int) -> Iterator[None]:
+        """Charge the client for one query, the charge is given back if the query is turned away for a slot."""
+        cost = min(cost, self.bucket_size)  # the biggest query is still possible with a full bucket
+        self._spend(client, cost)
+        try:
+            yield
+        except AdmissionRejectedError:
+            self._refund(client, cost)  # query never ran, don't charge for it
+            raise
+
+    @contextmanager
+    def heavy_slot(self, cost: int) -> Iterator[None]:
+        """Hold one of the heavy query slots while a query runs, cheap queries go without one."""
+        if cost < self.heavy_cost:
+            with self._lock:
+                self._stats.admitted_cheap += 1
+            yield
+            return
+
+        if not self._heavy.acquire(blocking=False):
+            with self._lock:
+                self._stats.rejected_busy += 1
+            msg = "too many expensive analytics queries running"
+            raise AdmissionRejectedError(msg, retry_after=5)
+        with self._lock:
+            self._stats.admitted_heavy += 1
+            self._stats.heavy_running += 1
+        try:
+            yield
+        finally:
+            self._heavy.release()
+            with self._lock:
+                self._stats.heavy_running -= 1
+
+    def stats(self) -> dict[str, int]:
+        """Snapshot of the admission counters."""
+        with self._lock:
+            return self._stats.as_dict()
+
+    def _spend(self, client: str, cost: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(client, (self.bucket_size, now))
+            tokens = min(self.bucket_size, tokens + (now - last) * self.refill_rate)
+            if tokens < cost:
+                self._buckets[client] = (tokens, now)
+                self._stats.rejected_rate += 1
+                msg = "analytics query budget used up"
+                raise AdmissionRejectedError(msg, retry_after=math.ceil((cost - tokens) / self.refill_rate))
+            self._buckets[client] = (tokens - cost, now)
+            if len(self._buckets) > MAX_CLIENTS:
+                self._drop_full_buckets(now)
+
+    def _refund(self, client: str, cost: int) -> None:
+        with self._lock:
+            tokens, last = self._buckets.get(client, (self.bucket_size, time.monotonic()))
+            self._buckets[client] = (min(self.bucket_size, tokens + cost), last)
+
+    def _drop_full_buckets(self, now: float) -> None:
+        # caller must hold the lock, a missing bucket counts as full so dropping loses nothing
+        for client, (tokens, last) in list(self._buckets.items()):
+            if tokens + (now - last) * self.refill_rate >= self.bucket_size:
+                del self._buckets[client]
@@ -0,0 +1,174 @@
+"""LRU cache for computed analytics results shared by request threads."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Hashable
+
+
+@dataclass
+class CacheStats:
+    """Counters describing how well the cache is doing."""
+
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes_used: int = 0
+
+    def as_dict(self) -> dict[str, int | float]:
+        """Convert stats to a dict so they can be sent as JSON."""
+        stats: dict[str, int | float] = asdict(self)
+        lookups = self.hits + self.disk_hits + self.misses
+        stats["hit_rate"] = (self.hits + self.disk_hits) / lookups if lookups else 0.0
+        return stats
+
+
+class ResultCache:
+    """Thread safe LRU cache bounded by number of entries and total size.
+
+    Values must be JSON serializable, the encoded size of a value is what counts
+    against `max_bytes`. When `disk_path` is given every entry is also written to a
+    small sqlite db so other gunicorn workers can pick it up instead of recomputing.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024, disk_path: Path | None = None):
+        """Create an empty cache, disk store is created on first use if enabled."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        if disk_path is not None:
+            self._init_disk()
+
+    @staticmethod
+    def make_key(*parts: Hashable) -> str:
+        """Normalize key parts into a single str, parts must be JSON serializable."""
+        return json.dumps(parts, separators=(",", ":"), default=str)
+
+    def get(self, key: str, count: bool = True) -> Any | None:
+        """Look for key in memory and then on disk, returns None on a miss.
+
+        With `count` False the hit and miss counters are left alone, for checking again a key
+        that was just looked up.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)  # mark as most recently used
+                self._stats.hits += count
+                return self._entries[key][0]
+
+        encoded = self._disk_get(key)
+        if encoded is not None:
+            value = json.loads(encoded)
+            with self._lock:
+                self._stats.disk_hits += count
+                self._store(key, value, len(encoded))
+            return value
+
+        with self._lock:
+            self._stats.misses += count
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        """Add value to the cache, evicting least recently used entries if over the limits."""
+        encoded = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._store(key, value, len(encoded))
+        self._disk_put(key, encoded)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Return cached value for key, running compute and caching the result on a miss.
+
+        Meant for re-checking a key `get` just missed, so this lookup isn't counted.
+        """
+        value = self.get(key, count=False)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        """Drop all entries kept in memory, disk entries are left for other workers."""
+        with self._lock:
+            self._entries.clear()
+            self._stats.entries = 0
+            self._stats.bytes_used = 0
+
+    def stats(self) -> dict[str, int | float]:
+        """Snapshot of the cache counters."""
+        with self._lock:
+            return self._stats.as_dict()
+
+    def _store(self, key: str, value: Any, size: int) -> None:
+        # caller must hold the lock
+        if size > self.max_bytes:
+            return  # would evict everything else, not worth caching
+
+        if key in self._entries:
+            self._stats.bytes_used -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._stats.bytes_used += size
+
+        while len(self._entries) > self.max_entries or self._stats.bytes_used > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)  # oldest first
+            self._stats.bytes_used -= evicted_size
+            self._stats.evictions += 1
+        self._stats.entries = len(self._entries)
+
+    def _connect_disk(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.disk_path, timeout=1.0)  # type: ignore[arg-type]
+
+    def _init_disk(self) -> None:
+        self.disk_path.parent.mkdir(parents=True, exist_ok=True)  # type: ignore[union-attr]
+        with self._connect_disk() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")  # workers read while another writes
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS result_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    cache_value TEXT,
+                    last_used TEXT
+                )
+                """
+            )
+
+    def _disk_get(self, key: str) -> str | None:
+        if self.disk_path is None:
+            return None
+        try:
+            with self._connect_disk() as conn:
+                row = conn.execute("SELECT cache_value FROM result_cache WHERE cache_key = ?", (key,)).fetchone()
+        except sqlite3.OperationalError:
+            return None  # disk store busy or missing, treat like a miss
+        return row[0] if row else None
+
+    def _disk_put(self, key: str, encoded: str) -> None:
+        if self.disk_path is None:
+            return
+        try:
+            with self._connect_disk() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO result_cache (cache_key, cache_value, last_used) VALUES (?,?,?)",
+                    (key, encoded, datetime.now().isoformat()),
+                )
+                # keep the disk store bounded the same way as memory
+                conn.execute(
+                    """
+                    DELETE FROM result_cache WHERE cache_key NOT IN (
+                        SELECT cache_key FROM result_cache ORDER BY last_used DESC LIMIT ?
+                    )
+                    """,
+                    (self.max_entries,),
+                )
+        except sqlite3.OperationalError:
+            pass  # losing a disk write only costs another worker a recompute
@@ -0,0 +1,255 @@
+"""Optional columnar analytics engine over memory mapped numpy snapshots of input_data.
+
+input_data is exported to one raw `.col` file per column and kept up to date by appending
+rows added since the last refresh to the end of each file, so a refresh costs the new rows
+rather than the whole table. Group-bys then run as vectorized numpy operations
+instead of sqlite scans, which pays off on multi-year ranges. Needs the `columnar`
+extra, `pip install ".[columnar]"`.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import numpy as np
+except ImportError:  # engine is optional, sql backend is used without it
+    np = None
+
+from attendance_tracker.db.connection import connect_read_only
+from attendance_tracker.db.ingest_log import data_version
+from attendance_tracker.types import tables
+
+EPOCH = date(1970, 1, 1)
+COLUMNS = {  # column name -> dtype
+    "room_id": "int32",
+    "day": "int32",  # days since EPOCH
+    "accessed": "int64",
+    "succeed": "int64",
+    "fail": "int64",
+}
+FETCH_CHUNK = 50_000
+
+
+def available() -> bool:
+    """Check if numpy is installed so the columnar engine can be used."""
+    return np is not None
+
+
+def to_day(date_entered: str) -> int:
+    """Convert a date_entered str to days since EPOCH, accepts both formats found in the db."""
+    return (tables.parse_date(date_entered) - EPOCH).days
+
+
+class ColumnarSnapshot:
+    """Memory mapped column arrays of input_data stored in `snapshot_dir`.
+
+    Safe to share between request threads, and between workers since refreshes
+    take a file lock and readers pick up new files when the meta file changes.
+    """
+
+    def __init__(self, snapshot_dir: Path):
+        """Point at the snapshot dir, nothing is read until the snapshot is used."""
+        if np is None:
+            msg = 'columnar analytics needs numpy, install with pip install ".[columnar]"'
+            raise ValueError(msg)
+        self.snapshot_dir = snapshot_dir
+        self._lock = threading.Lock()
+        self._meta_mtime = -1
+        self._meta: dict = {}
+        self._columns: dict = {}
+
+    @property
+    def meta_path(self) -> Path:
+        """Path of the meta file, records rows, max rowid and data version and is written last."""
+        return self.snapshot_dir / "columns.json"
+
+    def version(self) -> int:
+        """Get data version the snapshot was built from, -1 if there is no snapshot yet."""
+        self._reload_if_changed()
+        return self._meta.get("data_version", -1)
+
+    def is_current(self, version: int) -> bool:
+        """Check if the snapshot reflects the given data version."""
+        return self.version() == version
+
+    def refresh(self, db_path: Path, query_timeout: float = 600.0) -> int:
+        """Bring the snapshot up to date with input_data, returns number of rows exported.
+
+        Only rows past the last exported rowid are read, unless rows below it were removed
+        or rewritten (dump, migration) in which case the snapshot is rebuilt from scratch.
+        """
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        with self._file_lock(), closing(connect_read_only(db_path, query_timeout)) as conn:
+            conn.execute("BEGIN")  # version and rows must come from the same read snapshot
+            meta = self._read_meta()
+            version = data_version(conn)
+            if meta.get("data_version") == version:
+                return 0
+
+            intact = bool(meta) and self._prefix_intact(conn, meta)
+            if not intact:
+                # files of the layout before .col files, one .npy rewritten whole per column
+                for old in [*self.snapshot_dir.glob("*.npy"), self.snapshot_dir / "meta.json"]:
+                    old.unlink(missing_ok=True)
+            after = meta["max_rowid"] if intact else 0
+            old_rows = meta["rows"] if intact else 0
+
+            cursor = conn.execute(
+                """
+                SELECT
+                    rowid, room_id, times_accessed, access_succeed, access_fail, date_entered
+                FROM
+                    input_data
+                WHERE
+                    rowid > ?
+                ORDER BY
+                    rowid
+                """,
+                (after,),
+            )
+            chunks: dict[str, list] = {name: [] for name in COLUMNS}
+            max_rowid = after
+            last_row = meta.get("last_row") if intact else None
+            while rows := cursor.fetchmany(FETCH_CHUNK):
+                rowids, room_ids, accessed, succeed, fail, dates = zip(*rows, strict=True)
+                max_rowid = rowids[-1]
+                last_row = list(rows[-1][1:])
+                chunks["room_id"].append(np.array(room_ids, dtype=COLUMNS["room_id"]))
+                chunks["day"].append(np.array([to_day(d) for d in dates], dtype=COLUMNS["day"]))
+                chunks["accessed"].append(np.array(accessed, dtype=COLUMNS["accessed"]))
+                chunks["succeed"].append(np.array(succeed, dtype=COLUMNS["succeed"]))
+                chunks["fail"].append(np.array(fail, dtype=COLUMNS["fail"]))
+
+            new_rows = sum(len(chunk) for chunk in chunks["room_id"])
+            for name, dtype in COLUMNS.items():
+                new = np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=dtype)
+                self._write_column(name, dtype, old_rows, new)
+
+            # meta goes last so readers never see columns shorter than the meta says
+            self._write_meta(
+                {
+                    "rows": old_rows + new_rows,
+                    "max_rowid": max_rowid,
+                    "last_row": last_row,
+                    "data_version": version,
+                }
+            )
+
+        print(f"columnar snapshot at version {version}, {'appended' if intact else 'rebuilt with'} {new_rows} rows")
+        return new_rows
+
+    def usage(self, start: str, end: str) -> list[tuple[int, int]]:
+        """Get total accesses per room between start and end, as (room_id, total) pairs."""
+        cols = self._columns_for_read()
+        mask = (cols["day"] >= to_day(start)) & (cols["day"] <= to_day(end))
+        rooms = cols["room_id"][mask]
+        if not rooms.size:
+            return []
+
+        totals = np.bincount(rooms, weights=cols["accessed"][mask])
+        seen = np.bincount(rooms) > 0  # rooms with rows but zero accesses still show up
+        return [(int(room_id), int(totals[room_id])) for room_id in np.flatnonzero(seen)]
+
+    def room_activity(self, room_id: int, start: str, end: str) -> list[tuple[int, str]]:
+        """Get accesses per day for one room between start and end, as (accesses, date) pairs."""
+        cols = self._columns_for_read()
+        day = cols["day"]
+        mask = (cols["room_id"] == room_id) & (day >= to_day(start)) & (day <= to_day(end))
+        days = day[mask]
+        accessed = cols["accessed"][mask]
+        order = np.argsort(days, kind="stable")
+        labels = days[order].astype("datetime64[D]").astype(str)  # days since EPOCH -> YYYY-MM-DD
+        return list(zip(accessed[order].tolist(), labels.tolist(), strict=True))
+
+    @staticmethod
+    def _prefix_intact(conn: sqlite3.Connection, meta: dict) -> bool:
+        """Check rows already exported are untouched, so only newer rowids need to be read.
+
+        Same count up to the last exported rowid plus the same row sitting at that rowid
+        catches deletes and the table being dropped and refilled by a dump.
+        """
+        count_query = "SELECT COUNT(*) FROM input_data WHERE rowid <= ?"
+        if conn.execute(count_query, (meta["max_rowid"],)).fetchone()[0] != meta["rows"]:
+            return False
+        if not meta["rows"]:
+            return True
+        row_query = """
+            SELECT
+                room_id, times_accessed, access_succeed, access_fail, date_entered
+            FROM
+                input_data
+            WHERE
+                rowid = ?
+            """
+        row = conn.execute(row_query, (meta["max_rowid"],)).fetchone()
+        return row is not None and list(row) == meta.get("last_row")
+
+    def _columns_for_read(self) -> dict:
+        self._reload_if_changed()
+        with self._lock:
+            return self._columns
+
+    def _reload_if_changed(self) -> None:
+        try:
+            mtime = self.meta_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._meta_mtime:
+            return
+
+        with self._lock:
+            meta = self._read_meta()
+            rows = meta.get("rows", 0)
+            columns = {}
+            for name, dtype in COLUMNS.items():
+                if rows:  # zero length arrays can't be memory mapped
+                    columns[name] = np.memmap(self.snapshot_dir / f"{name}.col", dtype=dtype, mode="r", shape=(rows,))
+                else:
+                    columns[name] = np.empty(0, dtype=dtype)
+            self._columns = columns
+            self._meta = meta
+            self._meta_mtime = mtime
+
+    def _read_meta(self) -> dict:
+        if not self.meta_path.exists():
+            return {}
+        return json.loads(self.meta_path.read_text(encoding="utf-8"))
+
+    def _write_meta(self, meta: dict) -> None:
+        tmp = self.meta_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, self.meta_path)
+
+    def _write_column(self, name: str, dtype: str, keep: int, new) -> None:
+        """Write `new` values after the first `keep` values of the column, a `keep` of 0 starts a new file."""
+        path = self.snapshot_dir / f"{name}.col"
+        if keep:
+            with path.open("r+b") as f:
+                # anything past `keep` is from a refresh that died before writing meta, no reader maps it
+                f.truncate(keep * np.dtype(dtype).itemsize)
+                f.seek(0, os.SEEK_END)
+                new.tofile(f)
+            return
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            new.tofile(f)
+        os.replace(tmp, path)  # readers holding the old mapping keep working
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        # stops two workers refreshing at the same time
+        with (self.snapshot_dir / "refresh.lock").open("w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,175 @@
+"""Fan out "data changed" events to open analytics pages whenever a load commits.
+
+Every worker runs one thread polling ingest_log for new versions, so a load in any
+worker or cron job reaches the pages connected to every other worker within one poll.
+Subscribers just wait on a condition, an idle page costs a thread and no queries.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from collections import deque
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+
+from attendance_tracker.db.connection import connect_read_only
+from attendance_tracker.db.ingest_log import data_version
+
+KEEP_CHANGES = 256  # recent changes kept for pages catching up after a reconnect
+
+
+class FeedFullError(Exception):
+    """Raised when a worker already has as many live pages connected as it allows."""
+
+
+@dataclass(frozen=True)
+class Change:
+    """One committed load, rooms are "Building 123" labels, None when any room could have changed."""
+
+    version: int
+    rooms: list[str] | None
+    start: str | None
+    end: str | None
+
+    def as_event(self) -> str:
+        """Format as a server sent event, the version is the id browsers send back when reconnecting."""
+        data = json.dumps({"rooms": self.rooms, "start": self.start, "end": self.end}, separators=(",", ":"))
+        return f"id: {self.version}\nevent: data-changed\ndata: {data}\n\n"
+
+
+class Subscription:
+    """A connected page's place in the feed, close it once the stream ends."""
+
+    def __init__(self, feed: ChangeFeed):
+        """Count against the feed's subscriber limit until closed."""
+        self.feed = feed
+        self.closed = False
+
+    def close(self) -> None:
+        """Give the slot back, safe to call more than once."""
+        with self.feed._changed:
+            if not self.closed:
+                self.closed = True
+                self.feed._subscribers -= 1
+
+
+class ChangeFeed:
+    """Poll ingest_log every `poll_seconds` while anyone is subscribed and wake subscribers on new versions.
+
+    Loads in this worker call `poke` through the post ingest hooks so its own pages
+    don't wait for the next poll.
+    """
+
+    def __init__(self, db_path: Path, poll_seconds: float = 1.0, max_subscribers: int = 200):
+        """Set up the feed, the polling thread starts with the first subscriber."""
+        self.db_path = db_path
+        self.poll_seconds = poll_seconds
+        self.max_subscribers = max_subscribers
+        self._changes: deque[Change] = deque(maxlen=KEEP_CHANGES)
+        self._changed = threading.Condition()
+        self._wake = threading.Event()
+        self._subscribers = 0
+        self._thread: threading.Thread | None = None
+        self._base = 0  # versions at or below this were loaded before the feed started
+        self._latest = 0
+
+    def subscribe(self) -> Subscription:
+        """Take a subscriber slot, raises FeedFullError when there are none left."""
+        with self._changed:
+            if self._subscribers >= self.max_subscribers:
+                raise FeedFullError
+            if self._thread is None:
+                self._base = self._latest = self._poll_latest()
+                self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+                self._thread.start()
+            self._subscribers += 1
+        self._wake.set()
+        return Subscription(self)
+
+    def latest(self) -> int:
+        """Newest version the feed has seen."""
+        with self._changed:
+            return self._latest
+
+    def changes_after(self, version: int, timeout: float) -> list[Change]:
+        """Get changes newer than version, waiting up to timeout for one to arrive."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._latest > version, timeout)
+            if self._latest <= version:
+                return []
+            dropped = len(self._changes) == self._changes.maxlen and version < self._changes[0].version - 1
+            if version < self._base or dropped:
+                # the page missed changes the feed doesn't have anymore, have it refetch everything
+                return [Change(self._latest, None, None, None)]
+            return [change for change in self._changes if change.version > version]
+
+    def poke(self) -> None:
+        """Poll right away instead of waiting out the interval."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            with self._changed:
+                if self._subscribers == 0:
+                    continue  # nobody listening, skip the query
+                after = self._latest
+            try:
+                changes = self._poll_changes(after)
+            except Exception as e:  # db locked or being re-initialized, try again next poll
+                print(f"change feed poll failed: {e}")
+                continue
+            if changes:
+                with self._changed:
+                    self._changes.extend(changes)
+                    self._latest = changes[-1].version
+                    self._changed.notify_all()
+
+    def _poll_latest(self) -> int:
+        with closing(connect_read_only(self.db_path)) as conn:
+            return data_version(conn)
+
+    def _poll_changes(self, after: int) -> list[Change]:
+        with closing(connect_read_only(self.db_path)) as conn:
+            tables = {name for (name,) in conn.execute(QUERY_INGEST_TABLES)}
+            if "ingest_log" not in tables:  # nothing has been loaded since the db was migrated
+                return []
+            if "ingest_changes" not in tables:  # nothing has recorded changes yet
+                rows = conn.execute(
+                    "SELECT version, NULL, NULL, NULL FROM ingest_log WHERE version > ? ORDER BY version",
+                    (after,),
+                ).fetchall()
+            else:
+                rows = conn.execute(QUERY_CHANGES, (after,)).fetchall()
+
+            changes = []
+            for version, room_ids, first_day, last_day in rows:
+                rooms = None
+                if room_ids is not None:
+                    rooms = [
+                        f"{building} {room_num}"
+                        for building, room_num in conn.execute(
+                            "SELECT building, room_num FROM rooms WHERE room_id IN (SELECT value FROM json_each(?))",
+                            (room_ids,),
+                        )
+                    ]
+                changes.append(Change(version, rooms, first_day, last_day))
+            return changes
+
+
+QUERY_INGEST_TABLES = "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('ingest_log', 'ingest_changes')"
+
+QUERY_CHANGES = """
+    SELECT
+        l.version, c.room_ids, c.first_day, c.last_day
+    FROM
+        ingest_log l
+        LEFT JOIN ingest_changes c ON c.version = l.version
+    WHERE
+        l.version > ?
+    ORDER BY
+        l.version
+    """
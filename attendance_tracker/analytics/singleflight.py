@@ -0,0 +1,93 @@
+"""Coalesce identical analytics queries so only one of them runs at a time."""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable
+
+
+class SingleFlightFullError(Exception):
+    """Raised when too many requests are already waiting on the same computation."""
+
+
+@dataclass
+class FlightStats:
+    """Counters describing how much work coalescing saved."""
+
+    executed: int = 0  # computations actually run
+    coalesced: int = 0  # requests that waited on someone else's computation instead
+    rejected: int = 0  # requests turned away because the waiter cap was hit
+    in_flight: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        """Convert stats to a dict so they can be sent as JSON."""
+        return asdict(self)
+
+
+@dataclass
+class _Call:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: BaseException | None = None
+    waiters: int = 0
+
+
+class SingleFlight:
+    """Run at most one computation per key at a time, concurrent callers share its result.
+
+    The first caller for a key runs `compute`, callers arriving while it runs wait for it
+    and get the same result or exception. At most `max_waiters` callers wait on one key,
+    past that SingleFlightFullError is raised so a stampede can't pile up threads.
+    """
+
+    def __init__(self, max_waiters: int = 32):
+        """Create with nothing in flight."""
+        self.max_waiters = max_waiters
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = FlightStats()
+
+    def do(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Return the result of compute, sharing one run between concurrent callers with the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._stats.executed += 1
+            elif call.waiters >= self.max_waiters:
+                self._stats.rejected += 1
+                raise SingleFlightFullError(key)
+            else:
+                call.waiters += 1
+                self._stats.coalesced += 1
+
+        if leader:
+            return self._run(key, call, compute)
+        return self._wait(call)
+
+    def stats(self) -> dict[str, int]:
+        """Snapshot of the coalescing counters."""
+        with self._lock:
+            self._stats.in_flight = len(self._calls)
+            return self._stats.as_dict()
+
+    def _run(self, key: str, call: _Call, compute: Callable[[], Any]) -> Any:
+        try:
+            call.result = compute()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    @staticmethod
+    def _wait(call: _Call) -> Any:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
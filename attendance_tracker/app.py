@@ -3,13 +3,26 @@
 from __future__ import annotations
 
 import sqlite3
+from typing import IO
 
 import flask
 
+from attendance_tracker.analytics.admission import AdmissionController
+from attendance_tracker.analytics.cache import ResultCache
+from attendance_tracker.analytics.columnar import ColumnarSnapshot
+from attendance_tracker.analytics.live import ChangeFeed
+from attendance_tracker.db.connection import ReadOnlyConnection, connect_read_only
+
 
 class AttendanceTracker(flask.Flask):
     """Flask application entry point."""
 
+    result_cache: ResultCache  # analytics results shared by all request threads
+    columnar_snapshot: ColumnarSnapshot | None  # set when ANALYTICS_BACKEND is columnar
+    admission: AdmissionController  # prices analytics queries and turns away too many heavy ones
+    change_feed: ChangeFeed  # tells open analytics pages when a load commits
+    jobs_lock: IO | None = None  # shared jobs lock, held while this process runs background jobs
+
     def get_db(self) -> sqlite3.Connection:
         """Create connection to db, called at each request."""
         if "db" not in flask.g:
@@ -19,9 +32,23 @@ class AttendanceTracker(flask.Flask):
 
         return self.db
 
+    def get_analytics_db(self) -> ReadOnlyConnection:
+        """Create read only connection for analytic queries, reused for the rest of the request."""
+        if "analytics_db" not in flask.g:
+            flask.g.analytics_db = connect_read_only(
+                flask.current_app.config["DATABASE"],
+                query_timeout=flask.current_app.config["ANALYTICS_QUERY_TIMEOUT"],
+            )
+
+        return flask.g.analytics_db
+
     def close_db(self, exc: BaseException | None = None) -> None:
         """Close DB connection on app tear down."""
         db: sqlite3.Connection = flask.g.pop("db", None)
 
         if db is not None:
             db.close()
+
+        analytics_db: ReadOnlyConnection | None = flask.g.pop("analytics_db", None)
+        if analytics_db is not None:
+            analytics_db.close()
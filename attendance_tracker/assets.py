@@ -0,0 +1,170 @@
+"""Build fingerprinted, precompressed static assets so nginx can serve them without the app.
+
+`build_assets` builds the tailwind css, vendors Chart.js, recompresses images and copies
+every file under static/ into static/dist/ with a content hash in its name, next to a .gz
+copy of anything worth compressing for nginx's gzip_static. dist/manifest.json maps plain
+names to hashed ones, create_app loads it so url_for("static", ...) emits the hashed urls.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import struct
+import subprocess
+import urllib.request
+import zlib
+from pathlib import Path
+from typing import Callable
+
+import flask
+
+try:
+    from PIL import Image
+except ImportError:  # optional, pngs are only re-deflated without it
+    Image = None
+
+CHART_JS_VERSION = "4.4.1"
+CHART_JS_URL = f"https://cdn.jsdelivr.net/npm/chart.js@{CHART_JS_VERSION}/dist/chart.umd.min.js"
+CHART_JS_PATH = "vendor/chart.umd.min.js"
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+HASH_LENGTH = 12
+COMPRESS_SUFFIXES = {".css", ".js", ".json", ".svg", ".txt", ".html"}  # images are already compressed
+MIN_COMPRESS_BYTES = 512  # smaller files don't save enough to be worth a request for the variant
+MAX_IMAGE_PX = 512  # largest image side kept, images are shown at 128px at most
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_DROP_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"tIME"}  # metadata the browser never looks at
+
+
+def build_assets(static_dir: Path, css: bool = True) -> dict[str, str]:
+    """Build everything under static_dir into static_dir/dist, returns the name -> hashed name manifest."""
+    if css:
+        build_css(static_dir)
+    vendor_chart_js(static_dir)
+
+    dist = static_dir / DIST_DIR
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    for path in sorted(static_dir.rglob("*")):
+        if not path.is_file() or dist in path.parents:
+            continue
+        name = path.relative_to(static_dir).as_posix()
+        data = path.read_bytes()
+        if path.suffix.lower() == ".png":
+            data = recompress_png(data)
+
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        hashed = (Path(name).parent / f"{path.stem}.{digest}{path.suffix}").as_posix()
+        _write(dist / hashed, data)
+        if path.suffix.lower() in COMPRESS_SUFFIXES and len(data) >= MIN_COMPRESS_BYTES:
+            # mtime 0 so a rebuild writes the same bytes
+            _write(dist / f"{hashed}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+        manifest[name] = f"{DIST_DIR}/{hashed}"
+
+    _write(dist / MANIFEST, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    print(f"built {len(manifest)} assets into {dist}")
+    return manifest
+
+
+def build_css(static_dir: Path) -> None:
+    """Run the tailwind cli to write a minified static/style.css, same paths as tools/tailwindcss.sh."""
+    source = static_dir.parent / "templates" / "src" / "input.css"
+    subprocess.run(["tailwindcss", "-i", str(source), "-o", str(static_dir / "style.css"), "--minify"], check=True)
+
+
+def vendor_chart_js(static_dir: Path) -> None:
+    """Download the pinned Chart.js build into static/vendor once, pages never load it from a CDN."""
+    path = static_dir / CHART_JS_PATH
+    if path.exists():
+        return
+    print(f"vendoring Chart.js {CHART_JS_VERSION} from {CHART_JS_URL}")
+    with urllib.request.urlopen(CHART_JS_URL, timeout=30) as response:
+        _write(path, response.read())
+
+
+def chart_js_src(static_dir: Path) -> Callable[[], str]:
+    """Get a template function for the Chart.js script url, the pinned CDN build until build-assets vendors it."""
+
+    def src() -> str:
+        if (static_dir / CHART_JS_PATH).exists():
+            return flask.url_for("static", filename=CHART_JS_PATH)
+        return CHART_JS_URL
+
+    return src
+
+
+def recompress_png(data: bytes) -> bytes:
+    """Shrink a png, downscaling oversized images when Pillow is installed, returns data as is if nothing helped."""
+    if not data.startswith(PNG_SIGNATURE):
+        return data
+    if Image is not None:
+        smaller = _downscale_png(data)
+    else:
+        smaller = _redeflate_png(data)
+    return smaller if len(smaller) < len(data) else data
+
+
+def load_manifest(static_dir: Path) -> dict[str, str]:
+    """Read the manifest written by build_assets, empty if assets were never built."""
+    try:
+        return json.loads((static_dir / DIST_DIR / MANIFEST).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+def hashed_static_urls(manifest: dict[str, str]) -> Callable[[str, dict], None]:
+    """Get a url_defaults callback pointing url_for("static", filename=...) at the hashed file."""
+
+    def rewrite(endpoint: str, values: dict) -> None:
+        if endpoint == "static" and values.get("filename") in manifest:
+            values["filename"] = manifest[values["filename"]]
+
+    return rewrite
+
+
+def _write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _downscale_png(data: bytes) -> bytes:
+    with Image.open(io.BytesIO(data)) as image:
+        icc_profile = image.info.get("icc_profile")
+        image.thumbnail((MAX_IMAGE_PX, MAX_IMAGE_PX))
+        out = io.BytesIO()
+        image.save(out, format="PNG", optimize=True, icc_profile=icc_profile)
+    return out.getvalue()
+
+
+def _redeflate_png(data: bytes) -> bytes:
+    """Recompress the image data at max zlib level and drop text chunks, lossless."""
+    chunks = []
+    idat = b""
+    offset = len(PNG_SIGNATURE)
+    while offset < len(data):
+        (length,) = struct.unpack(">I", data[offset : offset + 4])
+        kind = data[offset + 4 : offset + 8]
+        body = data[offset + 8 : offset + 8 + length]
+        offset += 12 + length  # length, type, body, crc
+        if kind == b"IDAT":
+            if not idat:
+                chunks.append((kind, b""))  # placeholder, all image data goes where the first IDAT was
+            idat += body
+        elif kind not in PNG_DROP_CHUNKS:
+            chunks.append((kind, body))
+
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9)
+    idat = compressor.compress(zlib.decompress(idat)) + compressor.flush()
+    out = [PNG_SIGNATURE]
+    for kind, body in chunks:
+        if kind == b"IDAT":
+            body = idat
+        out.append(struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body)))
+    return b"".join(out)
@@ -0,0 +1,162 @@
+"""WSGI middleware that gzip or brotli compresses text responses, including streamed ones."""
+
+from __future__ import annotations
+
+import itertools
+import zlib
+from typing import Callable, Iterable, Iterator
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    "text/html",
+    "text/css",
+    "text/csv",
+    "text/plain",
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+}
+SKIP_STATUS = ("204", "206", "304")  # no body, or a byte range of the uncompressed body
+
+
+class CompressionMiddleware:
+    """Compress responses for clients that accept it, brotli preferred when installed.
+
+    Bodies smaller than `min_size` go out as is, compressing them saves less than the
+    headers cost. Streamed bodies with no Content-Length are buffered only until they
+    pass `min_size`, after that chunks are compressed as they come so downloads still
+    start straight away. Event streams are never touched, buffering would hold events back.
+    """
+
+    def __init__(self, app: Callable, min_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4):
+        """Wrap a WSGI app, the levels favour speed since every response is compressed on the fly."""
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        """Run the wrapped app, compressing its body if the client and response allow it."""
+        encoding = self.pick_encoding(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None or environ.get("REQUEST_METHOD") == "HEAD":
+            return self.app(environ, start_response)
+
+        response: list = []  # status, headers and exc_info once the app starts its response
+
+        def capture(status: str, headers: list[tuple[str, str]], exc_info=None) -> Callable:
+            response[:] = [status, headers, exc_info]
+            return _no_write
+
+        return self._respond(self.app(environ, capture), response, encoding, start_response)
+
+    def pick_encoding(self, accept_encoding: str) -> str | None:
+        """Get the best encoding the client accepts, None to send the body as is."""
+        accepted = {}
+        for part in accept_encoding.lower().split(","):
+            name, _, params = part.strip().partition(";")
+            q = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    q = float(params.strip()[2:])
+                except ValueError:
+                    q = 0.0
+            accepted[name.strip()] = q
+        if brotli is not None and accepted.get("br", 0) > 0:
+            return "br"
+        if accepted.get("gzip", accepted.get("*", 0)) > 0:
+            return "gzip"
+        return None
+
+    def _respond(
+        self,
+        body: Iterable[bytes],
+        response: list,
+        encoding: str,
+        start_response: Callable,
+    ) -> Iterator[bytes]:
+        chunks = iter(body)
+        buffered = []
+        try:
+            while not response:  # app may only start its response once iterated
+                buffered.append(next(chunks))
+            status, headers, exc_info = response
+
+            if not self._compressible(status, headers):
+                start_response(status, headers, exc_info)
+                yield from buffered
+                yield from chunks
+                return
+
+            # hold back small bodies until it is clear they're worth compressing
+            size = sum(map(len, buffered))
+            for chunk in chunks:
+                buffered.append(chunk)
+                size += len(chunk)
+                if size >= self.min_size:
+                    break
+            else:
+                if size < self.min_size:
+                    headers = [(k, v) for k, v in headers if k.lower() != "content-length"]
+                    start_response(status, [*headers, ("Content-Length", str(size))], exc_info)
+                    yield b"".join(buffered)
+                    return
+
+            start_response(status, _compressed_headers(headers, encoding), exc_info)
+            compress, flush = self._compressor(encoding)
+            for chunk in itertools.chain(buffered, chunks):
+                if out := compress(chunk):
+                    yield out
+            yield flush()
+        except StopIteration:  # app returned an empty body without starting a response
+            return
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+    def _compressible(self, status: str, headers: list[tuple[str, str]]) -> bool:
+        if status[:3] in SKIP_STATUS:
+            return False
+        values = {k.lower(): v for k, v in headers}
+        content_type = values.get("content-type", "").split(";")[0].strip().lower()
+        if content_type not in COMPRESSIBLE_TYPES or "content-encoding" in values:
+            return False
+        if "no-transform" in values.get("cache-control", ""):
+            return False
+        length = values.get("content-length")
+        return length is None or not length.isdigit() or int(length) >= self.min_size
+
+    def _compressor(self, encoding: str) -> tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.finish
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # 16+ adds gzip header
+        return compressor.compress, compressor.flush
+
+
+def _compressed_headers(headers: list[tuple[str, str]], encoding: str) -> list[tuple[str, str]]:
+    out = []
+    vary = []
+    for key, value in headers:
+        lower = key.lower()
+        if lower in ("content-length", "accept-ranges"):
+            continue  # length isn't known until the whole body is compressed, ranges would be of the wrong bytes
+        if lower == "vary":
+            vary.append(value)
+            continue
+        if lower == "etag" and not value.startswith("W/"):
+            value = f"W/{value}"  # compressed bytes differ, so the tag can only be weak
+        out.append((key, value))
+    if not any(v.strip() == "*" or "accept-encoding" in v.lower() for v in vary):
+        vary.append("Accept-Encoding")
+    out.append(("Vary", ", ".join(vary)))
+    out.append(("Content-Encoding", encoding))
+    return out
+
+
+def _no_write(data: bytes) -> None:
+    msg = "the write() callable is not supported with response compression"
+    raise NotImplementedError(msg)
@@ -2,13 +2,18 @@
 
 from __future__ import annotations
 
+import csv
+import io
 import pathlib
 import sqlite3
 from datetime import datetime
+from typing import Callable
 
 import flask
 
 from attendance_tracker.controllers import auth
+from attendance_tracker.db import backup, bulk_import, export, maintenance, search, upload_jobs
+from attendance_tracker.db.rooms import RoomLookup
 from attendance_tracker.email.emailList import add_admin_email, remove_admin_email
 from attendance_tracker.types import tables
 
@@ -18,6 +23,8 @@ ADMIN = flask.Blueprint(
     url_prefix="/h/admin",
 )
 
+IMPORT_FLASH_MESSAGES = 10  # conflict/rejection messages shown after a bulk import
+
 
 @ADMIN.route("/home", methods=["GET"])
 @auth.required
@@ -31,26 +38,27 @@ def home() -> str | flask.Response:
 @ADMIN.route("/clubs", methods=["GET", "POST"])
 @auth.required
 def club_info() -> str:
-    """View all clubs that have info saved in the system."""
+    """View all clubs that have info saved in the system, one page at a time."""
     with flask.current_app.app_context():
         conn: sqlite3.Connection = flask.current_app.get_db()  # type: ignore
 
-    query = """
-        SELECT
-            building, room_num, assigned_club
-        FROM
-            room_log
-        ORDER BY
-            building, room_num
-        """
-    clubs = conn.execute(query).fetchall()
+    page = search.search_clubs(conn)  # later pages and searches come from club_search_json
 
     return flask.render_template(
         "club_search.html",
-        clubs=clubs,
+        clubs=page.results,
+        next_cursor=page.next_cursor,
     )
 
 
+@ADMIN.route("/clubs/search", methods=["GET"])
+@auth.required
+def club_search_json() -> flask.Response:
+    """Search room assignments by club, president or room, paged with the cursor from the last page."""
+    conn: sqlite3.Connection = flask.current_app.get_db()  # type: ignore
+    return _search_json(conn, search.search_clubs)
+
+
 @ADMIN.route("/club-config/<club_name>", methods=["GET", "POST"])
 @auth.required
 def club_config(club_name: str = "") -> str:
@@ -128,11 +136,13 @@ def assign_club():
         building = flask.request.form["building"]
         room_num = flask.request.form["room_num"]
 
+        lookup = RoomLookup(conn)
+        room_id = lookup.room_id(building, room_num)
         cursor.execute(
             """SELECT ASSIGNED_CLUB
                 FROM ROOM_LOG
-                WHERE building = ? AND room_num = ?""",
-            (building, room_num),
+                WHERE room_id = ?""",
+            (room_id,),
         )
 
         result = cursor.fetchone()
@@ -140,12 +150,8 @@ def assign_club():
         if result:
             return flask.redirect(flask.url_for("admin.club_info"))
         else:
-            cursor.execute(
-                """INSERT INTO room_log
-            (building, room_num, assigned_club) VALUES (?,?,?)
-            """,
-                (building, room_num, club),
-            )
+            row = tables.RoomLog(building, room_num, club)
+            cursor.execute(row.insert_format, (room_id, club))
             conn.commit()
         location = flask.url_for("admin.club_config", club_name=club)
         return flask.redirect(location)
@@ -183,66 +189,116 @@ def display_admin_emails():
                 print(selected_email)
                 remove_admin_email(conn, selected_email)
         return flask.redirect(flask.url_for("admin.display_admin_emails"))
-    query = """
-            SELECT
-                admin_email
-            FROM
-                admin_emails
-            """
-    email_list = conn.execute(query).fetchall()
-    emails = [row[0] for row in email_list]
+    page = search.search_admin_emails(conn)  # later pages and searches come from admin_email_search_json
     return flask.render_template(
         "display_admin_emails.html",
-        list=emails,
+        list=[result["email"] for result in page.results],
+        next_cursor=page.next_cursor,
     )
     return flask.render_template("admin_home.html", authenticated=auth, user=un, title="DASHBOARD")
 
 
+@ADMIN.route("/email-list/search", methods=["GET"])
+@auth.required
+def admin_email_search_json() -> flask.Response:
+    """Search admin emails, paged with the cursor from the last page."""
+    conn: sqlite3.Connection = flask.current_app.get_db()  # type: ignore
+    return _search_json(conn, search.search_admin_emails)
+
+
+def _search_json(conn: sqlite3.Connection, search_fn: Callable[..., search.Page]) -> flask.Response:
+    """Run a search from the q, cursor and limit query args and send the page as JSON."""
+    try:
+        page = search_fn(
+            conn,
+            flask.request.args.get("q", ""),
+            flask.request.args.get("cursor") or None,
+            flask.request.args.get("limit", search.PAGE_SIZE, type=int),
+        )
+    except ValueError as e:  # cursor was edited by hand
+        return flask.make_response(flask.jsonify({"error": str(e)}), 400)
+    return flask.jsonify({"results": page.results, "next_cursor": page.next_cursor})
+
+
 @ADMIN.route("/db-management", methods=["GET", "POST"])
 @auth.required
 def db_management() -> str:
     """DB Management Tools."""
-    return flask.render_template("db_management.html")
+    conn: sqlite3.Connection = flask.current_app.get_db()  # type: ignore
+    backups = backup.recent(conn)
+    conn.commit()  # backup_log may have just been created
+    return flask.render_template("db_management.html", job_id=flask.request.args.get("job"), backups=backups)
+
+
+@ADMIN.route("/backup-db", methods=["POST"])
+@auth.required
+def backup_db() -> flask.Response:
+    """Start an online backup in the background, it shows up in the backup list once it's running."""
+    config = flask.current_app.config
+    try:
+        backup.backup_in_background(
+            config["DATABASE"],
+            pathlib.Path(config["BACKUP_DIR"]),
+            int(config["BACKUP_KEEP"]),
+            int(config["BACKUP_PAGES_PER_STEP"]),
+            float(config["BACKUP_STEP_SLEEP"]),
+        )
+    except backup.BackupRunningError as e:
+        flask.flash(str(e), "info")
+    else:
+        flask.flash("backup started, refresh to see when it's done", "info")
+    return flask.redirect(flask.url_for("admin.db_management"))  # type: ignore
+
+
+@ADMIN.route("/maintenance", methods=["GET", "POST"])
+@auth.required
+def db_maintenance() -> str | flask.Response:
+    """Show recent maintenance runs, posting starts one right away."""
+    if flask.request.method == "POST":
+        config = flask.current_app.config
+        try:
+            maintenance.run_in_background(
+                config["DATABASE"],
+                float(config["MAINTENANCE_SECONDS"]),
+                int(config["MAINTENANCE_VACUUM_PAGES"]),
+            )
+        except maintenance.MaintenanceRunningError as e:
+            flask.flash(str(e), "info")
+        else:
+            flask.flash("maintenance started, refresh to see when it's done", "info")
+        return flask.redirect(flask.url_for("admin.db_maintenance"))  # type: ignore
+
+    conn: sqlite3.Connection = flask.current_app.get_db()  # type: ignore
+    runs = maintenance.recent(conn)
+    conn.commit()  # maintenance_log may have just been created
+    return flask.render_template("db_maintenance.html", runs=runs, title="DB MAINTENANCE")
 
 
 @ADMIN.route("/dump-db", methods=["POST"])
 @auth.required
 def dump_db() -> flask.Response:
-    """Export Database Contents as CSV before wiping database contents."""
-    with flask.current_app.app_context():
-        conn: sqlite3.Connection = flask.current_app.get_db()  # type: ignore
-
-    csv_file = pathlib.Path("./sqlite/export_input_data.csv")
-    with (
-        csv_file.open("w", encoding="utf-8") as f,
-        pathlib.Path("./sqlite/init.sql").open("r", encoding="utf-8") as sql_script,
-    ):
-        # read and write input data to output file
-        f.write(",".join(tables.InputData._fields) + "\n")
-        query = "SELECT * FROM input_data ORDER BY date_entered"
-        cursor = conn.execute(query)
-        for row in cursor:
-            line = ",".join([str(r) for r in row]) + "\n"
-            f.write(line)
-
-        # read read in init table sql code and execute -> reset table
-        script = sql_script.read()
-        input_start = script.index("CREATE TABLE input_data")
-        create_input_data = script[input_start : script.index(";", input_start) + 1]
-        conn.execute("DROP TABLE IF EXISTS input_data;\n")
-        conn.execute(create_input_data)
-        conn.commit()
+    """Export records added since the last export as CSV, deleting them only if asked to."""
+    export_dir = pathlib.Path(flask.current_app.config["EXPORT_DIR"])
+    # only the checkbox deletes anything, exported rows are kept by default
+    retain_days = 0 if flask.request.form.get("purge") is not None else None
+    result = export.export_new_rows(flask.current_app.config["DATABASE"], export_dir, retain_days)
+
+    if not result.chunks:
+        flask.flash(f"no new records since the last export, {result.purged} exported records deleted", "info")
+        return flask.redirect(flask.url_for("admin.db_management"))  # type: ignore
 
     timestamp = datetime.today().strftime("%m_%d_%Y")
-    return flask.send_file(
-        csv_file.absolute(), mimetype="text/csv", as_attachment=True, download_name=f"input_data_{timestamp}.csv"
+    return flask.Response(
+        flask.stream_with_context(export.read_chunks(result.chunks)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=input_data_{timestamp}.csv"},
     )
 
 
 @ADMIN.route("/upload-csv", methods=["POST"])
 @auth.required
 def upload_csv() -> flask.Response:
-    """Attempt to load the given CSV file into database."""
+    """Spool the given CSV file and queue it to be loaded into the database in the background."""
     with flask.current_app.app_context():
         conn: sqlite3.Connection = flask.current_app.get_db()  # type: ignore
 
@@ -256,28 +312,64 @@ def upload_csv() -> flask.Response:
         flask.flash("input file is not the correct type")
         return flask.redirect(flask.url_for("admin.db_management"))  # type: ignore
 
+    # save to the spool dir so the request is done as soon as the file has arrived
+    job_id, spool_path = upload_jobs.new_job(pathlib.Path(flask.current_app.config["UPLOAD_SPOOL_DIR"]))
+    f.save(spool_path)
+
     # validate format of the data
-    header = f.stream.readline().decode("utf-8").strip().split(",")
     try:
-        compare = zip(header, tables.InputData._fields, strict=True)
-        if not all(map(lambda i: i[0] == i[1], compare)):
-            msg = "mismatched columns from csv"
-            raise ValueError(msg)
+        upload_jobs.check_header(spool_path)
     except ValueError as e:
+        spool_path.unlink()
         flask.flash(f"input file rejected {e}")
         return flask.redirect(flask.url_for("admin.db_management"))  # type: ignore
 
-    # file is valid, read into db
-    while True:
-        line = f.stream.readline().decode("utf-8").strip().split(",")
-        if not line[0]:
-            break  # exit when empty line hit
-        try:
-            row = tables.InputData.from_list(line)
-            conn.execute(row.insert_format(), row)
-        except ValueError as e:
-            flask.flash(f"bad record {e}")
-            return flask.redirect(flask.url_for("admin.db_management"))  # type: ignore
+    # file is valid, background job loads it and the page polls for progress
+    upload_jobs.submit(conn, job_id, f.filename or "", spool_path)
+    conn.commit()
+    return flask.redirect(flask.url_for("admin.db_management", job=job_id))  # type: ignore
+
 
-    conn.commit()  # save changes
+@ADMIN.route("/import-clubs", methods=["POST"])
+@auth.required
+def import_clubs() -> flask.Response:
+    """Add clubs or room assignments in bulk from an uploaded CSV, conflicts are skipped unless overwrite is checked."""
+    conn: sqlite3.Connection = flask.current_app.get_db()  # type: ignore
+
+    f = flask.request.files.get("import_csv")
+    if f is None or not (f.filename or "").endswith(".csv"):
+        flask.flash("import file missing or not a csv")
+        return flask.redirect(flask.url_for("admin.db_management"))  # type: ignore
+
+    rows = csv.reader(io.TextIOWrapper(f.stream, encoding="utf-8-sig", newline=""))
+    overwrite = flask.request.form.get("overwrite") is not None
+    try:
+        if flask.request.form.get("kind") == "rooms":
+            result = bulk_import.import_room_assignments(conn, rows, overwrite)
+        else:
+            result = bulk_import.import_clubs(conn, rows, overwrite)
+    except (UnicodeDecodeError, csv.Error) as e:
+        flask.flash(f"import file rejected {e}")
+        return flask.redirect(flask.url_for("admin.db_management"))  # type: ignore
+
+    flask.flash(f"import done: {result.summary()}", "info")
+    # flashes live in the session cookie, so only the first few messages fit, the cli prints them all
+    messages = [f"conflict {m}" for m in result.conflict_messages] + [f"rejected {m}" for m in result.error_messages]
+    for message in messages[:IMPORT_FLASH_MESSAGES]:
+        flask.flash(message, "info")
+    if len(messages) > IMPORT_FLASH_MESSAGES:
+        flask.flash(f"...and {result.conflicts + result.rejected - IMPORT_FLASH_MESSAGES} more", "info")
     return flask.redirect(flask.url_for("admin.db_management"))  # type: ignore
+
+
+@ADMIN.route("/upload-jobs/<job_id>", methods=["GET"])
+@auth.required
+def upload_job_status(job_id: str) -> flask.Response:
+    """Progress of a background upload as JSON, polled by the db management page."""
+    with flask.current_app.app_context():
+        conn: sqlite3.Connection = flask.current_app.get_db()  # type: ignore
+
+    job = upload_jobs.status(conn, job_id)
+    if job is None:
+        return flask.Response(status=404)
+    return flask.jsonify(job)
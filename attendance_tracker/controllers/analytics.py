@@ -5,11 +5,26 @@ from __future__ import annotations
 import json
 import re
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
 from datetime import datetime, timedelta
-from typing import Literal, NamedTuple, Sequence, TypedDict
+from pathlib import Path
+from typing import Any, Callable, Iterator, Literal, NamedTuple, Sequence, TypedDict
 
 import flask
 from flask import Blueprint
+from markupsafe import Markup
+
+from attendance_tracker.analytics.admission import AdmissionController, AdmissionRejectedError, estimate_cost
+from attendance_tracker.analytics.cache import ResultCache
+from attendance_tracker.analytics.columnar import ColumnarSnapshot
+from attendance_tracker.analytics.live import ChangeFeed, FeedFullError
+from attendance_tracker.analytics.singleflight import SingleFlight, SingleFlightFullError
+from attendance_tracker.db import archive, calendar
+from attendance_tracker.db.connection import QueryTimeoutError, connect_read_only, fetch_all
+from attendance_tracker.db.ingest_log import data_version
 
 ANALYTICS = Blueprint(
     name="analytics",
@@ -17,6 +32,51 @@ ANALYTICS = Blueprint(
     url_prefix="/h/analytics",
 )
 
+# quick select durations offered by the analytics forms, warmed into the cache after each load
+DURATION_PRESETS = [(2, "weeks"), (1, "month"), (3, "months"), (6, "months"), (1, "year")]
+# shared by request threads and the cache warmer, max_waiters is set from config by create_app
+single_flight = SingleFlight()
+KEEPALIVE_SECONDS = 15  # comment sent on idle event streams so proxies don't drop them
+RECONNECT_MS = 3_000  # how long browsers wait before reopening a closed event stream
+# fetched by open pages, errors have to come back as a status their scripts can check instead of a redirect
+JSON_ENDPOINTS = {"analytics.room_activity_data", "analytics.usage_data"}
+
+
+@ANALYTICS.errorhandler(QueryTimeoutError)
+def query_timeout(e: QueryTimeoutError) -> flask.Response:
+    """Send user back to the form when a query gets cancelled for running too long."""
+    message = "Query took too long to run, please narrow your date range and try again"
+    if flask.request.endpoint in JSON_ENDPOINTS:
+        return flask.make_response(flask.jsonify({"error": message}), 503)
+    flask.flash(message)
+    return flask.redirect(flask.request.path)  # type: ignore
+
+
+@ANALYTICS.errorhandler(SingleFlightFullError)
+def too_many_waiters(e: SingleFlightFullError) -> flask.Response:
+    """Tell the user to retry when too many people are already waiting on the same query."""
+    message = "Lots of people are running this same query right now, please try again in a moment"
+    if flask.request.endpoint in JSON_ENDPOINTS:
+        return flask.make_response(flask.jsonify({"error": message}), 503)
+    flask.flash(message)
+    return flask.redirect(flask.request.path)  # type: ignore
+
+
+@ANALYTICS.errorhandler(AdmissionRejectedError)
+def admission_rejected(e: AdmissionRejectedError) -> flask.Response:
+    """Answer 429 with a Retry-After so clients back off instead of piling on more big queries."""
+    response = flask.make_response(f"Too many large queries, {e}. Please try again in {e.retry_after} seconds", 429)
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+@ANALYTICS.errorhandler(FeedFullError)
+def feed_full(e: FeedFullError) -> flask.Response:
+    """Have browsers reconnect later when this worker has no room for another live page."""
+    response = flask.make_response("Too many live pages open, retrying shortly", 503)
+    response.headers["Retry-After"] = str(RECONNECT_MS // 1000)
+    return response
+
 
 @ANALYTICS.route("/home", methods=["GET"])
 def home() -> str:
@@ -30,158 +90,493 @@ def home() -> str:
 @ANALYTICS.route("/room-activity", methods=["GET", "POST"])
 def room_activity() -> flask.Response | str:
     """View data based on query entered using form."""
-    with flask.current_app.app_context():
-        conn: sqlite3.Connection = flask.current_app.get_db()  # type: ignore
-    chart_config = _create_chart()  # default empty plot
-    summary_table: dict[str, tuple[float | int, str]] = {}  # empty stats table
+    conn: sqlite3.Connection = flask.current_app.get_analytics_db()  # type: ignore
+    cache: ResultCache = flask.current_app.result_cache  # type: ignore
+    snapshot: ColumnarSnapshot | None = flask.current_app.columnar_snapshot  # type: ignore
+    version = data_version(conn)
+    result: _RoomActivityResult = {
+        "chart_config": _create_chart(),  # default empty plot
+        "summary_table": {},  # empty stats table
+    }
+    live = None  # what the page shows, so it can refetch when a load touches it
 
     if flask.request.method == "POST":
         # read form inputs
         location = flask.request.form.get("location", "")
-        start = flask.request.form.get("start_date", "")
-        end = flask.request.form.get("end_date", "")
-        result = re.match(r"(.+) (\d+)", location)
-        duration = flask.request.form.get("duration", "")
-
-        if duration != "Custom":  # user choose query relative to today!
-            match duration.split():
-                case [d, "weeks"]:
-                    num_weeks = int(d)  # its already weeks
-                case [d, "month" | "months"]:
-                    num_weeks = int(d) * 4  # month -> weeks
-                case [d, "year" | "years"]:
-                    num_weeks = int(d) * 52  # year -> weeks
-                case _:
-                    # should only get here if input is changed without testing later...
-                    msg = f"unexpected duration {duration}"
-                    raise ValueError(msg)
-            end = datetime.today().strftime("%Y-%m-%d")
-            start = (datetime.today() - timedelta(weeks=num_weeks)).strftime("%Y-%m-%d")
-
-        if all((location, start, end)) and result is not None:
-            building, room = result.groups()
-            query = """
-                    SELECT
-                        times_accessed, date_entered
-                    FROM
-                        input_data
-                    WHERE
-                        building = ? AND
-                        room_num = ? AND
-                        date_entered BETWEEN ? AND ?
-                    ORDER BY
-                        date_entered
-                    """
-            results = conn.execute(
-                query,
-                (building, room, start, end),
-            ).fetchall()
-            x_axis = []
-            y_axis = []
-            for accesses, date in results:
-                x_axis.append(date)
-                y_axis.append(accesses)
-
-            total = sum(y_axis)
-            # summary table has format "Stat Label" | "Value" | "Date Occurred"
-            summary_table["Min"] = min(results, key=lambda i: i[0])
-            summary_table["Avg"] = (
-                total / len(y_axis),
-                "-",
-            )
-            summary_table["Max"] = max(results, key=lambda i: i[0])
-            summary_table["Total"] = total, "-"
-
-            chart_config = _create_chart(
-                "line",
-                x_axis,
-                [Series(f"{building} {room}", y_axis)],
-            )
+        location_match = re.match(r"(.+) (\d+)", location.strip())
+        group = _group(flask.request.form.get("group", ""))
+        start, end = _resolve_range(
+            flask.request.form.get("duration", ""),
+            flask.request.form.get("start_date", ""),
+            flask.request.form.get("end_date", ""),
+        )
+
+        if all((start, end)) and location_match is not None:
+            building, room = location_match.groups()
+            result = _cached_room_activity(cache, conn, version, snapshot, building, int(room), start, end, group)
+            live = {
+                "version": version,
+                "location": f"{building} {int(room)}",
+                "start": start,
+                "end": end,
+                "group": group,
+            }
             # TODO (Anyone): improve error handling for query fail
 
     # must be GET method
-    # TODO (Gavin): Figure out how to cache location query for repeat visits
-    query = """
-        SELECT DISTINCT
-            building, room_num
-        FROM
-            input_data
-        ORDER BY
-            room_num
-        """
-    locations = conn.execute(query).fetchall()
+    locations = _cached_locations(cache, conn, version)
 
-    # TODO (Gavin): Add debounce on form submit so we dont lock DB lol
     return flask.render_template(
         "room_activity.html",
-        chart_config=json.dumps(chart_config),
-        summary_table=summary_table,
+        chart_config=_inline_json(result["chart_config"]),
+        summary_table=result["summary_table"],
+        live_query=_inline_json(live),
         locations=locations,
+        durations=DURATION_PRESETS,
+        groups=list(calendar.GROUPS),
     )
 
 
+@ANALYTICS.route("/room-activity/data", methods=["GET"])
+def room_activity_data() -> flask.Response:
+    """Chart config and summary for one room as JSON, fetched by the page when new data lands."""
+    conn: sqlite3.Connection = flask.current_app.get_analytics_db()  # type: ignore
+    cache: ResultCache = flask.current_app.result_cache  # type: ignore
+    snapshot: ColumnarSnapshot | None = flask.current_app.columnar_snapshot  # type: ignore
+    location_match = re.match(r"(.+) (\d+)", flask.request.args.get("location", "").strip())
+    start = flask.request.args.get("start", "")
+    end = flask.request.args.get("end", "")
+    if not (start and end) or location_match is None:
+        return flask.make_response(flask.jsonify({"error": "location, start and end are required"}), 400)
+
+    building, room = location_match.groups()
+    group = _group(flask.request.args.get("group", ""))
+    result = _cached_room_activity(cache, conn, data_version(conn), snapshot, building, int(room), start, end, group)
+    return flask.jsonify(result)
+
+
 @ANALYTICS.route("/usage", methods=["GET", "POST"])
 def usage() -> str:
     """View usage of all rooms over the last 3 months."""
-    with flask.current_app.app_context():
-        conn: sqlite3.Connection = flask.current_app.get_db()  # type: ignore
+    conn: sqlite3.Connection = flask.current_app.get_analytics_db()  # type: ignore
+    cache: ResultCache = flask.current_app.result_cache  # type: ignore
+    snapshot: ColumnarSnapshot | None = flask.current_app.columnar_snapshot  # type: ignore
     chart_config = _create_chart()  # default empty plot
+    live = None  # what the page shows, so it can refetch when a load touches it
 
     if flask.request.method == "POST":
         # read form inputs
-        start = flask.request.form.get("start_date", "")
-        end = flask.request.form.get("end_date", "")
-        duration = flask.request.form.get("duration", "")
+        start, end = _resolve_range(
+            flask.request.form.get("duration", ""),
+            flask.request.form.get("start_date", ""),
+            flask.request.form.get("end_date", ""),
+        )
         descending = flask.request.form.get("descending") is not None
 
-        if duration != "Custom":  # user choose query relative to today!
-            match duration.split():
-                case [d, "weeks"]:
-                    num_weeks = int(d)  # its already weeks
-                case [d, "month" | "months"]:
-                    num_weeks = int(d) * 4  # month -> weeks
-                case [d, "year" | "years"]:
-                    num_weeks = int(d) * 52  # year -> weeks
-                case _:
-                    # should only get here if input is changed without testing later...
-                    msg = f"unexpected duration {duration}"
-                    raise ValueError(msg)
-            end = datetime.today().strftime("%Y-%m-%d")
-            start = (datetime.today() - timedelta(weeks=num_weeks)).strftime("%Y-%m-%d")
-
         if start and end:
-            query = """
-                    SELECT
-                        building || ' ' || room_num AS location,
-                        SUM(times_accessed) AS num_accesses
-                    FROM
-                        input_data
-                    WHERE
-                        date_entered BETWEEN ? AND ?
-                    GROUP BY
-                        location
-                    """
-            results = conn.execute(
-                query + f"ORDER BY num_accesses {'DESC' if descending else 'ASC'};",
-                (start, end),
-            ).fetchall()
-            x_axis = []
-            y_axis = []
-            for location, accesses in results:
-                x_axis.append(location)
-                y_axis.append(accesses)
-
-            chart_config = _create_chart(
-                "bar",
-                x_axis,
-                [Series("Number of Accesses", y_axis)],
-            )
+            version = data_version(conn)
+            chart_config = _cached_usage(cache, conn, version, snapshot, start, end, descending)
+            live = {"version": version, "start": start, "end": end, "descending": descending}
             # TODO (Anyone): improve error handling for query fail
 
     # must be GET method
     return flask.render_template(
         "room_usage.html",
-        chart_config=json.dumps(chart_config),
+        chart_config=_inline_json(chart_config),
+        live_query=_inline_json(live),
+        durations=DURATION_PRESETS,
+    )
+
+
+@ANALYTICS.route("/usage/data", methods=["GET"])
+def usage_data() -> flask.Response:
+    """Usage chart config as JSON, fetched by the page when new data lands."""
+    conn: sqlite3.Connection = flask.current_app.get_analytics_db()  # type: ignore
+    cache: ResultCache = flask.current_app.result_cache  # type: ignore
+    snapshot: ColumnarSnapshot | None = flask.current_app.columnar_snapshot  # type: ignore
+    start = flask.request.args.get("start", "")
+    end = flask.request.args.get("end", "")
+    if not (start and end):
+        return flask.make_response(flask.jsonify({"error": "start and end are required"}), 400)
+
+    descending = flask.request.args.get("descending") == "true"
+    chart_config = _cached_usage(cache, conn, data_version(conn), snapshot, start, end, descending)
+    return flask.jsonify({"chart_config": chart_config})
+
+
+@ANALYTICS.route("/events", methods=["GET"])
+def events() -> flask.Response:
+    """Stream a data-changed event every time a load commits, with the rooms and days it touched.
+
+    Streams end after `LIVE_STREAM_SECONDS` so worker threads get recycled, browsers
+    reconnect on their own and pick up from the last event id they saw.
+    """
+    feed: ChangeFeed = flask.current_app.change_feed  # type: ignore
+    subscription = feed.subscribe()
+    last_seen = flask.request.headers.get("Last-Event-ID") or flask.request.args.get("after", "")
+    after = int(last_seen) if last_seen.isdigit() else feed.latest()
+    deadline = time.monotonic() + flask.current_app.config["LIVE_STREAM_SECONDS"]
+
+    def stream() -> Iterator[str]:
+        nonlocal after
+        yield f"retry: {RECONNECT_MS}\n\n"
+        while (remaining := deadline - time.monotonic()) > 0:
+            changes = feed.changes_after(after, timeout=min(remaining, KEEPALIVE_SECONDS))
+            if not changes:
+                yield ": keepalive\n\n"
+                continue
+            for change in changes:
+                yield change.as_event()
+                after = change.version
+
+    response = flask.Response(stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # nginx would otherwise hold events back in its buffer
+    response.call_on_close(subscription.close)  # runs even if the stream never started
+    return response
+
+
+@ANALYTICS.route("/cache-stats", methods=["GET"])
+def cache_stats() -> flask.Response:
+    """Hit/miss counters for the analytics result cache, how many requests were coalesced or turned away."""
+    cache: ResultCache = flask.current_app.result_cache  # type: ignore
+    admission: AdmissionController = flask.current_app.admission  # type: ignore
+    return flask.jsonify({**cache.stats(), "single_flight": single_flight.stats(), "admission": admission.stats()})
+
+
+_warm_lock = threading.Lock()
+
+
+def warm_cache(
+    db_path: Path,
+    cache: ResultCache,
+    query_timeout: float = 30.0,
+    max_workers: int = 2,
+    snapshot: ColumnarSnapshot | None = None,
+) -> int:
+    """Compute every duration preset for usage and for each room so first page loads hit the cache.
+
+    Each worker thread opens its own read only connection, returns the number of results cached.
+    The columnar snapshot is refreshed first when enabled so warmed results come from new data.
+    """
+    with _warm_lock:  # loads close together shouldn't double the work
+        if snapshot is not None:
+            snapshot.refresh(db_path)
+
+        with closing(connect_read_only(db_path, query_timeout)) as conn:
+            version = data_version(conn)
+            locations = _cached_locations(cache, conn, version)
+
+        def warm_one(kind: str, start: str, end: str, *args) -> None:
+            with closing(connect_read_only(db_path, query_timeout)) as conn:
+                if kind == "usage":
+                    _cached_usage(cache, conn, version, snapshot, start, end, *args)
+                else:
+                    _cached_room_activity(cache, conn, version, snapshot, *args, start, end)
+
+        tasks = []
+        for d, unit in DURATION_PRESETS:
+            start, end = _resolve_range(f"{d} {unit}", "", "")
+            tasks.extend(("usage", start, end, descending) for descending in (False, True))
+            tasks.extend(("room_activity", start, end, building, room) for building, room in locations)
+
+        warmed = 0
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cache-warm") as pool:
+            futures = [pool.submit(warm_one, *task) for task in tasks]
+            for future in as_completed(futures):
+                if future.exception() is None:
+                    warmed += 1
+                else:
+                    print(f"cache warm failed: {future.exception()}")
+
+    print(f"warmed {warmed}/{len(tasks)} analytics results for data version {version}")
+    return warmed
+
+
+def warm_cache_in_background(
+    db_path: Path,
+    cache: ResultCache,
+    query_timeout: float,
+    max_workers: int,
+    snapshot: ColumnarSnapshot | None = None,
+) -> None:
+    """Start warm_cache on a daemon thread so the load that triggered it isn't held up."""
+    threading.Thread(
+        target=warm_cache,
+        args=(db_path, cache, query_timeout, max_workers, snapshot),
+        name="cache-warm",
+        daemon=True,
+    ).start()
+
+
+def _coalesced(cache: ResultCache, key: str, compute: Callable[[], Any], cost: int = 0) -> Any:
+    """Get a cached result, identical requests arriving together share one computation.
+
+    Cached results are free. On a miss every request is charged to its own client before
+    joining the flight, and only the request that runs the query takes a heavy query slot.
+    Cache warming runs outside a request and always goes.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+    if not cost or not flask.has_request_context():
+        return single_flight.do(key, lambda: cache.get_or_compute(key, compute))
+
+    admission: AdmissionController = flask.current_app.admission  # type: ignore
+    with admission.budget(flask.request.remote_addr or "", cost):
+        return single_flight.do(
+            key, lambda: cache.get_or_compute(key, lambda: _in_heavy_slot(admission, compute, cost))
+        )
+
+
+def _in_heavy_slot(admission: AdmissionController, compute: Callable[[], Any], cost: int) -> Any:
+    with admission.heavy_slot(cost):
+        return compute()
+
+
+def _cached_locations(cache: ResultCache, conn: sqlite3.Connection, version: int) -> list[tuple[str, int]]:
+    return _coalesced(
+        cache,
+        cache.make_key("locations", version),
+        lambda: _locations(conn),
+    )
+
+
+def _cached_room_activity(
+    cache: ResultCache,
+    conn: sqlite3.Connection,
+    version: int,
+    snapshot: ColumnarSnapshot | None,
+    building: str,
+    room: int,
+    start: str,
+    end: str,
+    group: str = "day",
+) -> _RoomActivityResult:
+    return _coalesced(
+        cache,
+        cache.make_key("room_activity", building, room, start, end, group, version),
+        lambda: _room_activity_result(conn, building, room, start, end, _current(snapshot, version), group),
+        estimate_cost(start, end, rooms=1),
+    )
+
+
+def _cached_usage(
+    cache: ResultCache,
+    conn: sqlite3.Connection,
+    version: int,
+    snapshot: ColumnarSnapshot | None,
+    start: str,
+    end: str,
+    descending: bool,
+) -> _ChartJSConfig:
+    return _coalesced(
+        cache,
+        cache.make_key("usage", start, end, descending, version),
+        lambda: _usage_result(conn, start, end, descending, _current(snapshot, version)),
+        estimate_cost(start, end, rooms=len(_cached_locations(cache, conn, version))),
+    )
+
+
+def _current(snapshot: ColumnarSnapshot | None, version: int) -> ColumnarSnapshot | None:
+    """Only use the columnar snapshot if it has caught up with the db, otherwise fall back to sql."""
+    if snapshot is not None and snapshot.is_current(version):
+        return snapshot
+    return None
+
+
+def _group(group: str) -> str:
+    """Turn the group form input into a calendar group, anything unknown shows days."""
+    group = group.strip().lower()
+    return group if group in calendar.GROUPS else "day"
+
+
+def _resolve_range(duration: str, start: str, end: str) -> tuple[str, str]:
+    """Turn the duration form input into a start and end date, custom ranges pass through."""
+    duration = duration.strip()
+    if duration in ("", "Custom"):
+        return start, end
+
+    # user choose query relative to today!
+    match duration.split():
+        case [d, "weeks"]:
+            num_weeks = int(d)  # its already weeks
+        case [d, "month" | "months"]:
+            num_weeks = int(d) * 4  # month -> weeks
+        case [d, "year" | "years"]:
+            num_weeks = int(d) * 52  # year -> weeks
+        case _:
+            # should only get here if input is changed without testing later...
+            msg = f"unexpected duration {duration}"
+            raise ValueError(msg)
+    end = datetime.today().strftime("%Y-%m-%d")
+    start = (datetime.today() - timedelta(weeks=num_weeks)).strftime("%Y-%m-%d")
+    return start, end
+
+
+def _locations(conn: sqlite3.Connection) -> list[tuple[str, int]]:
+    """All building/room pairs that have data, used to fill the location dropdown."""
+    query = """
+        SELECT
+            building, room_num
+        FROM
+            rooms
+        WHERE
+            EXISTS (SELECT 1 FROM input_data WHERE input_data.room_id = rooms.room_id) OR
+            room_id IN (SELECT value FROM archive_manifest, json_each(archive_manifest.room_ids))
+        ORDER BY
+            room_num
+        """
+    return [tuple(row) for row in fetch_all(conn, query)]
+
+
+class _RoomActivityResult(TypedDict):
+    chart_config: _ChartJSConfig
+    summary_table: dict[str, tuple[float | int, str]]
+
+
+def _room_activity_result(
+    conn: sqlite3.Connection,
+    building: str,
+    room: int,
+    start: str,
+    end: str,
+    snapshot: ColumnarSnapshot | None = None,
+    group: str = "day",
+) -> _RoomActivityResult:
+    """Query accesses for one room and build the line chart + summary stats.
+
+    Every day, week, month or term in the range gets a point, zero when the room has
+    no data for it, so gaps show on the chart and count towards the average.
+    """
+    archived = archive.room_activity(conn, building, room, start, end)
+    if snapshot is None and not archived:
+        results = calendar.room_activity(conn, building, room, start, end, group)  # zero filled in the query
+    else:
+        if snapshot is not None:
+            room_id = fetch_all(conn, "SELECT room_id FROM rooms WHERE building = ? AND room_num = ?", (building, room))
+            rows = snapshot.room_activity(room_id[0][0], start, end) if room_id else []
+        else:
+            rows = _room_activity_rows(conn, building, room, start, end)
+        results = calendar.series(conn, [*rows, *archived], start, end, group)
+
+    summary_table: dict[str, tuple[float | int, str]] = {}
+    if not results:  # range is outside the calendar
+        return _RoomActivityResult(chart_config=_create_chart(), summary_table=summary_table)
+
+    x_axis = []
+    y_axis = []
+    for accesses, label in results:
+        x_axis.append(label)
+        y_axis.append(accesses)
+
+    total = sum(y_axis)
+    # summary table has format "Stat Label" | "Value" | "Date Occurred"
+    summary_table["Min"] = min(results, key=lambda i: i[0])
+    summary_table["Avg"] = (
+        total / len(y_axis),
+        "-",
+    )
+    summary_table["Max"] = max(results, key=lambda i: i[0])
+    summary_table["Total"] = total, "-"
+
+    return _RoomActivityResult(
+        chart_config=_create_chart(
+            "line",
+            x_axis,
+            [Series(f"{building} {room}", y_axis)],
+        ),
+        summary_table=summary_table,
+    )
+
+
+def _room_activity_rows(
+    conn: sqlite3.Connection,
+    building: str,
+    room: int,
+    start: str,
+    end: str,
+) -> list[tuple[int, str]]:
+    """Get accesses per day for one room using sql, as (accesses, date) pairs, days without data are left out."""
+    query = """
+            SELECT
+                times_accessed, date_entered
+            FROM
+                input_data
+            WHERE
+                room_id = (SELECT room_id FROM rooms WHERE building = ? AND room_num = ?) AND
+                date_entered BETWEEN ? AND ?
+            ORDER BY
+                date_entered
+            """
+    return fetch_all(
+        conn,
+        query,
+        (building, room, start, end),
+    )
+
+
+def _usage_result(
+    conn: sqlite3.Connection,
+    start: str,
+    end: str,
+    descending: bool,
+    snapshot: ColumnarSnapshot | None = None,
+) -> _ChartJSConfig:
+    """Query total accesses per room and build the bar chart."""
+    if snapshot is not None:
+        labels = dict(fetch_all(conn, "SELECT room_id, building || ' ' || room_num FROM rooms"))
+        totals = sorted(snapshot.usage(start, end), key=lambda i: i[1], reverse=descending)
+        results = [(labels[room_id], accesses) for room_id, accesses in totals]
+    else:
+        results = _usage_rows(conn, start, end, descending)
+    archived = archive.usage(conn, start, end)
+    if archived:
+        totals = dict(results)
+        for location, accesses in archived.items():
+            totals[location] = totals.get(location, 0) + accesses
+        results = sorted(totals.items(), key=lambda i: i[1], reverse=descending)
+
+    x_axis = []
+    y_axis = []
+    for location, accesses in results:
+        x_axis.append(location)
+        y_axis.append(accesses)
+
+    return _create_chart(
+        "bar",
+        x_axis,
+        [Series("Number of Accesses", y_axis)],
+    )
+
+
+def _usage_rows(
+    conn: sqlite3.Connection,
+    start: str,
+    end: str,
+    descending: bool,
+) -> list[tuple[str, int]]:
+    """Get total accesses per room using sql, as (location, total) pairs."""
+    query = """
+            SELECT
+                building || ' ' || room_num AS location,
+                num_accesses
+            FROM (
+                SELECT
+                    room_id,
+                    SUM(times_accessed) AS num_accesses
+                FROM
+                    input_data
+                WHERE
+                    date_entered BETWEEN ? AND ?
+                GROUP BY
+                    room_id
+            ) JOIN rooms USING (room_id)
+            """
+    return fetch_all(
+        conn,
+        query + f"ORDER BY num_accesses {'DESC' if descending else 'ASC'};",
+        (start, end),
     )
 
 
@@ -198,6 +593,12 @@ class Series(NamedTuple):
     points: list[int | float]
 
 
+def _inline_json(value: Any) -> Markup:
+    """Serialize compactly for a <script type="application/json"> block, escaped so it can't close the tag."""
+    encoded = json.dumps(value, separators=(",", ":"))
+    return Markup(encoded.replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026"))
+
+
 def _create_chart(
     type: Literal["bar", "line"] = "line",
     x_vals: Sequence[int | float] | None = None,
@@ -248,40 +649,4 @@ def _create_bar_chart(
     datasets: Sequence[Series] | None = None,
 ) -> _ChartJSConfig:
     """Create a bar chart from the given data."""
-    if x_vals is not None and datasets is not None:
-        data = {  # convert to dict if both lists present
-            "labels": x_vals,
-            "datasets": [{"label": n, "data": d} for n, d in datasets],
-        }
-    else:  # default to empty plot if both lists aren't there
-        data = {
-            "labels": [],
-            "datasets": [{"label": ""}],
-        }
-
-    options = {  # adding these so the chart can be resized
-        "responsive": True,
-        "maintainAspectRatio": False,
-        "scales": {
-            "x": {
-                "display": True,
-                "title": {
-                    "display": True,
-                    "text": "Week",
-                },
-            },
-            "y": {
-                "display": True,
-                "title": {
-                    "display": True,
-                    "text": "Number of Accesses",
-                },
-            },
-        },
-    }
-
-    return _ChartJSConfig(
-        type="bar",
-        data=data,
-        options=options,
-    )
+    return _create_chart("bar", x_vals, datasets)
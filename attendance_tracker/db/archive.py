@@ -0,0 +1,243 @@
+"""Tiered storage for input_data, old months move out of the hot table into compressed partitions.
+
+Every partition is a gzipped csv holding one month (or a late batch for a month that was
+already archived), written once and never modified. Partitions are listed in the
+archive_manifest table with their date range, rooms and checksum, so readers only open
+the partitions that overlap the range they were asked for.
+"""
+
+from __future__ import annotations
+
+import csv
+import functools
+import gzip
+import hashlib
+import io
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+from typing import NamedTuple
+
+from attendance_tracker.db.connection import fetch_all
+from attendance_tracker.db.export import clamp_watermark
+from attendance_tracker.db.ingest_log import Changes, notify_ingest, record_ingest
+from attendance_tracker.db.rooms import normalize_room_num
+from attendance_tracker.types import tables
+
+# partitions are immutable so decompressed rows can be kept around, this bounds how many
+PARTITION_CACHE_SIZE = 64
+ARCHIVE_CHUNK_ROWS = 5_000  # rows moved per write transaction, each chunk is its own partition
+
+
+class ArchiveResult(NamedTuple):
+    """What a single archive run did."""
+
+    partitions: int
+    rows: int
+    cutoff: str
+
+
+def archive_old_rows(
+    db_path: Path,
+    archive_dir: Path,
+    horizon_days: int,
+    chunk_rows: int = ARCHIVE_CHUNK_ROWS,
+) -> ArchiveResult:
+    """Move input_data rows older than the horizon into monthly partitions under archive_dir.
+
+    Cutoff is rounded down to the first of the month so only whole months get archived.
+    Rowids to move are read first without blocking loads, then each month is moved up to
+    `chunk_rows` rows at a time, every chunk becoming its own partition in a short write
+    transaction. Partitions are written and synced before the transaction that deletes
+    their hot rows commits, so a crash leaves at worst an unlisted file that is never read.
+    """
+    if horizon_days < 1:
+        msg = f"archive horizon must be at least one day, got {horizon_days}"
+        raise ValueError(msg)
+    cutoff = (date.today() - timedelta(days=horizon_days)).replace(day=1)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+
+    partitions = 0
+    archived = 0
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(CREATE_MANIFEST)
+        conn.commit()
+        by_month: dict[str, list[int]] = defaultdict(list)
+        for rowid, month in conn.execute(QUERY_CANDIDATES, (cutoff.isoformat(),)):
+            by_month[month].append(rowid)
+
+        for month, rowids in sorted(by_month.items()):
+            for start in range(0, len(rowids), chunk_rows):
+                moved = _move_chunk(conn, archive_dir, month, rowids[start : start + chunk_rows], cutoff.isoformat())
+                partitions += moved > 0
+                archived += moved
+
+    if archived:
+        notify_ingest()
+    return ArchiveResult(partitions, archived, cutoff.isoformat())
+
+
+def _move_chunk(conn: sqlite3.Connection, archive_dir: Path, month: str, rowids: list[int], cutoff: str) -> int:
+    """Write the rows still there out of `rowids` to a new partition of month and delete them, returns rows moved."""
+    conn.execute("BEGIN IMMEDIATE")  # keep loads out until this chunk is moved
+    try:
+        # rows may have been removed since the candidates were read, the cutoff check skips rewritten ones
+        chunk = conn.execute(QUERY_CHUNK, (json.dumps(rowids), cutoff)).fetchall()
+        if not chunk:
+            conn.rollback()
+            return 0
+
+        part = conn.execute("SELECT COUNT(*) FROM archive_manifest WHERE month = ?", (month,)).fetchone()[0] + 1
+        path = archive_dir / f"input_data_{month.replace('-', '_')}.part{part}.csv.gz"
+        rows = [tables.InputData(*row) for _, _, *row in chunk]  # already sorted by date, building, room
+        checksum = _write_partition(path, rows)
+        conn.execute(
+            """
+            INSERT INTO archive_manifest
+                (month, part, path, rows_archived, first_day, last_day, room_ids, checksum, archived_at)
+            VALUES (?,?,?,?,?,?,?,?,datetime('now'))
+            """,
+            (
+                month,
+                part,
+                str(path),
+                len(rows),
+                rows[0].date_entered,
+                rows[-1].date_entered,
+                json.dumps(sorted({room_id for _, room_id, *_ in chunk})),
+                checksum,
+            ),
+        )
+        conn.executemany("DELETE FROM input_data WHERE rowid = ?", [(rowid,) for rowid, *_ in chunk])
+        clamp_watermark(conn)
+        # archived rows are still read back by analytics, no page shows anything different
+        record_ingest(conn, "archive", -len(rows), Changes())
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(rows)
+
+
+def room_activity(
+    conn: sqlite3.Connection,
+    building: str,
+    room: int | str,
+    start: str,
+    end: str,
+) -> list[tuple[int, str]]:
+    """Get archived accesses per day for one room between start and end, as (accesses, date) pairs."""
+    room_num = normalize_room_num(room)
+    return [
+        (row.times_accessed, row.date_entered)
+        for row in _rows_between(conn, start, end)
+        if row.building == building and row.room_num == room_num
+    ]
+
+
+def usage(conn: sqlite3.Connection, start: str, end: str) -> dict[str, int]:
+    """Get archived total accesses per room between start and end, keyed by location label."""
+    totals: dict[str, int] = defaultdict(int)
+    for row in _rows_between(conn, start, end):
+        totals[f"{row.building} {row.room_num}"] += row.times_accessed
+    return totals
+
+
+def _rows_between(conn: sqlite3.Connection, start: str, end: str) -> list[tables.InputData]:
+    """Read archived rows dated between start and end, only overlapping partitions are opened."""
+    query = """
+        SELECT
+            path, checksum
+        FROM
+            archive_manifest
+        WHERE
+            first_day <= ? AND last_day >= ?
+        ORDER BY
+            first_day
+        """
+    rows = []
+    for path, checksum in fetch_all(conn, query, (end, start)):
+        rows.extend(row for row in _read_partition(path, checksum) if start <= row.date_entered <= end)
+    return rows
+
+
+def _write_partition(path: Path, rows: list[tables.InputData]) -> str:
+    """Write rows to a gzipped csv and return the sha256 of the compressed file."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(tables.InputData._fields)
+    writer.writerows(rows)
+    data = gzip.compress(buffer.getvalue().encode("utf-8"), mtime=0)  # mtime=0 keeps output reproducible
+
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("wb") as out:
+        out.write(data)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+    return hashlib.sha256(data).hexdigest()
+
+
+@functools.lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def _read_partition(path: str, checksum: str) -> tuple[tables.InputData, ...]:
+    data = Path(path).read_bytes()
+    if hashlib.sha256(data).hexdigest() != checksum:
+        msg = f"archive partition {path} does not match its manifest checksum"
+        raise ValueError(msg)
+
+    reader = csv.reader(io.StringIO(gzip.decompress(data).decode("utf-8")))
+    next(reader)  # header
+    return tuple(
+        tables.InputData(
+            building,
+            normalize_room_num(room_num),  # type: ignore[arg-type]
+            int(accessed),
+            int(succeed),
+            int(fail),
+            entered,
+        )
+        for building, room_num, accessed, succeed, fail, entered in reader
+    )
+
+
+CREATE_MANIFEST = """
+    CREATE TABLE IF NOT EXISTS archive_manifest (
+        month TEXT,
+        part INTEGER,
+        path TEXT NOT NULL,
+        rows_archived INTEGER,
+        first_day TEXT,
+        last_day TEXT,
+        room_ids TEXT,
+        checksum TEXT,
+        archived_at TEXT,
+        PRIMARY KEY (month, part)
+    )
+    """
+
+# dates are stored as YYYY-MM-DD, so the cutoff is a range scan of input_data_by_date
+QUERY_CANDIDATES = """
+    SELECT
+        rowid, substr(date_entered, 1, 7)
+    FROM
+        input_data
+    WHERE
+        date_entered < ?
+    ORDER BY
+        rowid
+    """
+
+QUERY_CHUNK = """
+    SELECT
+        i.rowid, room_id, building, room_num, times_accessed, access_succeed, access_fail, date_entered
+    FROM
+        input_data i JOIN rooms USING (room_id)
+    WHERE
+        i.rowid IN (SELECT value FROM json_each(?)) AND
+        date_entered < ?
+    ORDER BY
+        date_entered, building, CAST(room_num AS TEXT)
+    """
@@ -0,0 +1,206 @@
+"""Bulk load a directory of archived access summary reports, raw or already cleaned.
+
+Raw reports are split into byte ranges cleaned in worker processes, cleaned csvs are
+read in workers too, and every file is loaded by this process in one transaction
+together with its checkpoint in backfill_log. Files already checkpointed with the same
+size and modification time are skipped, so an interrupted backfill picks up where it
+stopped when run again.
+"""
+
+from __future__ import annotations
+
+import csv
+import glob
+import itertools
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+from attendance_tracker.db.ingest_log import Changes, notify_ingest, record_ingest
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.db.upload_jobs import insert_rows
+from attendance_tracker.email import cleaner
+from attendance_tracker.types import tables
+
+MAX_IN_FLIGHT_PER_WORKER = 2
+# headers a file can start with to count as already cleaned
+CLEANED_HEADERS = (list(tables.InputData._fields), cleaner.CLEANED_HEADER)
+
+
+class BackfillStats(NamedTuple):
+    """Totals for a backfill run."""
+
+    files_loaded: int
+    files_skipped: int
+    files_failed: int
+    rows_inserted: int
+    rows_duplicate: int
+    bytes_read: int
+    seconds: float
+
+
+def find_files(source: str) -> list[Path]:
+    """Get csv files in a directory, or matching a glob, in name order."""
+    if os.path.isdir(source):
+        return sorted(path for path in Path(source).iterdir() if path.is_file() and path.suffix.lower() == ".csv")
+    return sorted(Path(path) for path in glob.glob(source, recursive=True) if os.path.isfile(path))
+
+
+def backfill(db_path: Path, files: list[Path], workers: int | None = None) -> BackfillStats:
+    """Load every file not already checkpointed, cleaning raw reports on the way in."""
+    workers = workers or os.cpu_count() or 1
+    started = time.monotonic()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(CREATE_BACKFILL_LOG)
+        done = {
+            (path, size, mtime)
+            for path, size, mtime in conn.execute("SELECT path, file_size, file_mtime FROM backfill_log")
+        }
+    todo = []
+    for path in files:
+        stat = path.stat()
+        if (str(path.resolve()), stat.st_size, stat.st_mtime_ns) not in done:
+            todo.append(path)
+    skipped = len(files) - len(todo)
+    print(f"backfilling {len(todo)} files, {skipped} already loaded")
+
+    # every task is one byte range of a raw report or one whole cleaned csv
+    tasks = []
+    parts: dict[Path, list] = {}
+    for path in todo:
+        if _is_cleaned(path):
+            ranges = [(0, -1)]
+        else:
+            ranges = cleaner.split_ranges(str(path)) or [(0, 0)]
+        parts[path] = [None] * len(ranges)
+        tasks.extend(_Task(path, index, start, end) for index, (start, end) in enumerate(ranges))
+
+    loaded = failed = inserted = duplicates = bytes_read = 0
+    queue = iter(tasks)
+    # spawn, forking the web app's threads into workers is not safe
+    with (
+        ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool,
+        sqlite3.connect(db_path) as conn,
+    ):
+        lookup = RoomLookup(conn)
+        in_flight: dict[Future, _Task] = {}
+        while True:
+            for task in itertools.islice(queue, MAX_IN_FLIGHT_PER_WORKER * workers - len(in_flight)):
+                in_flight[pool.submit(_parse_task, str(task.path), task.start, task.end)] = task
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                task = in_flight.pop(future)
+                if task.path not in parts:
+                    continue  # another range of this file already failed
+                try:
+                    parts[task.path][task.index] = future.result()
+                except Exception as e:  # one bad file shouldn't stop the rest loading
+                    print(f"failed to read {task.path}: {e}")
+                    del parts[task.path]
+                    failed += 1
+                    continue
+                if any(part is None for part in parts[task.path]):
+                    continue  # wait for the rest of the file
+
+                rows = tables.InputDataBatch()
+                for part in parts.pop(task.path):  # ranges in file order
+                    rows.extend(part)
+                try:
+                    file_inserted, file_duplicates = _load_file(conn, lookup, task.path, rows)
+                except Exception as e:
+                    conn.rollback()
+                    lookup = RoomLookup(conn)  # rooms added in the rolled back transaction are gone
+                    print(f"failed to load {task.path}: {e}")
+                    failed += 1
+                    continue
+
+                loaded += 1
+                inserted += file_inserted
+                duplicates += file_duplicates
+                bytes_read += task.path.stat().st_size
+                elapsed = time.monotonic() - started
+                print(
+                    f"[{loaded + failed}/{len(todo)}] {task.path.name}: {file_inserted} rows, {file_duplicates} "
+                    f"duplicates, {bytes_read / 2**20 / elapsed:.1f} MiB/s, {inserted / elapsed:.0f} rows/s"
+                )
+
+    if inserted:
+        notify_ingest()
+    return BackfillStats(loaded, skipped, failed, inserted, duplicates, bytes_read, time.monotonic() - started)
+
+
+class _Task(NamedTuple):
+    path: Path
+    index: int
+    start: int
+    end: int  # -1 for a cleaned csv read whole
+
+
+def _is_cleaned(path: Path) -> bool:
+    with path.open("r", encoding="utf-8", errors="replace", newline="") as f:
+        header = next(csv.reader(f), [])
+    return header in CLEANED_HEADERS
+
+
+def _parse_task(path: str, start: int, end: int) -> tables.InputDataBatch:
+    """Get rows for one task, runs in a worker process. Batches pickle as a few arrays, not a tuple per row."""
+    if start == end:
+        return tables.InputDataBatch()  # empty file, can't be memory mapped
+    if end == -1:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader)  # header
+            return tables.InputDataBatch.from_lists(line for line in reader if line)
+    return tables.InputDataBatch.from_lists(cleaner.clean_range(path, start, end))
+
+
+def _load_file(
+    conn: sqlite3.Connection,
+    lookup: RoomLookup,
+    path: Path,
+    rows: tables.InputDataBatch,
+) -> tuple[int, int]:
+    """Insert a file's rows and its checkpoint in one transaction, returns inserted and duplicate counts."""
+    conn.execute("BEGIN")
+    changes = Changes()
+    inserted, duplicates = insert_rows(conn, lookup, rows, changes)
+    stat = path.stat()
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO backfill_log
+            (path, file_size, file_mtime, rows_inserted, rows_duplicate, loaded_at)
+        VALUES (?,?,?,?,?,?)
+        """,
+        (
+            str(path.resolve()),
+            stat.st_size,
+            stat.st_mtime_ns,
+            inserted,
+            len(duplicates),
+            datetime.now().isoformat(timespec="seconds"),
+        ),
+    )
+    record_ingest(conn, "backfill", inserted, changes)
+    conn.commit()
+    return inserted, len(duplicates)
+
+
+CREATE_BACKFILL_LOG = """
+    CREATE TABLE IF NOT EXISTS backfill_log (
+        path TEXT,
+        file_size INTEGER,
+        file_mtime INTEGER,
+        rows_inserted INTEGER,
+        rows_duplicate INTEGER,
+        loaded_at TEXT,
+        PRIMARY KEY (path)
+    )
+    """
@@ -0,0 +1,268 @@
+"""Online backups of the whole db through the sqlite backup api, gzipped and rotated.
+
+Pages are copied a few at a time with a sleep in between, so loads and page views
+carry on while a backup runs. If something writes to the db mid copy sqlite starts
+the copy over, after MAX_RESTARTS of those the rest is copied in one step, which in
+WAL mode only holds a read transaction and still doesn't block writers.
+Every run is recorded in backup_log with its size and how long it took.
+"""
+
+from __future__ import annotations
+
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+from attendance_tracker.db import jobs_lock
+
+PAGES_PER_STEP = 256  # 1 MiB with 4 KiB pages
+STEP_SLEEP = 0.005  # seconds between steps, where other connections get the db
+MAX_RESTARTS = 3
+BACKUP_PREFIX = "attendance_tracker-"
+BACKUP_SUFFIX = ".db.gz"
+
+_running = threading.Lock()  # one backup at a time per process
+
+
+class BackupRunningError(Exception):
+    """Raised when a backup is asked for while this process is already running one."""
+
+
+class BackupResult(NamedTuple):
+    """What a single backup run did."""
+
+    path: Path
+    db_bytes: int
+    backup_bytes: int
+    seconds: float
+    restarts: int
+    rotated: int
+
+
+class _TooManyRestartsError(Exception):
+    pass
+
+
+def backup(
+    db_path: Path,
+    backup_dir: Path,
+    keep: int = 7,
+    pages: int = PAGES_PER_STEP,
+    sleep: float = STEP_SLEEP,
+) -> BackupResult:
+    """Copy the db into a gzipped file under backup_dir, then drop all but the newest `keep` backups."""
+    if not _running.acquire(blocking=False):
+        msg = "a backup is already running"
+        raise BackupRunningError(msg)
+    try:
+        return _backup(db_path, backup_dir, keep, pages, sleep)
+    finally:
+        _running.release()
+
+
+def backup_in_background(db_path: Path, backup_dir: Path, keep: int, pages: int, sleep: float) -> None:
+    """Start a backup on a daemon thread, raises BackupRunningError if one is already going."""
+    if _running.locked():
+        msg = "a backup is already running"
+        raise BackupRunningError(msg)
+    threading.Thread(
+        target=_backup_logging_errors,
+        args=(db_path, backup_dir, keep, pages, sleep),
+        name="db-backup",
+        daemon=True,
+    ).start()
+
+
+def restore(backup_path: Path, target_path: Path, force: bool = False) -> int:
+    """Restore a backup into target_path after checking its integrity, returns the number of tables restored.
+
+    The copy goes through the backup api, so restoring over a db that has open
+    connections or a WAL file is safe. An existing target is only overwritten with `force`,
+    and never while a web server is running background jobs against it.
+    """
+    if target_path.exists() and target_path.stat().st_size and not force:
+        msg = f"{target_path} already exists, pass force to overwrite it"
+        raise ValueError(msg)
+
+    scratch = target_path.with_name(f"{target_path.name}.restoring")
+    with jobs_lock.exclusive(target_path):
+        try:
+            return _restore(backup_path, target_path, scratch)
+        finally:
+            scratch.unlink(missing_ok=True)
+
+
+def _restore(backup_path: Path, target_path: Path, scratch: Path) -> int:
+    with gzip.open(backup_path, "rb") as src, scratch.open("wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    with closing(sqlite3.connect(scratch)) as restored:
+        try:
+            check = restored.execute("PRAGMA integrity_check").fetchall()
+        except sqlite3.DatabaseError as e:
+            msg = f"backup {backup_path} is not a readable db: {e}"
+            raise ValueError(msg) from e
+        if check != [("ok",)]:
+            msg = f"backup {backup_path} failed its integrity check: {check[:5]}"
+            raise ValueError(msg)
+        tables = restored.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        with closing(sqlite3.connect(target_path, timeout=30)) as target:
+            restored.backup(target)
+    return tables
+
+
+def recent(conn: sqlite3.Connection, limit: int = 10) -> list[dict]:
+    """Get the latest backup runs as dicts for the db management page."""
+    conn.execute(CREATE_BACKUP_LOG)
+    cursor = conn.execute(QUERY_RECENT, (limit,))
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row, strict=True)) for row in cursor.fetchall()]
+
+
+def _backup_logging_errors(db_path: Path, backup_dir: Path, keep: int, pages: int, sleep: float) -> None:
+    try:
+        result = backup(db_path, backup_dir, keep, pages, sleep)
+    except Exception as e:  # already in backup_log, nobody is waiting on this thread
+        print(f"backup failed: {e}")
+        return
+    print(f"backed up {result.db_bytes / 2**20:.1f} MiB to {result.path} in {result.seconds:.1f}s")
+
+
+def _backup(db_path: Path, backup_dir: Path, keep: int, pages: int, sleep: float) -> BackupResult:
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    started = time.monotonic()
+    started_at = datetime.now()
+
+    with closing(sqlite3.connect(db_path, timeout=30)) as conn:
+        conn.execute(CREATE_BACKUP_LOG)
+        backup_id = conn.execute(
+            "INSERT INTO backup_log (started_at, status) VALUES (?,'running')",
+            (started_at.isoformat(timespec="seconds"),),
+        ).lastrowid
+        # the id keeps two backups started in the same second apart, padded so names still sort oldest first
+        path = backup_dir / f"{BACKUP_PREFIX}{started_at.strftime('%Y%m%d-%H%M%S')}-{backup_id:06d}{BACKUP_SUFFIX}"
+        conn.execute("UPDATE backup_log SET path = ? WHERE backup_id = ?", (str(path), backup_id))
+        conn.commit()
+        copy_path = backup_dir / f"{path.name}.copy"
+        compressed_path = backup_dir / f"{path.name}.tmp"
+
+        try:
+            if path.exists():  # only if backup_log was reset, by a restore say, don't overwrite an older backup
+                msg = f"{path} already exists"
+                raise FileExistsError(msg)
+            restarts = _copy(conn, copy_path, pages, sleep)
+            _finish_in_copy(copy_path, backup_id)
+            db_bytes = copy_path.stat().st_size
+            with copy_path.open("rb") as src, gzip.open(compressed_path, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(compressed_path, path)
+        except Exception as e:
+            conn.execute(
+                "UPDATE backup_log SET status = 'failed', error = ?, finished_at = ? WHERE backup_id = ?",
+                (str(e), datetime.now().isoformat(timespec="seconds"), backup_id),
+            )
+            conn.commit()
+            compressed_path.unlink(missing_ok=True)
+            raise
+        finally:
+            copy_path.unlink(missing_ok=True)
+
+        rotated = _rotate(backup_dir, keep)
+        seconds = time.monotonic() - started
+        backup_bytes = path.stat().st_size
+        conn.execute(
+            """
+            UPDATE backup_log SET
+                status = 'done', finished_at = ?, seconds = ?, db_bytes = ?, backup_bytes = ?, restarts = ?
+            WHERE
+                backup_id = ?
+            """,
+            (
+                datetime.now().isoformat(timespec="seconds"),
+                round(seconds, 2),
+                db_bytes,
+                backup_bytes,
+                restarts,
+                backup_id,
+            ),
+        )
+        conn.commit()
+    return BackupResult(path, db_bytes, backup_bytes, seconds, restarts, rotated)
+
+
+def _copy(conn: sqlite3.Connection, copy_path: Path, pages: int, sleep: float) -> int:
+    """Copy the db page by page into copy_path, returns how many times the copy had to start over."""
+    restarts = 0
+    last_remaining = None
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1  # the db was written to, sqlite started the copy over
+            if restarts >= MAX_RESTARTS:
+                raise _TooManyRestartsError
+        last_remaining = remaining
+        if sleep:
+            time.sleep(sleep)
+
+    with closing(sqlite3.connect(copy_path)) as copy:
+        try:
+            conn.backup(copy, pages=pages, progress=progress)
+        except _TooManyRestartsError:
+            conn.backup(copy)  # all at once, so writes can't make it start over again
+        check = copy.execute("PRAGMA quick_check").fetchone()[0]
+    if check != "ok":
+        msg = f"backup copy failed its check: {check}"
+        raise ValueError(msg)
+    return restarts
+
+
+def _finish_in_copy(copy_path: Path, backup_id: int | None) -> None:
+    """Mark the copy's own backup_log row done, it was copied while still running."""
+    with closing(sqlite3.connect(copy_path)) as copy:
+        copy.execute(
+            "UPDATE backup_log SET status = 'done', finished_at = ? WHERE backup_id = ?",
+            (datetime.now().isoformat(timespec="seconds"), backup_id),
+        )
+        copy.commit()
+
+
+def _rotate(backup_dir: Path, keep: int) -> int:
+    backups = sorted(backup_dir.glob(f"{BACKUP_PREFIX}*{BACKUP_SUFFIX}"))  # timestamped names sort oldest first
+    old = backups[: max(len(backups) - keep, 0)]
+    for path in old:
+        path.unlink()
+    return len(old)
+
+
+# kept in step with sqlite/init.sql
+CREATE_BACKUP_LOG = """
+    CREATE TABLE IF NOT EXISTS backup_log (
+        backup_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TEXT,
+        finished_at TEXT,
+        path TEXT,
+        status TEXT,
+        seconds REAL,
+        db_bytes INTEGER,
+        backup_bytes INTEGER,
+        restarts INTEGER,
+        error TEXT
+    )
+    """
+
+QUERY_RECENT = """
+    SELECT
+        started_at, status, seconds, db_bytes, backup_bytes, restarts, path, error
+    FROM
+        backup_log
+    ORDER BY
+        backup_id DESC
+    LIMIT ?
+    """
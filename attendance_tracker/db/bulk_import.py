@@ -0,0 +1,221 @@
+"""Bulk import of clubs and room assignments from csv, for onboarding a semester in one go.
+
+Rows are validated with the table types in batches, then upserted with executemany, and
+the whole import commits as one transaction. Rows that would change an existing club or
+take a room from another club are conflicts: they are reported and skipped unless
+`overwrite` is set, in which case they are applied and still reported.
+"""
+
+from __future__ import annotations
+
+import csv
+import itertools
+import json
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.types import tables
+
+BATCH_ROWS = 1_000
+MAX_MESSAGES = 50  # conflict and error messages kept, the counts keep going past this
+
+
+@dataclass
+class ImportResult:
+    """What an import did, messages are capped at MAX_MESSAGES each."""
+
+    rows_read: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+    conflicts: int = 0
+    conflict_messages: list[str] = field(default_factory=list)
+    error_messages: list[str] = field(default_factory=list)
+
+    def conflict(self, message: str) -> None:
+        """Count a conflict, keeping its message if there's room."""
+        self.conflicts += 1
+        if len(self.conflict_messages) < MAX_MESSAGES:
+            self.conflict_messages.append(message)
+
+    def reject(self, message: str) -> None:
+        """Count a rejected row, keeping its message if there's room."""
+        self.rejected += 1
+        if len(self.error_messages) < MAX_MESSAGES:
+            self.error_messages.append(message)
+
+    def summary(self) -> str:
+        """One line description of the counts."""
+        return (
+            f"{self.rows_read} rows read, {self.inserted} inserted, {self.updated} updated, "
+            f"{self.unchanged} unchanged, {self.conflicts} conflicts, {self.rejected} rejected"
+        )
+
+
+def read_csv(path: Path) -> Iterator[list[str]]:
+    """Read the rows of a csv file, a leading byte order mark from excel is dropped."""
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        yield from csv.reader(f)
+
+
+def import_clubs(conn: sqlite3.Connection, rows: Iterable[list[str]], overwrite: bool = False) -> ImportResult:
+    """Upsert club_data from csv rows in ClubData column order, an optional header row is skipped."""
+    result = ImportResult()
+    seen: dict[str, tables.ClubData] = {}
+    with conn:  # one transaction, nothing is kept if the import blows up part way
+        for batch in _batches(_skip_header(rows, "club_name"), result):
+            clubs = []
+            for line, raw in batch:
+                try:
+                    club = tables.ClubData.from_list([value.strip() for value in raw])
+                except ValueError as e:
+                    result.reject(f"line {line}: {e}")
+                    continue
+                if not club.club_name:
+                    result.reject(f"line {line}: club name is empty")
+                    continue
+                if club.club_name in seen:
+                    if seen[club.club_name] != club:
+                        result.conflict(f"line {line}: {club.club_name} appears earlier in the file with other details")
+                    else:
+                        result.unchanged += 1
+                    continue  # first row for a club wins
+                seen[club.club_name] = club
+                clubs.append((line, club))
+
+            existing = {
+                row[0]: tables.ClubData(*row)
+                for row in conn.execute(QUERY_CLUBS, (json.dumps([club.club_name for _, club in clubs]),))
+            }
+            upserts = []
+            for line, club in clubs:
+                current = existing.get(club.club_name)
+                if current is None:
+                    result.inserted += 1
+                elif current == club:
+                    result.unchanged += 1
+                    continue
+                else:
+                    result.conflict(f"line {line}: {club.club_name} already exists with other details")
+                    if not overwrite:
+                        continue
+                    result.updated += 1
+                upserts.append(club)
+            conn.executemany(UPSERT_CLUB, upserts)
+    return result
+
+
+def import_room_assignments(
+    conn: sqlite3.Connection,
+    rows: Iterable[list[str]],
+    overwrite: bool = False,
+) -> ImportResult:
+    """Upsert room_log from building, room_num, club csv rows, an optional header row is skipped.
+
+    Clubs must already be in club_data, import them first. Rooms not seen before are
+    added to the rooms table.
+    """
+    result = ImportResult()
+    clubs = {name for (name,) in conn.execute("SELECT club_name FROM club_data")}
+    seen: dict[int, str] = {}
+    with conn:
+        lookup = RoomLookup(conn)
+        for batch in _batches(_skip_header(rows, "building"), result):
+            assignments = []
+            for line, raw in batch:
+                try:
+                    row = tables.RoomLog.from_list([value.strip() for value in raw])
+                except ValueError as e:
+                    result.reject(f"line {line}: {e}")
+                    continue
+                if row.assigned_club not in clubs:
+                    result.reject(f"line {line}: unknown club {row.assigned_club}")
+                    continue
+                room = f"{row.building} {row.room_num}"
+                room_id = lookup.room_id(row.building, row.room_num)
+                if room_id in seen:
+                    if seen[room_id] != row.assigned_club:
+                        result.conflict(f"line {line}: {room} is given to {seen[room_id]} earlier in the file")
+                    else:
+                        result.unchanged += 1
+                    continue
+                seen[room_id] = row.assigned_club
+                assignments.append((line, room, room_id, row.assigned_club))
+
+            existing = dict(conn.execute(QUERY_ASSIGNMENTS, (json.dumps([a[2] for a in assignments]),)).fetchall())
+            upserts = []
+            for line, room, room_id, club in assignments:
+                current = existing.get(room_id)
+                if current is None:
+                    result.inserted += 1
+                elif current == club:
+                    result.unchanged += 1
+                    continue
+                else:
+                    result.conflict(f"line {line}: {room} is already assigned to {current}")
+                    if not overwrite:
+                        continue
+                    result.updated += 1
+                upserts.append((room_id, club))
+            conn.executemany(UPSERT_ASSIGNMENT, upserts)
+    return result
+
+
+def _skip_header(rows: Iterable[list[str]], first_column: str) -> Iterator[tuple[int, list[str]]]:
+    # number rows by csv line so messages point at the right place
+    for line, row in enumerate(rows, start=1):
+        if not any(value.strip() for value in row):
+            continue
+        if line == 1 and row[0].strip().lower() == first_column:
+            continue
+        yield line, row
+
+
+def _batches(rows: Iterator[tuple[int, list[str]]], result: ImportResult) -> Iterator[list[tuple[int, list[str]]]]:
+    while batch := list(itertools.islice(rows, BATCH_ROWS)):
+        result.rows_read += len(batch)
+        yield batch
+
+
+QUERY_CLUBS = """
+    SELECT
+        club_name, club_president, club_email, club_size, club_advisor, club_advisor_email
+    FROM
+        club_data
+    WHERE
+        club_name IN (SELECT value FROM json_each(?))
+    """
+
+QUERY_ASSIGNMENTS = """
+    SELECT
+        room_id, assigned_club
+    FROM
+        room_log
+    WHERE
+        room_id IN (SELECT value FROM json_each(?))
+    """
+
+# DO UPDATE rather than REPLACE so rows are updated in place and the search triggers see an update
+UPSERT_CLUB = """
+    INSERT INTO club_data
+        (club_name, club_president, club_email, club_size, club_advisor, club_advisor_email)
+    VALUES (?,?,?,?,?,?)
+    ON CONFLICT (club_name) DO UPDATE SET
+        club_president = excluded.club_president,
+        club_email = excluded.club_email,
+        club_size = excluded.club_size,
+        club_advisor = excluded.club_advisor,
+        club_advisor_email = excluded.club_advisor_email
+    """
+
+UPSERT_ASSIGNMENT = """
+    INSERT INTO room_log
+        (room_id, assigned_club)
+    VALUES (?,?)
+    ON CONFLICT (room_id) DO UPDATE SET
+        assigned_club = excluded.assigned_club
+    """
@@ -0,0 +1,175 @@
+"""Calendar table with one row per day, so time series can be zero filled and grouped in sql.
+
+Series queries add a zero row for every calendar day in range to the rows they read, so
+days without data come back as zeros instead of being skipped, and the same calendar
+rows carry the ISO week, month and academic term each day falls in. Rows find their day
+by date_entered, which input_data stores as YYYY-MM-DD like calendar.day.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import date, timedelta
+from typing import Iterable, Iterator
+
+from attendance_tracker.db.connection import fetch_all
+from attendance_tracker.types import tables
+
+FIRST_DAY = date(2010, 1, 1)
+LAST_DAY = date(2050, 12, 31)
+# (name, month, day) each term starts on, a term runs until the next one starts
+TERM_STARTS = [("Spring", 1, 1), ("Summer", 5, 10), ("Fall", 8, 20)]
+# group name -> (calendar column series are grouped and ordered by, column used as the label)
+GROUPS = {
+    "day": ("day", "day"),
+    "week": ("week", "week"),
+    "month": ("month", "month"),
+    "term": ("term_start", "term"),
+}
+
+
+def fill(conn: sqlite3.Connection, first: date = FIRST_DAY, last: date = LAST_DAY) -> int:
+    """Add calendar rows for every day from first to last, days already there are left alone, caller must commit."""
+    conn.execute(CREATE_CALENDAR)
+    before = conn.total_changes
+    conn.executemany(INSERT_DAY, _days(first, last))
+    return conn.total_changes - before
+
+
+def term(day: date) -> tuple[str, date]:
+    """Get the academic term a day falls in, as its name like "Fall 2024" and the day it started."""
+    for name, month, start_day in reversed(TERM_STARTS):
+        start = date(day.year, month, start_day)
+        if day >= start:
+            return f"{name} {day.year}", start
+    # before the first term of the year starts, so still in the last term of the year before
+    name, month, start_day = TERM_STARTS[-1]
+    return f"{name} {day.year - 1}", date(day.year - 1, month, start_day)
+
+
+def room_activity(
+    conn: sqlite3.Connection,
+    building: str,
+    room: int,
+    start: str,
+    end: str,
+    group: str = "day",
+) -> list[tuple[int, str]]:
+    """Get accesses for one room per day, week, month or term as (accesses, label) pairs, gaps come back as 0."""
+    key, label = _group_columns(group)
+    query = QUERY_ROOM_ACTIVITY.format(key=key, label=label)
+    return fetch_all(conn, query, (start, end, building, room, start, end))
+
+
+def series(
+    conn: sqlite3.Connection,
+    rows: Iterable[tuple[int, str]],
+    start: str,
+    end: str,
+    group: str = "day",
+) -> list[tuple[int, str]]:
+    """Group (accesses, date) pairs read outside input_data, like the columnar snapshot or archive, the same way.
+
+    The pairs go into the query as one json parameter, so they are zero filled and
+    grouped by the same calendar rows as room_activity.
+    """
+    key, label = _group_columns(group)
+    days = json.dumps([[accesses, tables.parse_date(day).isoformat()] for accesses, day in rows])
+    query = QUERY_SERIES.format(key=key, label=label)
+    return fetch_all(conn, query, (start, end, days, start, end))
+
+
+def _group_columns(group: str) -> tuple[str, str]:
+    if group not in GROUPS:
+        msg = f"unknown group {group}, expected one of {', '.join(GROUPS)}"
+        raise ValueError(msg)
+    return GROUPS[group]
+
+
+def _days(first: date, last: date) -> Iterator[tuple]:
+    day = first
+    while day <= last:
+        iso_year, iso_week, _ = day.isocalendar()
+        term_name, term_start = term(day)
+        yield (
+            day.isoformat(),
+            f"{iso_year}-W{iso_week:02d}",  # sorts in order, unlike week numbers alone
+            day.strftime("%Y-%m"),
+            term_name,
+            term_start.isoformat(),
+        )
+        day += timedelta(days=1)
+
+
+# kept in step with sqlite/init.sql
+CREATE_CALENDAR = """
+    CREATE TABLE IF NOT EXISTS calendar (
+        day TEXT,
+        week TEXT,
+        month TEXT,
+        term TEXT,
+        term_start TEXT,
+        PRIMARY KEY (day)
+    ) WITHOUT ROWID
+    """
+
+INSERT_DAY = """
+    INSERT OR IGNORE INTO calendar
+        (day, week, month, term, term_start)
+    VALUES (?,?,?,?,?)
+    """
+
+# a zero row for every day plus the room's rows, CROSS JOIN keeps the room's rows (read off the input_data
+# primary key) on the outside so each one finds its day by calendar primary key
+QUERY_ROOM_ACTIVITY = """
+    SELECT
+        SUM(accesses), label
+    FROM (
+        SELECT
+            c.{key} AS bucket, c.{label} AS label, 0 AS accesses
+        FROM
+            calendar c
+        WHERE
+            c.day BETWEEN ? AND ?
+        UNION ALL
+        SELECT
+            c.{key}, c.{label}, i.times_accessed
+        FROM
+            input_data i
+            CROSS JOIN calendar c ON c.day = i.date_entered
+        WHERE
+            i.room_id = (SELECT room_id FROM rooms WHERE building = ? AND room_num = ?) AND
+            c.day BETWEEN ? AND ?
+    )
+    GROUP BY
+        bucket
+    ORDER BY
+        bucket
+    """
+
+# a zero row for every day plus the given rows, each row finds its day by primary key
+QUERY_SERIES = """
+    SELECT
+        SUM(accesses), label
+    FROM (
+        SELECT
+            c.{key} AS bucket, c.{label} AS label, 0 AS accesses
+        FROM
+            calendar c
+        WHERE
+            c.day BETWEEN ? AND ?
+        UNION ALL
+        SELECT
+            c.{key}, c.{label}, json_extract(s.value, '$[0]')
+        FROM
+            json_each(?) s
+            JOIN calendar c ON c.day = json_extract(s.value, '$[1]')
+        WHERE
+            c.day BETWEEN ? AND ?
+    )
+    GROUP BY
+        bucket
+    ORDER BY
+        bucket
+    """
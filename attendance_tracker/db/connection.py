@@ -0,0 +1,110 @@
+"""Connection helpers for talking to the sqlite db."""
+
+from __future__ import annotations
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+# progress handler is called every N sqlite vm instructions, small enough to cancel quickly
+PROGRESS_STEPS = 10_000
+# negative cache_size is in KiB, so this gives analytic readers a 64MiB page cache
+READ_ONLY_CACHE_KIB = 64 * 1024
+
+
+class QueryTimeoutError(Exception):
+    """Raised when a read only query runs past its deadline and is cancelled."""
+
+
+class ReadOnlyConnection(sqlite3.Connection):
+    """Read only sqlite connection that cancels any query running past a deadline.
+
+    The deadline restarts with every statement, whether it goes through `execute`,
+    `executemany` or a cursor from `cursor()`, so it covers the statement plus any
+    fetches that follow it.
+    """
+
+    query_timeout: float = 5.0  # seconds, overwritten by connect_read_only
+    _deadline: float = float("inf")
+
+    def _past_deadline(self) -> int:
+        # sqlite aborts the running statement if the progress handler returns non-zero
+        return int(time.monotonic() > self._deadline)
+
+    def _arm(self) -> None:
+        self._deadline = time.monotonic() + self.query_timeout
+
+    def cursor(self, factory: type[sqlite3.Cursor] | None = None) -> sqlite3.Cursor:  # type: ignore[override]
+        """Open a cursor whose statements each get a fresh deadline."""
+        return super().cursor(factory or ReadOnlyCursor)
+
+    def execute(self, sql: str, parameters=(), /) -> sqlite3.Cursor:  # type: ignore[override]
+        """Execute a query with the deadline armed, raises QueryTimeoutError if cancelled."""
+        self._arm()
+        with _timeout_on_interrupt(sql):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters, /) -> sqlite3.Cursor:  # type: ignore[override]
+        """Execute a query for each set of parameters with the deadline armed."""
+        self._arm()
+        with _timeout_on_interrupt(sql):
+            return super().executemany(sql, parameters)
+
+
+class ReadOnlyCursor(sqlite3.Cursor):
+    """Cursor for ReadOnlyConnection, arms the connection's deadline before each statement."""
+
+    def execute(self, sql: str, parameters=(), /) -> sqlite3.Cursor:  # type: ignore[override]
+        """Execute a query with the deadline armed, raises QueryTimeoutError if cancelled."""
+        self.connection._arm()  # type: ignore[attr-defined]
+        with _timeout_on_interrupt(sql):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters, /) -> sqlite3.Cursor:  # type: ignore[override]
+        """Execute a query for each set of parameters with the deadline armed."""
+        self.connection._arm()  # type: ignore[attr-defined]
+        with _timeout_on_interrupt(sql):
+            return super().executemany(sql, parameters)
+
+
+@contextmanager
+def _timeout_on_interrupt(sql: str) -> Iterator[None]:
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if str(e) == "interrupted":
+            raise QueryTimeoutError(sql) from e
+        raise
+
+
+def connect_read_only(db_path: Path, query_timeout: float = 5.0) -> ReadOnlyConnection:
+    """Open a read only connection to the db meant for analytic queries.
+
+    Connection opens with `mode=ro` so writes are rejected by sqlite itself, and
+    `query_only` is set as well so attached dbs can't be written either.
+    """
+    uri = f"file:{Path(db_path).absolute()}?mode=ro"
+    conn = sqlite3.connect(
+        uri,
+        uri=True,
+        factory=ReadOnlyConnection,
+        check_same_thread=False,  # flask may tear down on a different thread
+    )
+    conn.query_timeout = query_timeout
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA cache_size = -{READ_ONLY_CACHE_KIB}")
+    conn.set_progress_handler(conn._past_deadline, PROGRESS_STEPS)
+    return conn
+
+
+def fetch_all(conn: sqlite3.Connection, query: str, params=()) -> list:
+    """Run a query and fetch all rows, turning a cancelled fetch into QueryTimeoutError."""
+    cursor = conn.execute(query, params)
+    try:
+        return cursor.fetchall()
+    except sqlite3.OperationalError as e:
+        if str(e) == "interrupted":
+            raise QueryTimeoutError(query) from e
+        raise
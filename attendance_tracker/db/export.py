@@ -0,0 +1,180 @@
+"""Incremental export of input_data, only rows added since the last export are written.
+
+The watermark is the highest input_data rowid already exported. Rows are written in
+chunk files under the export dir and the export_log row is updated after every chunk,
+so an export that dies part way is picked up again from its last finished chunk.
+Nothing is deleted unless a retention period is passed.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from attendance_tracker.db.ingest_log import notify_ingest, record_ingest
+from attendance_tracker.types import tables
+
+CHUNK_ROWS = 50_000
+
+
+class ExportResult(NamedTuple):
+    """What a single export run did."""
+
+    export_id: int
+    rows: int
+    chunks: list[Path]
+    purged: int
+
+
+def export_new_rows(db_path: Path, export_dir: Path, retain_days: int | None = None) -> ExportResult:
+    """Write input_data rows added since the last export to chunk files under export_dir.
+
+    When retain_days is given, exported rows dated more than retain_days ago are deleted
+    afterwards, 0 deletes every exported row.
+    """
+    export_dir.mkdir(parents=True, exist_ok=True)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(CREATE_EXPORT_LOG)
+        export_id, after, chunk_num = _start_or_resume(conn)
+
+        rows = 0
+        while True:
+            batch = conn.execute(QUERY_AFTER_ROWID, (after, CHUNK_ROWS)).fetchall()
+            if not batch:
+                break
+            chunk_num += 1
+            _write_chunk(_chunk_path(export_dir, export_id, chunk_num), [row[1:] for row in batch])
+            after = batch[-1][0]
+            rows += len(batch)
+            # chunk is on disk, move the watermark past it so a restart doesn't write it again
+            conn.execute(
+                """
+                UPDATE export_log SET
+                    to_rowid = ?, watermark = ?, rows_exported = rows_exported + ?, chunks = ?
+                WHERE
+                    export_id = ?
+                """,
+                (after, after, len(batch), chunk_num, export_id),
+            )
+            conn.commit()
+
+        purged = _purge_exported(conn, after, retain_days) if retain_days is not None else 0
+        conn.execute(
+            "UPDATE export_log SET status = 'done', finished_at = ?, rows_purged = ? WHERE export_id = ?",
+            (datetime.now().isoformat(timespec="seconds"), purged, export_id),
+        )
+        if purged:
+            record_ingest(conn, "export purge", -purged)
+        conn.commit()
+
+    if purged:
+        notify_ingest()
+    chunks = [_chunk_path(export_dir, export_id, n) for n in range(1, chunk_num + 1)]
+    return ExportResult(export_id, rows, chunks, purged)
+
+
+def clamp_watermark(conn: sqlite3.Connection) -> None:
+    """Pull the watermark down after rows were deleted from input_data, caller must commit.
+
+    sqlite hands out max(rowid) + 1 to new rows, so once the top rows are deleted new
+    rows could land below the watermark and never be exported.
+    """
+    conn.execute(CREATE_EXPORT_LOG)
+    conn.execute(
+        """
+        UPDATE export_log SET
+            watermark = MIN(watermark, (SELECT COALESCE(MAX(rowid), 0) FROM input_data))
+        WHERE
+            export_id = (SELECT MAX(export_id) FROM export_log)
+        """
+    )
+
+
+def read_chunks(chunks: list[Path]) -> Iterator[str]:
+    """Yield the lines of the chunk files as one csv, header is only sent once."""
+    yield ",".join(tables.InputData._fields) + "\n"
+    for chunk in chunks:
+        with chunk.open("r", encoding="utf-8") as f:
+            next(f)  # every chunk has its own header so it can be loaded on its own
+            yield from f
+
+
+def _start_or_resume(conn: sqlite3.Connection) -> tuple[int, int, int]:
+    """Get export id, rowid to continue after and chunks already written."""
+    running = conn.execute(
+        "SELECT export_id, watermark, chunks FROM export_log WHERE status = 'running' ORDER BY export_id DESC"
+    ).fetchone()
+    if running is not None:
+        return running
+
+    row = conn.execute("SELECT watermark FROM export_log ORDER BY export_id DESC LIMIT 1").fetchone()
+    watermark = row[0] if row else 0
+    cursor = conn.execute(
+        """
+        INSERT INTO export_log
+            (started_at, from_rowid, to_rowid, watermark, rows_exported, chunks, rows_purged, status)
+        VALUES (?,?,?,?,0,0,0,'running')
+        """,
+        (datetime.now().isoformat(timespec="seconds"), watermark, watermark, watermark),
+    )
+    conn.commit()
+    return cursor.lastrowid or 0, watermark, 0
+
+
+def _purge_exported(conn: sqlite3.Connection, watermark: int, retain_days: int) -> int:
+    """Delete exported rows dated before the retention period, returns rows deleted."""
+    cutoff = date.today() - timedelta(days=retain_days)
+    # date_entered is YYYY-MM-DD, so it compares as text
+    cursor = conn.execute(
+        "DELETE FROM input_data WHERE rowid <= ? AND (? = 0 OR date_entered < ?)",
+        (watermark, retain_days, cutoff.isoformat()),
+    )
+    clamp_watermark(conn)
+    return cursor.rowcount
+
+
+def _chunk_path(export_dir: Path, export_id: int, chunk_num: int) -> Path:
+    return export_dir / f"input_data_export{export_id}_{chunk_num:04d}.csv"
+
+
+def _write_chunk(path: Path, rows: list[tuple]) -> None:
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(tables.InputData._fields)
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+CREATE_EXPORT_LOG = """
+    CREATE TABLE IF NOT EXISTS export_log (
+        export_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TEXT,
+        finished_at TEXT,
+        from_rowid INTEGER,
+        to_rowid INTEGER,
+        watermark INTEGER,
+        rows_exported INTEGER,
+        chunks INTEGER,
+        rows_purged INTEGER,
+        status TEXT
+    )
+    """
+
+QUERY_AFTER_ROWID = """
+    SELECT
+        input_data.rowid, building, room_num, times_accessed, access_succeed, access_fail, date_entered
+    FROM
+        input_data JOIN rooms USING (room_id)
+    WHERE
+        input_data.rowid > ?
+    ORDER BY
+        input_data.rowid
+    LIMIT ?
+    """
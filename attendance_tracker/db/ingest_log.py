@@ -0,0 +1,133 @@
+"""Bookkeeping for loads into input_data so readers can tell when data changed."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Callable, Iterable
+
+from attendance_tracker.types import tables
+
+
+@dataclass
+class Changes:
+    """Rooms and days a load touched, saved next to its version so open pages know what to refetch."""
+
+    room_ids: set[int] = field(default_factory=set)
+    first_day: date | None = None
+    last_day: date | None = None
+
+    def add(self, room_ids: Iterable[int], dates: Iterable[str]) -> None:
+        """Include these rooms and date_entered days, each distinct date is only parsed once."""
+        self.room_ids.update(room_ids)
+        days = [tables.parse_date(d) for d in set(dates)]
+        if not days:
+            return
+        first, last = min(days), max(days)
+        if self.first_day is None or first < self.first_day:
+            self.first_day = first
+        if self.last_day is None or last > self.last_day:
+            self.last_day = last
+
+    @classmethod
+    def of(cls, room_ids: Iterable[int], dates: Iterable[str]) -> Changes:
+        """Get the changes made by loading rows for these rooms and days."""
+        changes = cls()
+        changes.add(room_ids, dates)
+        return changes
+
+
+def data_version(conn: sqlite3.Connection) -> int:
+    """Get the current data version, goes up by one every time input_data changes.
+
+    A db from before ingest_log existed is at version 0 until its first load creates the table.
+    """
+    try:
+        row = conn.execute("SELECT MAX(version) FROM ingest_log").fetchone()
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        return 0  # read only connections can't create it, so don't try
+    return row[0] or 0
+
+
+def ensure_ingest_log(conn: sqlite3.Connection) -> None:
+    """Create ingest_log if missing, starting versions at the current time like init.sql, caller must commit."""
+    conn.execute(CREATE_INGEST_LOG)
+    conn.execute(SEED_INGEST_LOG)
+
+
+def record_ingest(conn: sqlite3.Connection, source: str, rows: int, changes: Changes | None = None) -> int:
+    """Log a change to input_data and return the new data version, caller must commit.
+
+    Leaving out `changes` means the load could have touched any room on any day.
+    """
+    ensure_ingest_log(conn)
+    cursor = conn.execute(
+        "INSERT INTO ingest_log (source, rows_loaded, loaded_at) VALUES (?,?,?)",
+        (source, rows, datetime.now().isoformat(timespec="seconds")),
+    )
+    version = cursor.lastrowid or 0
+    if changes is not None:
+        conn.execute(CREATE_INGEST_CHANGES)
+        conn.execute(
+            "INSERT INTO ingest_changes (version, room_ids, first_day, last_day) VALUES (?,?,?,?)",
+            (
+                version,
+                json.dumps(sorted(changes.room_ids)),
+                changes.first_day.isoformat() if changes.first_day else None,
+                changes.last_day.isoformat() if changes.last_day else None,
+            ),
+        )
+    return version
+
+
+_ingest_hooks: list[Callable[[], None]] = []
+
+
+def on_ingest(hook: Callable[[], None]) -> None:
+    """Register a function to run after new data has been committed to input_data."""
+    _ingest_hooks.append(hook)
+
+
+def notify_ingest() -> None:
+    """Run every registered post ingest hook, call only after the load has been committed."""
+    for hook in _ingest_hooks:
+        try:
+            hook()
+        except Exception as e:  # a broken hook should never fail the load itself
+            print(f"post ingest hook {hook} failed: {e}")
+
+
+# kept in step with sqlite/init.sql
+CREATE_INGEST_LOG = """
+    CREATE TABLE IF NOT EXISTS ingest_log (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        source TEXT,
+        rows_loaded INTEGER,
+        loaded_at TEXT
+    )
+    """
+
+# versions start at the current time in ms so a re-init never reuses a version
+# that caches or snapshots built from the old db could still be holding on to
+SEED_INGEST_LOG = """
+    INSERT INTO ingest_log
+        (version, source, rows_loaded, loaded_at)
+    SELECT
+        CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER), 'init', 0, datetime('now')
+    WHERE
+        NOT EXISTS (SELECT 1 FROM ingest_log)
+    """
+
+CREATE_INGEST_CHANGES = """
+    CREATE TABLE IF NOT EXISTS ingest_changes (
+        version INTEGER,
+        room_ids TEXT,
+        first_day TEXT,
+        last_day TEXT,
+        PRIMARY KEY (version)
+    )
+    """
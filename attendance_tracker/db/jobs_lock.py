@@ -0,0 +1,47 @@
+"""Lock file telling offline commands whether background jobs are running against a db.
+
+Every process running the scheduler or the email watcher holds a shared lock on a file
+next to the db for as long as it lives. Commands that rebuild or replace the db, like
+init-db, restore-backup and migrations that rewrite tables, take the lock exclusively
+and refuse to run while any other process holds it. The lock goes away with the process that held it, even on a crash.
+"""
+
+from __future__ import annotations
+
+import fcntl
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+
+class JobsRunningError(Exception):
+    """Raised when a command needs the db to itself but background jobs are running against it."""
+
+
+def lock_path(db_path: Path) -> Path:
+    """Get the lock file used for a db."""
+    return Path(db_path).with_name(f"{Path(db_path).name}.jobs.lock")
+
+
+def hold_shared(db_path: Path) -> IO:
+    """Take the shared lock for this process, keep the returned file open while jobs can run."""
+    lock = lock_path(db_path).open("a")
+    fcntl.flock(lock, fcntl.LOCK_SH)  # only waits while a migrate or restore holds it exclusively
+    return lock
+
+
+@contextmanager
+def exclusive(db_path: Path) -> Iterator[None]:
+    """Hold the lock exclusively, raises JobsRunningError right away if background jobs are running."""
+    path = lock_path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError as e:
+            msg = f"background jobs are running against {db_path}, stop the web server first"
+            raise JobsRunningError(msg) from e
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
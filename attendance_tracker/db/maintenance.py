@@ -0,0 +1,203 @@
+"""Nightly upkeep so the query planner has fresh stats and the db file doesn't keep growing.
+
+Each run refreshes planner stats with a bounded ANALYZE and PRAGMA optimize, hands
+free pages back to the filesystem with incremental_vacuum a few pages at a time, and
+truncates the WAL. Every step commits on its own so loads and page views only ever
+wait on one small step, and the run stops vacuuming once its time budget is spent.
+Runs are logged to maintenance_log with file sizes before and after and each step's time.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, NamedTuple
+
+ANALYSIS_LIMIT = 1000  # rows ANALYZE looks at per index, keeps it quick on a big table
+VACUUM_PAGES = 512  # pages freed per incremental_vacuum step
+BUSY_TIMEOUT = 5  # seconds a step waits on a load holding the write lock before giving up
+
+_running = threading.Lock()  # one run at a time per process
+
+
+class MaintenanceRunningError(Exception):
+    """Raised when maintenance is asked for while this process is already running it."""
+
+
+class MaintenanceResult(NamedTuple):
+    """What a single maintenance run did, steps are dicts with the step name, seconds and details."""
+
+    bytes_before: int
+    bytes_after: int
+    freelist_before: int
+    freelist_after: int
+    seconds: float
+    steps: list[dict[str, Any]]
+
+
+def run(db_path: Path, budget_seconds: float = 60.0, vacuum_pages: int = VACUUM_PAGES) -> MaintenanceResult:
+    """Run every maintenance step, stopping the vacuum once budget_seconds have passed."""
+    if not _running.acquire(blocking=False):
+        msg = "maintenance is already running"
+        raise MaintenanceRunningError(msg)
+    try:
+        return _run(db_path, budget_seconds, vacuum_pages)
+    finally:
+        _running.release()
+
+
+def run_in_background(db_path: Path, budget_seconds: float, vacuum_pages: int) -> None:
+    """Start a maintenance run on a daemon thread, raises MaintenanceRunningError if one is already going."""
+    if _running.locked():
+        msg = "maintenance is already running"
+        raise MaintenanceRunningError(msg)
+    threading.Thread(
+        target=_run_logging_errors,
+        args=(db_path, budget_seconds, vacuum_pages),
+        name="db-maintenance",
+        daemon=True,
+    ).start()
+
+
+def recent(conn: sqlite3.Connection, limit: int = 14) -> list[dict]:
+    """Get the latest maintenance runs as dicts for the maintenance page."""
+    conn.execute(CREATE_MAINTENANCE_LOG)
+    cursor = conn.execute(QUERY_RECENT, (limit,))
+    columns = [col[0] for col in cursor.description]
+    runs = [dict(zip(columns, row, strict=True)) for row in cursor.fetchall()]
+    for r in runs:
+        r["steps"] = json.loads(r["steps"] or "[]")
+    return runs
+
+
+def _run_logging_errors(db_path: Path, budget_seconds: float, vacuum_pages: int) -> None:
+    try:
+        result = run(db_path, budget_seconds, vacuum_pages)
+    except Exception as e:  # nobody is waiting on this thread
+        print(f"db maintenance failed: {e}")
+        return
+    print(f"db maintenance took {result.seconds:.1f}s, {result.bytes_before} -> {result.bytes_after} bytes")
+
+
+def _run(db_path: Path, budget_seconds: float, vacuum_pages: int) -> MaintenanceResult:
+    started = time.monotonic()
+    deadline = started + budget_seconds
+    started_at = datetime.now().isoformat(timespec="seconds")
+    steps: list[dict[str, Any]] = []
+
+    # autocommit so every step is its own short transaction
+    with closing(sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)) as conn:
+        bytes_before, freelist_before = _file_bytes(db_path), _freelist(conn)
+
+        _step(steps, "analyze", lambda: _analyze(conn))
+        _step(steps, "optimize", lambda: _optimize(conn))
+        _step(steps, "incremental_vacuum", lambda: _vacuum(conn, deadline, vacuum_pages))
+        _step(steps, "wal_checkpoint", lambda: _checkpoint(conn))
+
+        bytes_after, freelist_after = _file_bytes(db_path), _freelist(conn)
+        seconds = time.monotonic() - started
+        conn.execute(CREATE_MAINTENANCE_LOG)
+        conn.execute(
+            """
+            INSERT INTO maintenance_log
+                (started_at, seconds, bytes_before, bytes_after, freelist_before, freelist_after, steps, status)
+            VALUES (?,?,?,?,?,?,?,?)
+            """,
+            (
+                started_at,
+                round(seconds, 2),
+                bytes_before,
+                bytes_after,
+                freelist_before,
+                freelist_after,
+                json.dumps(steps),
+                "failed" if any("error" in step for step in steps) else "done",
+            ),
+        )
+    return MaintenanceResult(bytes_before, bytes_after, freelist_before, freelist_after, seconds, steps)
+
+
+def _step(steps: list[dict[str, Any]], name: str, fn: Callable[[], str | None]) -> None:
+    """Time one step and keep going if it fails, a later step may still be useful."""
+    started = time.monotonic()
+    step: dict[str, Any] = {"step": name}
+    try:
+        detail = fn()
+        if detail is not None:
+            step["detail"] = detail
+    except sqlite3.Error as e:  # usually a load held the lock past BUSY_TIMEOUT
+        step["error"] = str(e)
+    step["seconds"] = round(time.monotonic() - started, 3)
+    steps.append(step)
+
+
+def _analyze(conn: sqlite3.Connection) -> None:
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+
+
+def _optimize(conn: sqlite3.Connection) -> None:
+    conn.execute("PRAGMA optimize").fetchall()
+
+
+def _vacuum(conn: sqlite3.Connection, deadline: float, pages: int) -> str:
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return "skipped, auto_vacuum isn't incremental yet, run flask migrate"
+    freed = 0
+    while (free := _freelist(conn)) and time.monotonic() < deadline:
+        conn.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()  # frees a page per row stepped
+        if _freelist(conn) >= free:
+            break  # nothing could be freed, leave it for next time
+        freed += free - _freelist(conn)
+    left = _freelist(conn)
+    return f"freed {freed} pages" + (f", {left} left for next time" if left else "")
+
+
+def _checkpoint(conn: sqlite3.Connection) -> str:
+    if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+        return "skipped, not in WAL mode"
+    busy, wal_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    if busy:  # a reader was still on an old snapshot, what it needs stays for the next checkpoint
+        return f"partial, {checkpointed} of {wal_frames} frames checkpointed"
+    return f"checkpointed {checkpointed} frames, WAL truncated"
+
+
+def _freelist(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def _file_bytes(db_path: Path) -> int:
+    """Size of the db plus its WAL, the WAL counts since truncating it is part of the job."""
+    wal = Path(f"{db_path}-wal")
+    return db_path.stat().st_size + (wal.stat().st_size if wal.exists() else 0)
+
+
+# kept in step with sqlite/init.sql
+CREATE_MAINTENANCE_LOG = """
+    CREATE TABLE IF NOT EXISTS maintenance_log (
+        run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TEXT,
+        seconds REAL,
+        bytes_before INTEGER,
+        bytes_after INTEGER,
+        freelist_before INTEGER,
+        freelist_after INTEGER,
+        steps TEXT,
+        status TEXT
+    )
+    """
+
+QUERY_RECENT = """
+    SELECT
+        started_at, seconds, bytes_before, bytes_after, freelist_before, freelist_after, steps, status
+    FROM
+        maintenance_log
+    ORDER BY
+        run_id DESC
+    LIMIT ?
+    """
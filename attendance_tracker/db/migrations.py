@@ -0,0 +1,316 @@
+"""Numbered schema migrations applied to a live db without dropping anything.
+
+init-db builds the newest schema straight from sqlite/init.sql and stamps every
+migration as applied, `flask migrate` brings an older db up to date. A migration's
+schema change and its schema_version row commit together. Migrations that rewrite
+rows do it in a backfill afterwards, committing every `chunk_rows` rows by rowid so
+readers and loads get the db in between chunks, and a backfill cut off part way
+carries on from its last committed chunk next run.
+
+Most migrations run while the app is serving. Ones marked offline rename or rewrite
+tables the running code reads, so they need the background jobs stopped first.
+
+New migrations go on the end of MIGRATIONS, with the same change made in init.sql.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import time
+from contextlib import closing, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from attendance_tracker.db import (
+    archive,
+    backfill,
+    backup,
+    calendar,
+    export,
+    ingest_log,
+    jobs_lock,
+    maintenance,
+    rooms,
+    search,
+    upload_jobs,
+)
+from attendance_tracker.email import download_csv
+
+BACKFILL_CHUNK_ROWS = 5_000
+
+
+class Backfill(NamedTuple):
+    """Statement run over a table one rowid range at a time, it takes the first and last rowid of the range.
+
+    Only rows that exist when the backfill starts are covered, code writing the table
+    has to fill the new data itself from the moment the schema change commits.
+    """
+
+    table: str
+    sql: str
+    finish: Callable[[sqlite3.Connection], None] | None = None  # run in the transaction marking it finished
+
+
+class Migration(NamedTuple):
+    """One numbered schema change."""
+
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Connection], None]
+    backfill: Backfill | None = None
+    transaction: bool = True  # false for changes that can't run in a transaction, like journal_mode
+    offline: bool = False  # true for changes the running app can't work through, like renaming input_data
+
+
+def _statements(*sql: str) -> Callable[[sqlite3.Connection], None]:
+    def apply(conn: sqlite3.Connection) -> None:
+        for statement in sql:
+            conn.execute(statement)
+
+    return apply
+
+
+def _room_ids(conn: sqlite3.Connection) -> None:
+    for statement in rooms.CREATE_ROOM_TABLES:
+        conn.execute(statement)
+    rooms.seed_aliases(conn)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(input_data)")]
+    if "room_id" not in columns:
+        # the old rows stay in input_data_old until the backfill has copied them over
+        conn.execute("ALTER TABLE input_data RENAME TO input_data_old")
+        conn.execute(rooms.CREATE_INPUT_DATA)
+        # every old key resolved up front, the backfill copies chunks with a plain join on this
+        conn.execute(rooms.CREATE_ROOM_MAP)
+        lookup = rooms.RoomLookup(conn)
+        old_keys = conn.execute(
+            "SELECT building, room_num FROM input_data_old UNION SELECT building, room_num FROM room_log"
+        ).fetchall()
+        conn.executemany(
+            "INSERT INTO room_map (building, room_num, room_id) VALUES (?,?,?)",
+            [(b, r, lookup.room_id(b, r)) for b, r in old_keys],
+        )
+        for statement in rooms.MOVE_ROOM_LOG:  # one row per room, small enough to move here
+            conn.execute(statement)
+    # both stay empty on a db already using room ids, so the backfill has nothing to copy
+    conn.execute(rooms.CREATE_INPUT_DATA_OLD)
+    conn.execute(rooms.CREATE_ROOM_MAP)
+
+
+def _wal(conn: sqlite3.Connection) -> None:
+    mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    if mode != "wal":
+        msg = f"could not switch to WAL, journal mode is still {mode}"
+        raise ValueError(msg)
+
+
+def _incremental_vacuum(conn: sqlite3.Connection) -> None:
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    print("rewriting the db to switch on incremental auto_vacuum, this needs free disk space the size of the db")
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def _log_tables(conn: sqlite3.Connection) -> None:
+    for statement in [
+        ingest_log.CREATE_INGEST_LOG,
+        ingest_log.SEED_INGEST_LOG,
+        ingest_log.CREATE_INGEST_CHANGES,
+        archive.CREATE_MANIFEST,
+        export.CREATE_EXPORT_LOG,
+        upload_jobs.CREATE_UPLOAD_JOBS,
+        download_csv.CREATE_ATTACHMENT_LOG,
+        backfill.CREATE_BACKFILL_LOG,
+        backup.CREATE_BACKUP_LOG,
+        maintenance.CREATE_MAINTENANCE_LOG,
+    ]:
+        conn.execute(statement)
+
+
+def _calendar(conn: sqlite3.Connection) -> None:
+    calendar.fill(conn)
+
+
+# M/D/YYYY dates from email csvs, padded or not, rewritten as YYYY-MM-DD, printf's %d reads the number a str
+# starts with. A day already stored as ISO for the room keeps that row, the other is dropped when the backfill ends
+ISO_DATES = """
+    UPDATE OR IGNORE input_data SET
+        date_entered = printf(
+            '%s-%02d-%02d',
+            substr(date_entered, -4),
+            date_entered,
+            substr(date_entered, instr(date_entered, '/') + 1)
+        )
+    WHERE
+        rowid BETWEEN ? AND ? AND
+        instr(date_entered, '/')
+    """
+# every ISO date starts with a 2, so the range keeps this to the leftover US dates in input_data_by_date
+DROP_US_DATED_DUPLICATES = "DELETE FROM input_data WHERE date_entered < '2' AND instr(date_entered, '/')"
+
+MIGRATIONS = [
+    Migration(
+        1,
+        "input_data and room_log keyed by room_id",
+        _room_ids,
+        Backfill(
+            "input_data_old", rooms.COPY_TO_ROOM_IDS, _statements("DROP TABLE input_data_old", "DROP TABLE room_map")
+        ),
+        offline=True,
+    ),
+    # date range scans for usage and reports read this instead of the whole table
+    Migration(
+        2,
+        "covering index on input_data dates",
+        _statements(
+            "CREATE INDEX IF NOT EXISTS input_data_by_date ON input_data (date_entered, room_id, times_accessed)"
+        ),
+    ),
+    # readers keep going while a load or backfill chunk is being written
+    Migration(3, "WAL journal mode", _wal, transaction=False),
+    # lets nightly maintenance free pages a few at a time, switching needs one full VACUUM
+    Migration(4, "incremental auto_vacuum", _incremental_vacuum, transaction=False, offline=True),
+    # every table init.sql gained since the first schema, the code creating them on first use only covers some
+    Migration(5, "ingest, archive, export, upload, backfill, backup and maintenance logs", _log_tables),
+    # room activity series are zero filled and grouped by week, month or term against this
+    Migration(6, "calendar table", _calendar),
+    # date ranges compare date_entered as a str, which only works if every row uses the same format
+    Migration(
+        7,
+        "date_entered stored as YYYY-MM-DD",
+        _statements(),
+        Backfill("input_data", ISO_DATES, _statements(DROP_US_DATED_DUPLICATES)),
+    ),
+    # built once here instead of checked on every admin page, replaces an index keyed by admin_emails rowid
+    Migration(8, "full text search for clubs and admin emails", search.build_index),
+]
+LATEST = MIGRATIONS[-1].version
+
+
+def pending(conn: sqlite3.Connection) -> list[Migration]:
+    """Get migrations not applied yet, or applied with their backfill still unfinished, in order."""
+    conn.execute(CREATE_SCHEMA_VERSION)
+    finished = {version for (version,) in conn.execute(QUERY_FINISHED)}
+    return [migration for migration in MIGRATIONS if migration.version not in finished]
+
+
+def stamp(conn: sqlite3.Connection) -> None:
+    """Mark every migration applied, for a db just built from init.sql, caller must commit."""
+    conn.execute(CREATE_SCHEMA_VERSION)
+    now = datetime.now().isoformat(timespec="seconds")
+    conn.executemany(
+        "INSERT OR REPLACE INTO schema_version (version, name, applied_at, finished_at) VALUES (?,?,?,?)",
+        [(migration.version, migration.name, now, now) for migration in MIGRATIONS],
+    )
+
+
+def migrate(
+    db_path: Path,
+    target: int | None = None,
+    chunk_rows: int = BACKFILL_CHUNK_ROWS,
+    pause: float = 0.0,
+) -> list[Migration]:
+    """Apply pending migrations up to target (default all), returns the ones applied.
+
+    `pause` is seconds slept between backfill chunks, to leave a busy db more room.
+    Raises JobsRunningError if a web server is running background jobs against the db
+    and one of the migrations to apply is offline.
+    """
+    # autocommit so every transaction below is explicit, a 30s timeout waits out loads holding the write lock
+    with closing(sqlite3.connect(db_path, timeout=30, isolation_level=None)) as conn:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'input_data'").fetchone() is None:
+            print("db has no tables yet, create it with flask init-db")
+            return []
+
+        todo = [migration for migration in pending(conn) if target is None or migration.version <= target]
+        applied = []
+        with jobs_lock.exclusive(db_path) if any(migration.offline for migration in todo) else nullcontext():
+            for migration in todo:
+                started = time.monotonic()
+                if conn.execute(QUERY_STARTED, (migration.version,)).fetchone() is None:
+                    _apply(conn, migration)
+                if migration.backfill is not None:
+                    _backfill(conn, migration.version, migration.backfill, chunk_rows, pause)
+                applied.append(migration)
+                print(f"applied migration {migration.version} {migration.name} in {time.monotonic() - started:.1f}s")
+    return applied
+
+
+def _apply(conn: sqlite3.Connection, migration: Migration) -> None:
+    now = datetime.now().isoformat(timespec="seconds")
+    record = (
+        migration.version,
+        migration.name,
+        now,
+        0 if migration.backfill else None,
+        None if migration.backfill else now,  # finished once its backfill is
+    )
+    if not migration.transaction:
+        migration.apply(conn)  # so these have to be safe to run again if the insert below never happens
+        conn.execute(INSERT_SCHEMA_VERSION, record)
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        migration.apply(conn)
+        conn.execute(INSERT_SCHEMA_VERSION, record)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _backfill(conn: sqlite3.Connection, version: int, backfill: Backfill, chunk_rows: int, pause: float) -> None:
+    (done,) = conn.execute("SELECT backfill_rowid FROM schema_version WHERE version = ?", (version,)).fetchone()
+    last = conn.execute(f"SELECT MAX(rowid) FROM {backfill.table}").fetchone()[0] or 0
+    if done < last:
+        print(f"migration {version} backfilling {backfill.table} from rowid {done + 1} to {last}")
+    while done < last:
+        end = min(done + chunk_rows, last)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(backfill.sql, (done + 1, end))
+            conn.execute("UPDATE schema_version SET backfill_rowid = ? WHERE version = ?", (end, version))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        done = end
+        if pause:
+            time.sleep(pause)  # other writers can take the lock here
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if backfill.finish is not None:
+            backfill.finish(conn)
+        conn.execute(
+            "UPDATE schema_version SET backfill_rowid = NULL, finished_at = ? WHERE version = ?",
+            (datetime.now().isoformat(timespec="seconds"), version),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# kept in step with sqlite/init.sql
+CREATE_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER,
+        name TEXT,
+        applied_at TEXT,
+        backfill_rowid INTEGER,
+        finished_at TEXT,
+        PRIMARY KEY (version)
+    )
+    """
+
+INSERT_SCHEMA_VERSION = """
+    INSERT INTO schema_version
+        (version, name, applied_at, backfill_rowid, finished_at)
+    VALUES (?,?,?,?,?)
+    """
+
+QUERY_STARTED = "SELECT 1 FROM schema_version WHERE version = ?"
+QUERY_FINISHED = "SELECT version FROM schema_version WHERE finished_at IS NOT NULL"
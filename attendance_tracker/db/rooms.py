@@ -0,0 +1,162 @@
+"""Rooms dimension table, maps building/room pairs to compact integer room ids."""
+
+from __future__ import annotations
+
+import sqlite3
+from typing import Iterable
+
+from attendance_tracker.email.cleaner import BUILDING_ALIASES
+from attendance_tracker.types import tables
+
+RoomKey = tuple[str, int | str]
+
+
+def normalize_room_num(room_num: int | str) -> int | str:
+    """Room numbers are ints unless they have a letter on the end like 215A."""
+    room_num = str(room_num).strip()
+    return int(room_num) if room_num.isdigit() else room_num
+
+
+def seed_aliases(conn: sqlite3.Connection) -> None:
+    """Fill building_aliases from the cleaner alias map, caller must commit."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO building_aliases (alias, building) VALUES (?,?)",
+        [(alias, building) for building, aliases in BUILDING_ALIASES.items() for alias in aliases],
+    )
+
+
+class RoomLookup:
+    """In memory copy of the rooms + building_aliases tables used to resolve room ids.
+
+    Load once per ingest, then resolving each row is a dict lookup instead of a query.
+    Rooms not seen before are inserted on the given connection, caller must commit.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        """Read every alias and room into memory."""
+        self.conn = conn
+        self.aliases = {alias.lower(): building for alias, building in conn.execute(QUERY_ALIASES)}
+        self.room_ids: dict[RoomKey, int] = {
+            (building, normalize_room_num(room_num)): room_id
+            for room_id, building, room_num in conn.execute(QUERY_ROOMS)
+        }
+
+    def canonical_key(self, building: str, room_num: int | str) -> RoomKey:
+        """Swap a building alias for its canonical name and normalize the room number."""
+        building = building.strip()
+        return self.aliases.get(building.lower(), building), normalize_room_num(room_num)
+
+    def find(self, building: str, room_num: int | str) -> int | None:
+        """Get room id for building/room, None if the room has never been seen."""
+        return self.room_ids.get(self.canonical_key(building, room_num))
+
+    def room_id(self, building: str, room_num: int | str) -> int:
+        """Get room id for building/room, adding the room to the rooms table if it is new."""
+        key = self.canonical_key(building, room_num)
+        if key not in self.room_ids:
+            cursor = self.conn.execute("INSERT INTO rooms (building, room_num) VALUES (?,?)", key)
+            self.room_ids[key] = cursor.lastrowid  # type: ignore[assignment]
+        return self.room_ids[key]
+
+    def to_facts(self, rows: Iterable[tables.InputData]) -> list[tables.InputFact]:
+        """Resolve the room of every raw input row so it can be inserted into input_data."""
+        return [row.to_fact(self.room_id(row.building, row.room_num)) for row in rows]
+
+
+QUERY_ALIASES = "SELECT alias, building FROM building_aliases"
+QUERY_ROOMS = "SELECT room_id, building, room_num FROM rooms"
+
+# kept in step with sqlite/init.sql
+CREATE_ROOM_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS rooms (
+        room_id INTEGER PRIMARY KEY,
+        building TEXT NOT NULL,
+        room_num INTEGER NOT NULL,
+        UNIQUE (building, room_num)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS building_aliases (
+        alias TEXT COLLATE NOCASE,
+        building TEXT NOT NULL,
+        PRIMARY KEY (alias)
+    )
+    """,
+]
+
+# the rest moves a db from building/room_num keys over to room ids, migration 1 in db/migrations.py
+
+# kept in step with sqlite/init.sql
+CREATE_INPUT_DATA = """
+    CREATE TABLE input_data (
+        room_id INTEGER,
+        times_accessed INTEGER,
+        access_succeed INTEGER,
+        access_fail INTEGER,
+        date_entered TEXT,
+        PRIMARY KEY (room_id, date_entered),
+        FOREIGN KEY (room_id) REFERENCES rooms (room_id)
+    )
+    """
+
+# input_data as it was before room ids
+CREATE_INPUT_DATA_OLD = """
+    CREATE TABLE IF NOT EXISTS input_data_old (
+        building TEXT,
+        room_num INTEGER,
+        times_accessed INTEGER,
+        access_succeed INTEGER,
+        access_fail INTEGER,
+        date_entered TEXT,
+        PRIMARY KEY (building, room_num, date_entered)
+    )
+    """
+
+CREATE_ROOM_MAP = """
+    CREATE TABLE IF NOT EXISTS room_map (
+        building TEXT,
+        room_num INTEGER,
+        room_id INTEGER,
+        PRIMARY KEY (building, room_num)
+    )
+    """
+
+MOVE_ROOM_LOG = [
+    """
+    CREATE TABLE room_log_new (
+        room_id INTEGER,
+        assigned_club TEXT,
+        PRIMARY KEY (room_id),
+        FOREIGN KEY (room_id) REFERENCES rooms (room_id),
+        FOREIGN KEY (assigned_club) REFERENCES CLUB_DATA (club_name)
+    )
+    """,
+    """
+    INSERT OR IGNORE INTO room_log_new
+    SELECT
+        m.room_id, assigned_club
+    FROM
+        room_log l JOIN room_map m ON l.building = m.building AND l.room_num = m.room_num
+    """,
+    "DROP TABLE room_log",
+    "ALTER TABLE room_log_new RENAME TO room_log",
+]
+
+# rows that end up on the same room + day after alias resolution are summed, within a chunk and across chunks
+COPY_TO_ROOM_IDS = """
+    INSERT INTO input_data
+        (room_id, times_accessed, access_succeed, access_fail, date_entered)
+    SELECT
+        m.room_id, SUM(i.times_accessed), SUM(i.access_succeed), SUM(i.access_fail), i.date_entered
+    FROM
+        input_data_old i JOIN room_map m ON i.building = m.building AND i.room_num = m.room_num
+    WHERE
+        i.rowid BETWEEN ? AND ?
+    GROUP BY
+        m.room_id, i.date_entered
+    ON CONFLICT (room_id, date_entered) DO UPDATE SET
+        times_accessed = times_accessed + excluded.times_accessed,
+        access_succeed = access_succeed + excluded.access_succeed,
+        access_fail = access_fail + excluded.access_fail
+    """
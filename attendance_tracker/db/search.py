@@ -0,0 +1,272 @@
+"""Full text search with keyset pagination over room assignments and admin emails.
+
+Both searches go through FTS5 tables kept in sync by triggers, so every write path
+(admin pages, email commands, imports) is covered without calling anything. init-db
+and migration 8 build them, nothing touches the index on a search. Pages
+are fetched with a cursor holding the sort key of the last row shown, so page 100
+costs the same as page 1 however many clubs there are.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import re
+import sqlite3
+from typing import Any, NamedTuple
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class Page(NamedTuple):
+    """One page of search results, `next_cursor` is None on the last page."""
+
+    results: list[dict[str, Any]]
+    next_cursor: str | None
+
+
+def build_index(conn: sqlite3.Connection) -> None:
+    """Recreate the search tables and triggers and fill them from existing rows, caller must commit."""
+    # from scratch, an index built by older code may be keyed differently
+    existing = conn.execute(
+        "SELECT type, name FROM sqlite_master WHERE name IN (SELECT value FROM json_each(?))",
+        (json.dumps(SEARCH_OBJECTS),),
+    ).fetchall()
+    for kind, name in existing:
+        conn.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+    for statement in SEARCH_SCHEMA:
+        conn.execute(statement)
+    conn.execute(POPULATE_CLUB_SEARCH)
+    conn.execute("INSERT INTO admin_email_search (admin_email) SELECT admin_email FROM admin_emails")
+
+
+def search_clubs(conn: sqlite3.Connection, text: str = "", cursor: str | None = None, limit: int = PAGE_SIZE) -> Page:
+    """Get room assignments matching text by club, president or room, ordered by building and room."""
+    where = []
+    params: list[Any] = []
+    match = match_query(text)
+    if match:
+        where.append("club_search MATCH ?")
+        params.append(match)
+    if cursor:
+        where.append("(r.building, r.room_num) > (?, ?)")
+        params.extend(decode_cursor(cursor, 2))
+
+    query = QUERY_CLUBS_MATCH if match else QUERY_CLUBS
+    query = query.format(where=f"WHERE {' AND '.join(where)}" if where else "")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = conn.execute(query, (*params, limit + 1)).fetchall()  # one extra row says if there's another page
+
+    results = [
+        {"building": building, "room_num": room_num, "club": club, "president": president}
+        for building, room_num, club, president in rows[:limit]
+    ]
+    next_cursor = encode_cursor([rows[limit - 1][0], rows[limit - 1][1]]) if len(rows) > limit else None
+    return Page(results, next_cursor)
+
+
+def search_admin_emails(
+    conn: sqlite3.Connection,
+    text: str = "",
+    cursor: str | None = None,
+    limit: int = PAGE_SIZE,
+) -> Page:
+    """Get admin emails matching text, in alphabetical order."""
+    where = []
+    params: list[Any] = []
+    match = match_query(text)
+    if match:
+        where.append("admin_email_search MATCH ?")
+        params.append(match)
+    if cursor:
+        where.append("e.admin_email > ?")
+        params.extend(decode_cursor(cursor, 1))
+
+    query = QUERY_EMAILS_MATCH if match else QUERY_EMAILS
+    query = query.format(where=f"WHERE {' AND '.join(where)}" if where else "")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = conn.execute(query, (*params, limit + 1)).fetchall()
+
+    results = [{"email": email, "permanent": bool(permanent)} for email, permanent in rows[:limit]]
+    next_cursor = encode_cursor([rows[limit - 1][0]]) if len(rows) > limit else None
+    return Page(results, next_cursor)
+
+
+def match_query(text: str) -> str:
+    """Turn what was typed into an FTS5 query matching every word as a prefix, empty to match everything."""
+    words = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{word}"*' for word in words)  # quoted so words like AND/OR/NEAR aren't operators
+
+
+def encode_cursor(key: list) -> str:
+    """Pack the sort key of the last row on a page into a url safe cursor."""
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Unpack a cursor made by encode_cursor, raises ValueError if it was tampered with."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        msg = f"bad cursor {cursor!r}"
+        raise ValueError(msg) from e
+    if not isinstance(key, list) or len(key) != size:
+        msg = f"bad cursor {cursor!r}"
+        raise ValueError(msg)
+    return key
+
+
+QUERY_CLUBS = """
+    SELECT
+        r.building, r.room_num, l.assigned_club, c.club_president
+    FROM
+        room_log l
+        JOIN rooms r ON r.room_id = l.room_id
+        LEFT JOIN club_data c ON c.club_name = l.assigned_club
+    {where}
+    ORDER BY
+        r.building, r.room_num
+    LIMIT ?
+    """
+
+QUERY_CLUBS_MATCH = """
+    SELECT
+        r.building, r.room_num, l.assigned_club, c.club_president
+    FROM
+        club_search
+        JOIN room_log l ON l.room_id = club_search.rowid
+        JOIN rooms r ON r.room_id = l.room_id
+        LEFT JOIN club_data c ON c.club_name = l.assigned_club
+    {where}
+    ORDER BY
+        r.building, r.room_num
+    LIMIT ?
+    """
+
+QUERY_EMAILS = """
+    SELECT
+        e.admin_email, e.permanent
+    FROM
+        admin_emails e
+    {where}
+    ORDER BY
+        e.admin_email
+    LIMIT ?
+    """
+
+QUERY_EMAILS_MATCH = """
+    SELECT
+        e.admin_email, e.permanent
+    FROM
+        admin_email_search
+        JOIN admin_emails e ON e.admin_email = admin_email_search.admin_email
+    {where}
+    ORDER BY
+        e.admin_email
+    LIMIT ?
+    """
+
+POPULATE_CLUB_SEARCH = """
+    INSERT INTO club_search
+        (rowid, club_name, club_president, location)
+    SELECT
+        l.room_id, l.assigned_club, c.club_president, r.building || ' ' || r.room_num
+    FROM
+        room_log l
+        JOIN rooms r ON r.room_id = l.room_id
+        LEFT JOIN club_data c ON c.club_name = l.assigned_club
+    """
+
+SEARCH_OBJECTS = [
+    "club_search",
+    "room_log_search_insert",
+    "room_log_search_delete",
+    "room_log_search_update",
+    "club_data_search_insert",
+    "club_data_search_update",
+    "club_data_search_delete",
+    "admin_email_search",
+    "admin_emails_search_insert",
+    "admin_emails_search_delete",
+    "admin_emails_search_update",
+]
+
+# kept in step with sqlite/init.sql
+SEARCH_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS club_search USING fts5 (
+        club_name, club_president, location,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS room_log_search_insert AFTER INSERT ON room_log BEGIN
+        INSERT INTO club_search (rowid, club_name, club_president, location)
+        SELECT
+            NEW.room_id,
+            NEW.assigned_club,
+            (SELECT club_president FROM club_data WHERE club_name = NEW.assigned_club),
+            (SELECT building || ' ' || room_num FROM rooms WHERE room_id = NEW.room_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS room_log_search_delete AFTER DELETE ON room_log BEGIN
+        DELETE FROM club_search WHERE rowid = OLD.room_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS room_log_search_update AFTER UPDATE ON room_log BEGIN
+        DELETE FROM club_search WHERE rowid = OLD.room_id;
+        INSERT INTO club_search (rowid, club_name, club_president, location)
+        SELECT
+            NEW.room_id,
+            NEW.assigned_club,
+            (SELECT club_president FROM club_data WHERE club_name = NEW.assigned_club),
+            (SELECT building || ' ' || room_num FROM rooms WHERE room_id = NEW.room_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS club_data_search_insert AFTER INSERT ON club_data BEGIN
+        UPDATE club_search SET club_president = NEW.club_president
+        WHERE rowid IN (SELECT room_id FROM room_log WHERE assigned_club = NEW.club_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS club_data_search_update AFTER UPDATE ON club_data BEGIN
+        UPDATE club_search SET club_president = NULL
+        WHERE rowid IN (SELECT room_id FROM room_log WHERE assigned_club = OLD.club_name);
+        UPDATE club_search SET club_president = NEW.club_president
+        WHERE rowid IN (SELECT room_id FROM room_log WHERE assigned_club = NEW.club_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS club_data_search_delete AFTER DELETE ON club_data BEGIN
+        UPDATE club_search SET club_president = NULL
+        WHERE rowid IN (SELECT room_id FROM room_log WHERE assigned_club = OLD.club_name);
+    END
+    """,
+    # keyed by admin_email, admin_emails has no INTEGER PRIMARY KEY so VACUUM can renumber its rowids
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS admin_email_search USING fts5 (
+        admin_email,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS admin_emails_search_insert AFTER INSERT ON admin_emails BEGIN
+        INSERT INTO admin_email_search (admin_email) VALUES (NEW.admin_email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS admin_emails_search_delete AFTER DELETE ON admin_emails BEGIN
+        DELETE FROM admin_email_search WHERE admin_email = OLD.admin_email;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS admin_emails_search_update AFTER UPDATE ON admin_emails BEGIN
+        UPDATE admin_email_search SET admin_email = NEW.admin_email WHERE admin_email = OLD.admin_email;
+    END
+    """,
+]
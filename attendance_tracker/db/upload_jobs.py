@@ -0,0 +1,265 @@
+"""Background jobs that load uploaded csvs into input_data without holding up a web worker.
+
+Uploads are saved to a spool dir and queued in the upload_jobs table. A scheduler job
+claims queued uploads and loads them in batches, every batch commits its rows together
+with the byte offset it reached, so a job cut off by a restart carries on from the last
+committed batch once its heartbeat goes stale.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO
+
+from attendance_tracker.db.ingest_log import Changes, notify_ingest, record_ingest
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.types import tables
+
+BATCH_ROWS = 5_000
+STALE_AFTER = 60.0  # seconds without a heartbeat before another worker takes a running job over
+MAX_ERRORS = 20  # rejected row messages kept per job, the count keeps going past this
+
+
+def new_job(spool_dir: Path) -> tuple[str, Path]:
+    """Get a fresh job id and the spool path its upload should be saved to."""
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    job_id = uuid.uuid4().hex
+    return job_id, spool_dir / f"{job_id}.csv"
+
+
+def check_header(spool_path: Path) -> None:
+    """Raise ValueError if the spooled csv doesn't have the input data columns."""
+    with spool_path.open("rb") as f:
+        header = f.readline().decode("utf-8").strip().split(",")
+    compare = zip(header, tables.InputData._fields, strict=True)
+    if not all(map(lambda i: i[0] == i[1], compare)):
+        msg = "mismatched columns from csv"
+        raise ValueError(msg)
+
+
+def submit(conn: sqlite3.Connection, job_id: str, filename: str, spool_path: Path) -> None:
+    """Queue a spooled upload to be loaded in the background, caller must commit."""
+    conn.execute(CREATE_UPLOAD_JOBS)
+    conn.execute(
+        """
+        INSERT INTO upload_jobs
+            (job_id, filename, spool_path, status, bytes_total, created_at)
+        VALUES (?,?,?,'queued',?,?)
+        """,
+        (job_id, filename, str(spool_path), spool_path.stat().st_size, datetime.now().isoformat(timespec="seconds")),
+    )
+
+
+def status(conn: sqlite3.Connection, job_id: str) -> dict | None:
+    """Get progress of a job as a dict ready to be sent as JSON, None if there is no such job."""
+    cursor = conn.execute("SELECT * FROM upload_jobs WHERE job_id = ?", (job_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    job = dict(zip([col[0] for col in cursor.description], row, strict=True))
+    job["errors"] = json.loads(job["errors"] or "[]")
+    job["eta_seconds"] = None
+    if job["status"] == "running" and job["bytes_read"] and job["started_at"]:
+        elapsed = job["heartbeat"] - datetime.fromisoformat(job["started_at"]).timestamp()
+        job["eta_seconds"] = round(elapsed * (job["bytes_total"] - job["bytes_read"]) / job["bytes_read"], 1)
+    del job["spool_path"], job["heartbeat"]  # internal, not useful to the page
+    return job
+
+
+def run_pending(db_path: Path) -> int:
+    """Load every queued upload plus any left behind by a dead worker, returns jobs finished."""
+    finished = 0
+    while (job_id := _claim_next(db_path)) is not None:
+        _run_job(db_path, job_id)
+        finished += 1
+    return finished
+
+
+def _claim_next(db_path: Path) -> str | None:
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.execute(CREATE_UPLOAD_JOBS)
+        conn.execute("BEGIN IMMEDIATE")  # only one worker can claim a given job
+        now = time.time()
+        row = conn.execute(
+            """
+            SELECT
+                job_id
+            FROM
+                upload_jobs
+            WHERE
+                status = 'queued' OR (status = 'running' AND heartbeat < ?)
+            ORDER BY
+                created_at
+            LIMIT 1
+            """,
+            (now - STALE_AFTER,),
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                """
+                UPDATE upload_jobs SET
+                    status = 'running', heartbeat = ?, started_at = COALESCE(started_at, ?)
+                WHERE
+                    job_id = ?
+                """,
+                (now, datetime.now().isoformat(timespec="seconds"), row[0]),
+            )
+        conn.commit()
+    return row[0] if row else None
+
+
+def _run_job(db_path: Path, job_id: str) -> None:
+    with closing(sqlite3.connect(db_path)) as conn:
+        spool_path, offset, read, inserted, rejected, errors = conn.execute(
+            """
+            SELECT
+                spool_path, bytes_read, rows_read, rows_inserted, rows_rejected, errors
+            FROM
+                upload_jobs
+            WHERE
+                job_id = ?
+            """,
+            (job_id,),
+        ).fetchone()
+        errors = json.loads(errors or "[]")
+        # rows committed before a restart aren't known here, so a resumed job could have touched anything
+        changes = Changes() if not offset else None
+
+        try:
+            lookup = RoomLookup(conn)
+            with Path(spool_path).open("rb") as f:
+                if offset:
+                    f.seek(offset)  # resuming, everything before this is already committed
+                else:
+                    f.readline()  # header, checked before the job was queued
+
+                while lines := _read_batch(f):
+                    conn.execute("BEGIN")  # batch rows and job progress commit together
+                    batch_inserted, batch_errors = _load_batch(conn, lookup, lines, changes)
+                    read += len(lines)
+                    inserted += batch_inserted
+                    rejected += len(batch_errors)
+                    errors = (errors + batch_errors)[:MAX_ERRORS]
+                    conn.execute(
+                        """
+                        UPDATE upload_jobs SET
+                            bytes_read = ?, rows_read = ?, rows_inserted = ?, rows_rejected = ?,
+                            errors = ?, heartbeat = ?
+                        WHERE
+                            job_id = ?
+                        """,
+                        (f.tell(), read, inserted, rejected, json.dumps(errors), time.time(), job_id),
+                    )
+                    conn.commit()
+        except Exception as e:  # keep the spooled file around so the upload can be looked at
+            conn.rollback()
+            conn.execute(
+                "UPDATE upload_jobs SET status = 'failed', error = ?, finished_at = ? WHERE job_id = ?",
+                (str(e), datetime.now().isoformat(timespec="seconds"), job_id),
+            )
+            conn.commit()
+            print(f"upload job {job_id} failed: {e}")
+            return
+
+        conn.execute(
+            "UPDATE upload_jobs SET status = 'done', finished_at = ? WHERE job_id = ?",
+            (datetime.now().isoformat(timespec="seconds"), job_id),
+        )
+        record_ingest(conn, "upload", inserted, changes)
+        conn.commit()
+
+    Path(spool_path).unlink(missing_ok=True)
+    notify_ingest()
+
+
+def _read_batch(f: BinaryIO) -> list[str]:
+    lines = []
+    while len(lines) < BATCH_ROWS:
+        line = f.readline()
+        if not line:
+            break
+        if line.strip():
+            lines.append(line.decode("utf-8").strip())
+    return lines
+
+
+def _load_batch(
+    conn: sqlite3.Connection,
+    lookup: RoomLookup,
+    lines: list[str],
+    changes: Changes | None = None,
+) -> tuple[int, list[str]]:
+    """Insert one batch of csv lines, returns rows inserted and a message per rejected row."""
+    errors: list[str] = []
+    raws = tables.InputDataBatch.from_lists((line.split(",") for line in lines), errors)
+    inserted, duplicates = insert_rows(conn, lookup, raws, changes)
+    return inserted, [f"bad record {e}" for e in errors] + duplicates
+
+
+def insert_rows(
+    conn: sqlite3.Connection,
+    lookup: RoomLookup,
+    raws: tables.InputDataBatch,
+    changes: Changes | None = None,
+) -> tuple[int, list[str]]:
+    """Insert rows skipping any already loaded, returns rows inserted and a message per duplicate.
+
+    Must run inside a transaction, the whole batch goes in with one executemany unless
+    it hits a duplicate, then rows are retried one at a time. Rooms and days of the
+    batch are added to `changes` when given.
+    """
+    if not raws:
+        return 0, []
+    room_ids = raws.room_ids(lookup.room_id)
+    if changes is not None:
+        changes.add(room_ids, raws.date_entered)  # duplicates included, they can only widen what pages refetch
+
+    # rooms added by the lookup above stay outside the savepoint, the lookup has their ids cached
+    conn.execute("SAVEPOINT batch")
+    try:
+        conn.executemany(raws.insert_format, raws.fact_rows(room_ids))
+        conn.execute("RELEASE batch")
+        return len(raws), []
+    except sqlite3.IntegrityError:
+        conn.execute("ROLLBACK TO batch")
+        conn.execute("RELEASE batch")
+
+    # something in the batch is already loaded, go row by row to find out what
+    inserted = 0
+    duplicates = []
+    for i, fact in enumerate(raws.fact_rows(room_ids)):
+        try:
+            conn.execute(raws.insert_format, fact)
+            inserted += 1
+        except sqlite3.IntegrityError:
+            duplicates.append(f"duplicate record for {raws.building[i]} {raws.room_num[i]} on {raws.date_entered[i]}")
+    return inserted, duplicates
+
+
+CREATE_UPLOAD_JOBS = """
+    CREATE TABLE IF NOT EXISTS upload_jobs (
+        job_id TEXT,
+        filename TEXT,
+        spool_path TEXT,
+        status TEXT,
+        bytes_total INTEGER,
+        bytes_read INTEGER DEFAULT 0,
+        rows_read INTEGER DEFAULT 0,
+        rows_inserted INTEGER DEFAULT 0,
+        rows_rejected INTEGER DEFAULT 0,
+        errors TEXT,
+        error TEXT,
+        created_at TEXT,
+        started_at TEXT,
+        finished_at TEXT,
+        heartbeat REAL,
+        PRIMARY KEY (job_id)
+    )
+    """
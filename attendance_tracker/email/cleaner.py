@@ -3,10 +3,34 @@
 from __future__ import annotations
 
 import csv
+import itertools
+import mmap
+import multiprocessing
 import os
 import re
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime
 
+# same buildings different names, also seeds the building_aliases table
+BUILDING_ALIASES = {
+    "Dana": ["Dana Hall", "Dana"],
+    "EEME": ["EEME"],
+    "Sloan": ["Sloan Hall", "Sloan"],
+}
+
+CLEANED_HEADER = [
+    "Building",
+    "Room Number",
+    "TimesAccessed",
+    "AccessSucceed",
+    "AccessFail",
+    "DateEntered",
+]
+PATRON_MARKER = b"Number of Patron"
+CHUNK_BYTES = 64 * 1024 * 1024  # size of the byte ranges handed to each worker by clean_csv_parallel
+MAX_IN_FLIGHT_PER_WORKER = 2  # ranges handed out per worker at once by clean_csv_parallel
+
 
 def clean_csv(input_csv, output_csv=None):
     """Clean the raw csv data into a structured format."""
@@ -38,16 +62,7 @@ def clean_csv(input_csv, output_csv=None):
         writer = csv.writer(outfile)
 
         # header
-        writer.writerow(
-            [
-                "Building",
-                "Room Number",
-                "TimesAccessed",
-                "AccessSucceed",
-                "AccessFail",
-                "DateEntered",
-            ]
-        )
+        writer.writerow(CLEANED_HEADER)
 
         # rows
         for data in cleaned_data:
@@ -63,6 +78,83 @@ def clean_csv(input_csv, output_csv=None):
     return result
 
 
+def clean_csv_parallel(input_csv, output_csv=None, workers=None, chunk_bytes=CHUNK_BYTES):
+    """Clean a very large raw csv by scanning byte ranges of it in worker processes.
+
+    The file is memory mapped and split into ranges ending on a newline, each worker
+    jumps between "Number of Patron" matches in its range instead of parsing every row,
+    and results are written in file order as they come back. At most
+    MAX_IN_FLIGHT_PER_WORKER ranges per worker are handed out at once, so memory use
+    doesn't grow with the file. Returns the number of entries written.
+    """
+    if output_csv is None:
+        input_dir = os.path.dirname(input_csv)
+        input_filename = os.path.basename(input_csv)
+        output_csv = os.path.join(input_dir, f"cleaned_{input_filename}")
+
+    ranges = iter(split_ranges(input_csv, chunk_bytes))
+    workers = workers or os.cpu_count() or 1
+    entries = 0
+    # spawn, forking a threaded web app process into workers is not safe
+    context = multiprocessing.get_context("spawn")
+    with (
+        ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool,
+        open(output_csv, "w", newline="", encoding="utf-8") as outfile,
+    ):
+        writer = csv.writer(outfile)
+        writer.writerow(CLEANED_HEADER)
+        # oldest range first so the output keeps the file order, a new range goes out as each one is written
+        in_flight: deque[Future] = deque()
+        while True:
+            for start, end in itertools.islice(ranges, MAX_IN_FLIGHT_PER_WORKER * workers - len(in_flight)):
+                in_flight.append(pool.submit(clean_range, input_csv, start, end))
+            if not in_flight:
+                break
+            rows = in_flight.popleft().result()
+            writer.writerows(rows)
+            entries += len(rows)
+
+    print(f"Cleaned data saved to {output_csv}")
+    print(f"Processed {entries} entries")
+    return entries
+
+
+def split_ranges(input_csv, chunk_bytes=CHUNK_BYTES):
+    """Split a file into (start, end) byte ranges of about chunk_bytes that end on a newline."""
+    size = os.path.getsize(input_csv)
+    if size == 0:
+        return []
+
+    ranges = []
+    with open(input_csv, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            newline = mm.find(b"\n", min(start + chunk_bytes, size) - 1)
+            end = size if newline == -1 else newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def clean_range(input_csv, start, end):
+    """Get cleaned rows for every patron record between byte offsets start and end."""
+    rows = []
+    with open(input_csv, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        match = mm.find(PATRON_MARKER, start, end)
+        while match != -1:
+            # widen the match out to the whole line it sits on
+            line_start = mm.rfind(b"\n", start, match) + 1 or start
+            line_end = mm.find(b"\n", match, end)
+            line_end = end if line_end == -1 else line_end
+            line = mm[line_start:line_end].decode("utf-8", errors="replace")
+            for row in csv.reader([line]):
+                room_data = get_row_data(row)
+                if room_data:
+                    rows.append(room_data)
+            match = mm.find(PATRON_MARKER, line_end, end)
+    return rows
+
+
 def get_row_data(row):
     """Extract relevant data from a csv row."""
     row_string = " ".join(str(cell) for cell in row)
@@ -96,17 +188,10 @@ def get_row_data(row):
 
 def parse_building_room(row_string):
     """Parse building and room number from row."""
-    # same buildings different names
-    building_aliases = {
-        "Dana": ["Dana Hall", "Dana"],
-        "EEME": ["EEME"],
-        "Sloan": ["Sloan Hall", "Sloan"],
-    }
-
     # look for building names and variants
     building = None
     alias = None
-    for bldg, patterns in building_aliases.items():
+    for bldg, patterns in BUILDING_ALIASES.items():
         for pattern in patterns:
             if pattern in row_string:
                 building = bldg
@@ -3,10 +3,16 @@
 from __future__ import annotations
 
 import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
 import os
-import pathlib
 import sqlite3
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime
 from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
 
 from dotenv import load_dotenv
 from imap_tools import (
@@ -15,9 +21,23 @@ from imap_tools import (
 from imap_tools import (
     MailBox,  # pyright: ignore[reportPrivateImportUsage] this is a spurious error, still gets the subpackages
 )
+from imap_tools import (
+    BaseMailBox,  # pyright: ignore[reportPrivateImportUsage] this is a spurious error, still gets the subpackages
+)
+from imap_tools import (
+    MailBoxUnencrypted,  # pyright: ignore[reportPrivateImportUsage] this is a spurious error, still gets the subpackages
+)
 
 import attendance_tracker.email.cleaner as cleaner
 import attendance_tracker.types.tables as tables
+from attendance_tracker.db.ingest_log import Changes, notify_ingest, record_ingest
+from attendance_tracker.db.rooms import RoomLookup
+
+PARSE_WORKERS = os.cpu_count() or 1
+MAX_IN_FLIGHT_PER_WORKER = 2
+# attachments this big are split across every worker by clean_csv_parallel instead of cleaned by one
+PARALLEL_CLEAN_BYTES = cleaner.CHUNK_BYTES
+LOAD_BATCH_ROWS = 50_000  # cleaned rows of a big attachment inserted at a time
 
 
 def configure():
@@ -25,11 +45,41 @@ def configure():
     load_dotenv()
 
 
-def _check_processed(db_path: Path, uid) -> bool:
+def _connect() -> BaseMailBox:
+    """Log into the mailbox set up in .env, mail_port and mail_ssl=false allow a local test server."""
+    configure()
+    mail_password = os.getenv("mail_password")
+    mail_username = os.getenv("mail_username")
+    mail_server = os.getenv("mail_server")
+
+    if not mail_password or not mail_username or not mail_server:
+        raise ValueError("Missing email credentials, add to .env file")
+
+    port = os.getenv("mail_port")
+    if os.getenv("mail_ssl", "true").lower() == "false":
+        mailbox: BaseMailBox = MailBoxUnencrypted(mail_server, int(port or 143))
+    else:
+        mailbox = MailBox(mail_server, int(port or 993))
+    mailbox.login(mail_username, mail_password, "INBOX")
+    print("Logged in successfully")
+    return mailbox
+
+
+def _fetch_new(mailbox: BaseMailBox, db_path: Path) -> list:
+    """Fetch report emails whose uid isn't in email_log yet, already processed emails aren't downloaded."""
+    uids = mailbox.uids(AND(subject="WSU Track"))
+    if not uids:
+        return []
     with sqlite3.connect(db_path) as conn:
-        # search db for uid and return if exists
-        result = conn.execute("SELECT email_id FROM email_log WHERE email_id = ?", (uid,))
-        return result.fetchone() is not None
+        # search db for uids in one query and keep the ones not seen yet
+        result = conn.execute(
+            "SELECT email_id FROM email_log WHERE email_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(uids),),
+        )
+        processed = {row[0] for row in result}
+    new = [uid for uid in uids if uid not in processed]
+    print(f"{len(uids) - len(new)} emails already processed, fetching {len(new)}")
+    return list(mailbox.fetch(AND(uid=new))) if new else []
 
 
 def _add_to_uid_db(db_path: Path, uid) -> None:
@@ -37,16 +87,52 @@ def _add_to_uid_db(db_path: Path, uid) -> None:
         conn.execute("INSERT INTO email_log (email_id) VALUES (?)", (uid,))
 
 
-def _load_from_email(db_path: Path) -> None:
-    """Check the email and download csvs in raw format."""
-    configure()
-    mail_password = os.getenv("mail_password")
-    mail_username = os.getenv("mail_username")
-    mail_server = os.getenv("mail_server")
+def _seen_hashes(db_path: Path, hashes: list[str]) -> dict[str, int]:
+    """Get rows loaded for every hash that was already loaded, checked with one query."""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(CREATE_ATTACHMENT_LOG)
+        result = conn.execute(
+            """
+            SELECT
+                payload_hash, rows_loaded
+            FROM
+                attachment_log
+            WHERE
+                payload_hash IN (SELECT value FROM json_each(?))
+            """,
+            (json.dumps(hashes),),  # one json param instead of a placeholder per hash
+        )
+        return dict(result.fetchall())
 
-    if not mail_password or not mail_username or not mail_server:
-        raise ValueError("Missing email credentials, add to .env file")
 
+def _log_attachment(conn: sqlite3.Connection, payload_hash: str, filename: str, uid, rows: int) -> None:
+    conn.execute(
+        "INSERT INTO attachment_log (payload_hash, filename, email_id, rows_loaded, loaded_at) VALUES (?,?,?,?,?)",
+        (payload_hash, filename, uid, rows, datetime.now().isoformat(timespec="seconds")),
+    )
+
+
+CREATE_ATTACHMENT_LOG = """
+    CREATE TABLE IF NOT EXISTS attachment_log (
+        payload_hash TEXT,
+        filename TEXT,
+        email_id TEXT,
+        rows_loaded INTEGER,
+        loaded_at TEXT,
+        PRIMARY KEY (payload_hash)
+    )
+    """
+
+
+def _load_from_email(db_path: Path, workers: int | None = None) -> None:
+    """Check the email, clean csv attachments in a process pool and load them into the db."""
+    with _connect() as mailbox:
+        messages = _fetch_new(mailbox, db_path)
+    _load_messages(db_path, messages, workers)
+
+
+def _load_messages(db_path: Path, messages: list, workers: int | None = None) -> None:
+    """Load the csv attachments of new report emails, emails are logged in email_log once loaded."""
     downloads_dir = str(Path("./docs").resolve())
     download_folder = os.path.join(downloads_dir, "downloaded_csvs")
 
@@ -54,51 +140,155 @@ def _load_from_email(db_path: Path) -> None:
         os.makedirs(download_folder)
         print(f"Created csv download folder at {download_folder}")
 
-    with MailBox(mail_server).login(mail_username, mail_password, "INBOX") as mailbox:
-        print("Logged in successfully")
-        for msg in mailbox.fetch(AND(subject="WSU Track")):
-            print("\n---LOADING NEW EMAIL---")
-            print(f"From: {msg.from_}")
-            print(f"Subject: {msg.subject}")
-            print(f"Date: {msg.date}")
-            print(f"Body: {msg.text}")
-
-            # skip adding to db if already added
-            if _check_processed(db_path, msg.uid):
-                print("Email Already Processed, skipping...")
+    # hash every csv attachment up front so already loaded payloads are found in one query
+    hashes = {
+        id(att): hashlib.sha256(att.payload).hexdigest()
+        for msg in messages
+        for att in msg.attachments
+        if att.filename.lower().endswith(".csv")
+    }
+    seen = _seen_hashes(db_path, list(hashes.values()))
+
+    pending: list[_Attachment] = []
+    remaining: dict[str, int] = {}  # uid -> attachments not loaded yet
+    for msg in messages:
+        print("\n---LOADING NEW EMAIL---")
+        print(f"From: {msg.from_}")
+        print(f"Subject: {msg.subject}")
+        print(f"Date: {msg.date}")
+        print(f"Body: {msg.text}")
+
+        remaining[msg.uid] = 0
+        for att in msg.attachments:
+            print(f"Attachment: {att.filename} ({len(att.payload)} bytes)")
+            if not att.filename.lower().endswith(".csv"):
+                continue
+
+            # same csv forwarded or re-sent, rows are already in the db
+            payload_hash = hashes[id(att)]
+            if payload_hash in seen:
+                print(f"Attachment already loaded ({seen[payload_hash]} rows), skipping...")
                 continue
+            seen[payload_hash] = 0  # the same payload may come again later in this sync
+
+            # hash in the name keeps attachments with the same filename apart while cleaning
+            filepath = os.path.join(download_folder, f"{payload_hash[:12]}_{att.filename}")
+            pending.append(_Attachment(msg.uid, att.filename, filepath, att.payload, payload_hash))
+            remaining[msg.uid] += 1
+
+    # emails with nothing left to load are done
+    for uid in [uid for uid, count in remaining.items() if count == 0]:
+        _add_to_uid_db(db_path, uid)
+        del remaining[uid]
+
+    if pending:
+        loaded = _load_attachments(db_path, pending, remaining, workers or PARSE_WORKERS)
+        if loaded:  # every load is committed by now
+            notify_ingest()
+
+
+class _Attachment(NamedTuple):
+    uid: str
+    filename: str
+    filepath: str
+    payload: bytes
+    payload_hash: str
+
+
+def _parse_attachment(filepath: str, payload: bytes) -> tables.InputDataBatch:
+    """Save and clean one attachment, runs in a worker process."""
+    with open(filepath, "wb") as f:
+        f.write(payload)
+    print(f"Saved attachment to {filepath}")
+    return tables.InputDataBatch.from_lists(cleaner.clean_csv(filepath))
+
+
+def _parse_large_attachment(att: _Attachment, workers: int) -> Iterator[tables.InputDataBatch]:
+    """Save and clean one big attachment across every worker, then read the cleaned rows back a batch at a time."""
+    with open(att.filepath, "wb") as f:
+        f.write(att.payload)
+    print(f"Saved attachment to {att.filepath}")
+    cleaned = os.path.join(os.path.dirname(att.filepath), f"cleaned_{os.path.basename(att.filepath)}")
+    cleaner.clean_csv_parallel(att.filepath, cleaned, workers)
+    with open(cleaned, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        while rows := list(itertools.islice(reader, LOAD_BATCH_ROWS)):
+            yield tables.InputDataBatch.from_lists(rows)
+
+
+def _load_attachments(db_path: Path, pending: list[_Attachment], remaining: dict[str, int], workers: int) -> int:
+    """Clean attachments in a process pool and insert the results from this process only.
+
+    Attachments of PARALLEL_CLEAN_BYTES or more are cleaned one at a time, each split
+    across every worker. Smaller ones are cleaned one per worker, at most
+    MAX_IN_FLIGHT_PER_WORKER * workers handed out at once so a big backlog doesn't pile
+    parsed rows up in memory faster than they can be written. An attachment that fails
+    to clean or load is skipped, and its email is not logged so the next sync tries it
+    again. Returns the number of attachments loaded.
+    """
+    loaded = 0
+    large = [att for att in pending if len(att.payload) >= PARALLEL_CLEAN_BYTES]
+    queue = (att for att in pending if len(att.payload) < PARALLEL_CLEAN_BYTES)
+    with sqlite3.connect(db_path) as conn:
+        # one at a time, clean_csv_parallel already keeps every worker busy with its ranges
+        for att in large:
+            loaded += _insert_attachment(conn, att, _parse_large_attachment(att, workers), remaining)
+
+    # spawn, forking the web app's threads into workers is not safe
+    with (
+        ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool,
+        sqlite3.connect(db_path) as conn,
+    ):
+        in_flight: dict[Future, _Attachment] = {}
+        while True:
+            for att in itertools.islice(queue, MAX_IN_FLIGHT_PER_WORKER * workers - len(in_flight)):
+                in_flight[pool.submit(_parse_attachment, att.filepath, att.payload)] = att
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                att = in_flight.pop(future)
+                try:
+                    inputs = future.result()
+                except Exception as e:  # one bad attachment shouldn't stop the rest loading
+                    print(f"failed to clean {att.filename} from email {att.uid}: {e}")
+                    remaining.pop(att.uid, None)  # never marked processed, retried next sync
+                    continue
+                loaded += _insert_attachment(conn, att, [inputs], remaining)
+    return loaded
+
+
+def _insert_attachment(
+    conn: sqlite3.Connection,
+    att: _Attachment,
+    batches: Iterable[tables.InputDataBatch],
+    remaining: dict[str, int],
+) -> bool:
+    """Insert an attachment's rows and log it in one transaction, returns False if it failed and was rolled back."""
+    rows = 0
+    changes = Changes()
+    lookup = RoomLookup(conn)
+    try:
+        for inputs in batches:
+            room_ids = inputs.room_ids(lookup.room_id)
+            conn.executemany(inputs.insert_format, inputs.fact_rows(room_ids))
+            changes.add(room_ids, inputs.date_entered)
+            rows += len(inputs)
+        record_ingest(conn, "email", rows, changes)
+        # logged in the same transaction as the rows so a failed load is retried
+        _log_attachment(conn, att.payload_hash, att.filename, att.uid, rows)
+        if remaining.get(att.uid) == 1:  # last attachment of its email
+            conn.execute("INSERT INTO email_log (email_id) VALUES (?)", (att.uid,))
+        conn.commit()
+    except Exception as e:  # one bad attachment shouldn't stop the rest loading
+        conn.rollback()
+        print(f"failed to load {att.filename} from email {att.uid}: {e}")
+        remaining.pop(att.uid, None)  # never marked processed, retried next sync
+        return False
 
-            for att in msg.attachments:
-                print(f"Attachment: {att.filename} ({len(att.payload)} bytes)")
-                if att.filename.lower().endswith(".csv"):
-                    # add to uid tracker
-                    _add_to_uid_db(db_path, msg.uid)
-                    print(f"Logged email UID {msg.uid} in email_log table")
-
-                    filepath = os.path.join(download_folder, att.filename)
-                    with open(filepath, "wb") as f:
-                        f.write(att.payload)
-                    print(f"Saved attachment to {filepath}")
-
-                    # clean the downloaded csv
-                    cleaner.clean_csv(filepath)
-
-                    # load cleaned csv into the database
-                    clean_data = pathlib.Path(
-                        "./docs/downloaded_csvs/cleaned_VCEA Clubs Access Summary by Location.csv"
-                    )
-                    with (
-                        sqlite3.connect(db_path, detect_types=sqlite3.PARSE_COLNAMES) as conn,
-                        clean_data.open("r", encoding="utf-8") as more_input,
-                    ):
-                        inputs: list[tables.InputData] = []
-                        reader = csv.reader(more_input)
-                        next(reader)
-                        for line in reader:
-                            inputs.append(tables.InputData.from_list(line))
-
-                        conn.executemany(inputs[0].insert_format(), inputs)
-                        insert_query = f"SELECT COUNT(*) FROM {inputs[0].TABLE_NAME}"
-                        count = conn.execute(insert_query).fetchone()
-                        # print first column which is count
-                        print(f"successfully inserted {count[0]} rows")
+    print(f"successfully inserted {rows} rows from {att.filename}")
+    if att.uid in remaining:
+        remaining[att.uid] -= 1
+    return True
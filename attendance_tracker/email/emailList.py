@@ -12,6 +12,10 @@ from smtplib import SMTP
 
 from dotenv import load_dotenv
 
+from attendance_tracker.analytics.columnar import ColumnarSnapshot
+from attendance_tracker.db.ingest_log import data_version
+from attendance_tracker.db.rooms import RoomLookup
+
 
 def configure(db_path: Path) -> None:
     """Set up the dotenv via load_dotenv."""
@@ -143,9 +147,10 @@ def remove_club_temp(db_path: Path, club_name: str) -> None:
 def assign_room_temp(db_path: Path, building: str, room_num: str, club_name: str) -> None:
     """Assign room to club in the room_log table."""
     with sqlite3.connect(db_path) as conn:
+        room_id = RoomLookup(conn).room_id(building, room_num)
         conn.execute(
-            "INSERT INTO room_log (building, room_num, assigned_club) VALUES (?,?,?)",
-            (building, room_num, club_name),
+            "INSERT INTO room_log (room_id, assigned_club) VALUES (?,?)",
+            (room_id, club_name),
         )
     print(f"Assigned room: {building} {room_num} to club: {club_name}")
 
@@ -154,7 +159,7 @@ def remove_room_temp(db_path: Path, building: str, room_num: str) -> None:
     """Remove room assignment from the room_log table."""
     with sqlite3.connect(db_path) as conn:
         conn.execute(
-            "DELETE FROM room_log WHERE building = ? AND room_num = ?",
+            "DELETE FROM room_log WHERE room_id = (SELECT room_id FROM rooms WHERE building = ? AND room_num = ?)",
             (building, room_num),
         )
     print(f"Removed room assignment: {building} {room_num}")
@@ -261,9 +266,9 @@ def send_error_email(db_path: Path) -> None:
     send_email_to_all_admins(db_path, msg)
 
 
-def send_report_email(db_path: Path) -> None:
+def send_report_email(db_path: Path, snapshot: ColumnarSnapshot | None = None) -> None:
     """Send a monthly report email to all admin emails."""
-    monthly_data = get_monthly_room_usage(db_path)
+    monthly_data = get_monthly_room_usage(db_path, snapshot)
     room_usage = monthly_data["room_usage"]
     room_assignments = monthly_data["room_assignments"]
     report_period = monthly_data["period"]
@@ -323,31 +328,26 @@ def send_report_email(db_path: Path) -> None:
     send_email_to_all_admins(db_path, msg)
 
 
-def get_monthly_room_usage(db_path: Path) -> dict:
-    """Get room usage statistics for the past month."""
+def get_monthly_room_usage(db_path: Path, snapshot: ColumnarSnapshot | None = None) -> dict:
+    """Get room usage statistics for the past month, using the columnar snapshot if it is current."""
     one_month_ago = datetime.now() - timedelta(days=30)
     one_month_ago_str = one_month_ago.strftime("%m/%d/%Y")
 
     print(one_month_ago_str)
     print(datetime.now().strftime("%m/%d/%Y"))
     with sqlite3.connect(db_path) as conn:
-        cursor = conn.execute(
-            """
-            SELECT building, room_num, SUM(times_accessed) as total_accesses
-            FROM input_data
-            WHERE date_entered >= ?
-            GROUP BY building, room_num
-            ORDER BY total_accesses DESC
-        """,
-            (one_month_ago_str,),
-        )
-
-        room_usage = cursor.fetchall()
+        if snapshot is not None and snapshot.is_current(data_version(conn)):
+            rooms = {row[0]: row[1:] for row in conn.execute("SELECT room_id, building, room_num FROM rooms")}
+            totals = snapshot.usage(one_month_ago.strftime("%Y-%m-%d"), datetime.now().strftime("%Y-%m-%d"))
+            room_usage = [(*rooms[room_id], total) for room_id, total in sorted(totals, key=lambda i: -i[1])]
+        else:
+            room_usage = _monthly_room_usage_sql(conn, one_month_ago.strftime("%Y-%m-%d"))
         print(room_usage)
         cursor = conn.execute(
             """
-            SELECT rl.building, rl.room_num, rl.assigned_club, cd.club_president
+            SELECT r.building, r.room_num, rl.assigned_club, cd.club_president
             FROM room_log rl
+            JOIN rooms r ON rl.room_id = r.room_id
             LEFT JOIN club_data cd ON rl.assigned_club = cd.club_name
         """
         )
@@ -361,6 +361,20 @@ def get_monthly_room_usage(db_path: Path) -> dict:
     }
 
 
+def _monthly_room_usage_sql(conn: sqlite3.Connection, since: str) -> list[tuple[str, int, int]]:
+    cursor = conn.execute(
+        """
+        SELECT building, room_num, SUM(times_accessed) as total_accesses
+        FROM input_data JOIN rooms USING (room_id)
+        WHERE date_entered >= ?
+        GROUP BY room_id
+        ORDER BY total_accesses DESC
+    """,
+        (since,),
+    )
+    return cursor.fetchall()
+
+
 def check_data_health(db_path: Path) -> list[str]:
     """Check for errors to report."""
     errors = []
@@ -368,7 +382,7 @@ def check_data_health(db_path: Path) -> list[str]:
     with sqlite3.connect(db_path) as conn:
         # check for new data coming in
         ten_days_ago = datetime.now() - timedelta(days=10)
-        ten_days_ago_str = ten_days_ago.strftime("%m/%d/%Y")
+        ten_days_ago_str = ten_days_ago.strftime("%Y-%m-%d")
 
         cursor = conn.execute("SELECT COUNT(*) FROM input_data WHERE date_entered >= ?", (ten_days_ago_str,))
         recent_data_count = cursor.fetchone()[0]
@@ -0,0 +1,81 @@
+"""Long running mailbox watcher that loads report emails as soon as they arrive using IMAP IDLE."""
+
+from __future__ import annotations
+
+import logging
+import random
+import threading
+from pathlib import Path
+from typing import Callable
+
+from imap_tools import (
+    BaseMailBox,  # pyright: ignore[reportPrivateImportUsage] this is a spurious error, still gets the subpackages
+)
+
+from attendance_tracker.email import download_csv
+
+IDLE_TIMEOUT = 5 * 60  # seconds, servers drop idle connections after 30 minutes so re-issue well before
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 5 * 60.0
+
+logger = logging.getLogger(__name__)
+
+
+class IdleWatcher:
+    """Hold an IDLE connection open and load new WSU Track emails whenever the server says mail arrived.
+
+    Uses the same email_log uid bookkeeping as the daily load, so the two can run side by
+    side. Lost connections are retried with exponential backoff. `connect` returns a
+    logged in mailbox, point it at a local IMAP server to test without the real inbox.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        connect: Callable[[], BaseMailBox] = download_csv._connect,
+        idle_timeout: float = IDLE_TIMEOUT,
+        workers: int | None = 1,
+    ):
+        """Set up the watcher, nothing connects until run or start is called."""
+        self.db_path = db_path
+        self.connect = connect
+        self.idle_timeout = idle_timeout
+        self.workers = workers
+        self.stop_event = threading.Event()
+        self.loaded = 0  # emails loaded since start, handy for checking the watcher is alive
+
+    def start(self) -> threading.Thread:
+        """Run the watcher on a daemon thread."""
+        thread = threading.Thread(target=self.run, name="imap-idle", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        """Ask the watcher to exit, takes effect after the current IDLE wait ends."""
+        self.stop_event.set()
+
+    def run(self) -> None:
+        """Watch the mailbox until stopped, reconnecting with backoff whenever the connection drops."""
+        backoff = MIN_BACKOFF
+        while not self.stop_event.is_set():
+            try:
+                with self.connect() as mailbox:
+                    self._sync(mailbox)  # catch up on anything that arrived while disconnected
+                    backoff = MIN_BACKOFF
+                    while not self.stop_event.is_set():
+                        responses = mailbox.idle.wait(timeout=self.idle_timeout)
+                        # EXISTS means the message count changed, anything else is just the timeout
+                        if any(b"EXISTS" in response for response in responses):
+                            self._sync(mailbox)
+            except Exception as e:  # network drops, server restarts, bad logins all get retried
+                delay = backoff * random.uniform(0.5, 1.0)  # jitter so restarted workers don't reconnect together
+                logger.warning("imap idle connection lost: %s, reconnecting in %.1fs", e, delay)
+                self.stop_event.wait(delay)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+
+    def _sync(self, mailbox: BaseMailBox) -> None:
+        messages = download_csv._fetch_new(mailbox, self.db_path)
+        if messages:
+            download_csv._load_messages(self.db_path, messages, self.workers)
+            self.loaded += len(messages)
+            logger.info("imap idle loaded %d new emails, %d since start", len(messages), self.loaded)
@@ -0,0 +1,120 @@
+"""Tests for admission control of analytics queries."""
+
+import threading
+import time
+
+import flask
+import pytest
+
+from attendance_tracker.analytics.admission import AdmissionController, AdmissionRejectedError
+from attendance_tracker.analytics.cache import ResultCache
+from attendance_tracker.controllers import analytics
+
+
+def test_rejected_heavy_query_is_refunded():
+    """A heavy query turned away because every slot is taken doesn't use up the client's budget."""
+    admission = AdmissionController(heavy_cost=100, heavy_slots=1, bucket_size=250, refill_rate=0.001)
+    with admission.admit("a", 100):
+        with pytest.raises(AdmissionRejectedError) as rejected:
+            with admission.admit("b", 200):
+                pass
+        assert rejected.value.retry_after == 5
+    # b's bucket is still full, so a query costing all of it is let in
+    with admission.admit("b", 250):
+        pass
+    stats = admission.stats()
+    assert (stats["rejected_busy"], stats["admitted_heavy"], stats["heavy_running"]) == (1, 2, 0)
+
+
+def test_slot_is_given_back_when_the_query_fails():
+    """A heavy query that raises still frees its slot for the next one."""
+    admission = AdmissionController(heavy_cost=100, heavy_slots=1, bucket_size=1_000, refill_rate=0.001)
+    with pytest.raises(RuntimeError), admission.admit("a", 100):
+        raise RuntimeError
+    with admission.admit("a", 100):
+        pass
+    assert admission.stats()["heavy_running"] == 0
+
+
+def test_empty_bucket_is_rejected_with_retry_hint():
+    """A client over its budget is told how long until enough has refilled."""
+    admission = AdmissionController(heavy_cost=1_000, bucket_size=100, refill_rate=10.0)
+    with admission.admit("a", 100):
+        pass
+    with pytest.raises(AdmissionRejectedError) as rejected:
+        with admission.admit("a", 50):
+            pass
+    assert 1 <= rejected.value.retry_after <= 5
+    assert admission.stats()["rejected_rate"] == 1
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """App with its own admission controller, one heavy slot and no refill to speak of."""
+    app = flask.Flask(__name__)
+    app.admission = AdmissionController(heavy_cost=10, heavy_slots=1, bucket_size=100, refill_rate=0.001)
+    monkeypatch.setattr(analytics, "single_flight", analytics.SingleFlight())
+    return app
+
+
+def _leader(app, cache, release, results):
+    """Start client "a" running a query that blocks until release is set."""
+
+    def run():
+        with app.test_request_context(environ_base={"REMOTE_ADDR": "a"}):
+            results.append(analytics._coalesced(cache, "usage", lambda: release.wait() and "chart", 50))
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    _wait_for(lambda: analytics.single_flight.stats()["in_flight"] == 1)
+    return thread
+
+
+def test_each_caller_is_admitted_before_joining(app):
+    """A client out of budget is turned away itself instead of sharing another client's query."""
+    cache = ResultCache()
+    release = threading.Event()
+    results = []
+    with app.admission.admit("b", 100):
+        pass
+    leader = _leader(app, cache, release, results)
+
+    with app.test_request_context(environ_base={"REMOTE_ADDR": "b"}), pytest.raises(AdmissionRejectedError):
+        analytics._coalesced(cache, "usage", lambda: "not run", 50)
+    assert analytics.single_flight.stats()["coalesced"] == 0
+    release.set()
+    leader.join()
+    assert results == ["chart"]
+
+
+def test_only_the_leader_holds_a_heavy_slot(app):
+    """A heavy query shared by two clients takes one slot and charges both of them."""
+    cache = ResultCache()
+    release = threading.Event()
+    results = []
+    leader = _leader(app, cache, release, results)
+
+    def wait():
+        with app.test_request_context(environ_base={"REMOTE_ADDR": "c"}):
+            results.append(analytics._coalesced(cache, "usage", lambda: "not run", 50))
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    _wait_for(lambda: analytics.single_flight.stats()["coalesced"] == 1)
+    assert app.admission.stats()["heavy_running"] == 1
+    release.set()
+    leader.join()
+    waiter.join()
+
+    assert results == ["chart", "chart"]
+    assert (app.admission.stats()["admitted_heavy"], app.admission.stats()["rejected_busy"]) == (1, 0)
+    with pytest.raises(AdmissionRejectedError):  # c paid 50 of its 100
+        with app.admission.admit("c", 60):
+            pass
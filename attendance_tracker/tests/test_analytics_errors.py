@@ -0,0 +1,66 @@
+"""Tests for how analytics pages and their json endpoints report failed queries."""
+
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.analytics.admission import AdmissionController
+from attendance_tracker.analytics.cache import ResultCache
+from attendance_tracker.analytics.singleflight import SingleFlightFullError
+from attendance_tracker.app import AttendanceTracker
+from attendance_tracker.controllers import analytics
+from attendance_tracker.db.connection import QueryTimeoutError
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Client for an app serving only the analytics blueprint."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    app = AttendanceTracker(__name__, template_folder=str(REPO_ROOT / "attendance_tracker" / "templates"))
+    app.config.update(DATABASE=db_path, ANALYTICS_QUERY_TIMEOUT=5, SECRET_KEY="test")
+    app.result_cache = ResultCache()
+    app.columnar_snapshot = None
+    app.admission = AdmissionController()
+    app.register_blueprint(analytics.ANALYTICS)
+    app.teardown_appcontext(app.close_db)
+    return app.test_client()
+
+
+def _fail_with(monkeypatch, error: Exception) -> None:
+    def fail(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(analytics, "_cached_usage", fail)
+    monkeypatch.setattr(analytics, "_cached_room_activity", fail)
+
+
+@pytest.mark.parametrize("error", [QueryTimeoutError("cancelled"), SingleFlightFullError("usage")])
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/h/analytics/usage/data?start=2025-01-01&end=2025-12-31",
+        "/h/analytics/room-activity/data?location=Dana+215&start=2025-01-01&end=2025-12-31",
+    ],
+)
+def test_json_endpoints_answer_503(client, monkeypatch, error, url):
+    """Pages refetching in the background get an error status and json, not a redirect to the form."""
+    _fail_with(monkeypatch, error)
+    response = client.get(url)
+    assert response.status_code == 503
+    assert "try again" in response.json["error"]
+
+
+def test_form_is_redirected_back_with_a_message(client, monkeypatch):
+    """A form post that times out goes back to the form with the message flashed."""
+    _fail_with(monkeypatch, QueryTimeoutError("cancelled"))
+    response = client.post("/h/analytics/usage", data={"start_date": "2025-01-01", "end_date": "2025-12-31"})
+    assert (response.status_code, response.location) == (302, "/h/analytics/usage")
+    with client.session_transaction() as session:
+        assert session["_flashes"] == [
+            ("message", "Query took too long to run, please narrow your date range and try again")
+        ]
@@ -0,0 +1,70 @@
+"""Tests for moving old input_data rows into archive partitions."""
+
+import sqlite3
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.db import archive
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.db.upload_jobs import insert_rows
+from attendance_tracker.types import tables
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# two old months across two rooms, with dates in both csv formats
+OLD = [
+    [building, room, str(day), str(day), "0", f"{month}/{day}/2020"]
+    for month in (1, 2)
+    for day in range(1, 6)
+    for building, room in [("Dana Hall", "215"), ("Sloan Hall", "242")]
+]
+RECENT = [["Dana Hall", "215", "99", "99", "0", date.today().isoformat()]]
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Db made by init-db with OLD and RECENT loaded."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        insert_rows(conn, RoomLookup(conn), tables.InputDataBatch.from_lists(OLD + RECENT))
+    return db_path
+
+
+def test_old_months_move_in_chunks(db_path, tmp_path):
+    """Every chunk of a month becomes its own partition, recent rows stay and archived ones are still read back."""
+    result = archive.archive_old_rows(db_path, tmp_path / "archive", horizon_days=365, chunk_rows=4)
+
+    assert (result.rows, result.partitions) == (len(OLD), 6)  # 10 rows a month in chunks of 4, 4 and 2
+    with closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("SELECT times_accessed FROM input_data").fetchall() == [(99,)]
+        parts = conn.execute("SELECT month, part, rows_archived FROM archive_manifest ORDER BY month, part")
+        assert parts.fetchall() == [
+            ("2020-01", 1, 4),
+            ("2020-01", 2, 4),
+            ("2020-01", 3, 2),
+            ("2020-02", 1, 4),
+            ("2020-02", 2, 4),
+            ("2020-02", 3, 2),
+        ]
+        assert archive.usage(conn, "2020-01-01", "2020-01-31") == {"Dana 215": 15, "Sloan 242": 15}
+        assert archive.room_activity(conn, "Sloan", 242, "2020-02-04", "2020-02-05") == [
+            (4, "2020-02-04"),
+            (5, "2020-02-05"),
+        ]
+
+
+def test_rows_gone_since_candidates_were_read_are_skipped(db_path, tmp_path):
+    """A chunk whose rows were deleted after the candidates were read writes no partition."""
+    with closing(sqlite3.connect(db_path)) as conn:
+        rowids = [rowid for (rowid,) in conn.execute("SELECT rowid FROM input_data WHERE date_entered < '2020-02'")]
+        with conn:
+            conn.execute("DELETE FROM input_data WHERE date_entered < '2020-02'")
+        assert archive._move_chunk(conn, tmp_path, "2020-01", rowids, "2020-03-01") == 0
+        assert conn.execute("SELECT COUNT(*) FROM archive_manifest").fetchone() == (0,)
+    assert list(tmp_path.glob("*.csv.gz")) == []
@@ -0,0 +1,44 @@
+"""Tests for building fingerprinted static assets."""
+
+import gzip
+import json
+
+import flask
+import pytest
+
+from attendance_tracker import assets
+
+SCRIPT = b"console.log('chart');\n" * 100
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    """Make a static dir with Chart.js already vendored, so nothing is downloaded."""
+    static_dir = tmp_path / "static"
+    (static_dir / "vendor").mkdir(parents=True)
+    (static_dir / assets.CHART_JS_PATH).write_bytes(SCRIPT)
+    (static_dir / "favicon.txt").write_bytes(b"tiny")
+    return static_dir
+
+
+def test_build_writes_hashed_gzip_copies(static_dir):
+    """Files worth compressing get a hashed name and a .gz next to them, nothing else does."""
+    manifest = assets.build_assets(static_dir, css=False)
+
+    hashed = static_dir / manifest[assets.CHART_JS_PATH]
+    assert hashed.read_bytes() == SCRIPT
+    assert gzip.decompress(hashed.with_name(f"{hashed.name}.gz").read_bytes()) == SCRIPT
+    assert not (static_dir / f"{manifest['favicon.txt']}.gz").exists()  # too small to be worth it
+    assert not list(static_dir.rglob("*.br"))  # nginx only has gzip_static
+    assert json.loads((static_dir / "dist" / "manifest.json").read_text()) == manifest
+    assert assets.build_assets(static_dir, css=False) == manifest  # same contents, same names
+
+
+def test_chart_js_falls_back_to_cdn_until_vendored(static_dir):
+    """Pages load the pinned CDN build when build-assets hasn't downloaded Chart.js yet."""
+    app = flask.Flask(__name__, static_folder=str(static_dir))
+    src = assets.chart_js_src(static_dir)
+    with app.test_request_context():
+        assert src() == f"/static/{assets.CHART_JS_PATH}"
+        (static_dir / assets.CHART_JS_PATH).unlink()
+        assert src() == assets.CHART_JS_URL
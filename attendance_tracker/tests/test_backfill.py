@@ -0,0 +1,73 @@
+"""Tests for bulk loading a directory of archived reports."""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.db import backfill
+from attendance_tracker.types import tables
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _raw(day: str, room: int) -> str:
+    return (
+        f'"Dana Hall Room {room} Number of Patron","Total Number Passed 3","Total Number Failed 1",'
+        f'"Total Number of Transaction 4","{day}"\n'
+    )
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Db made by init-db."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    return db_path
+
+
+@pytest.fixture
+def reports(tmp_path):
+    """Dir with a raw report, an already cleaned csv, an empty csv and a file that isn't a csv."""
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    (reports / "a_raw.csv").write_text("Report,header\n\n" + _raw("1/5/2025", 215) + _raw("1/5/2025", 216))
+    (reports / "b_cleaned.csv").write_text(",".join(tables.InputData._fields) + "\nSloan,242,2,2,0,2025-01-06\n")
+    (reports / "c_empty.csv").write_text("")
+    (reports / "notes.txt").write_text(_raw("1/7/2025", 215))
+    return reports
+
+
+def _checkpoints(db_path: Path) -> list[tuple]:
+    with closing(sqlite3.connect(db_path)) as conn:
+        return conn.execute("SELECT path, rows_inserted, rows_duplicate FROM backfill_log ORDER BY path").fetchall()
+
+
+def test_files_are_loaded_and_checkpointed(db_path, reports):
+    """Raw and cleaned csvs are both loaded, each with a checkpoint row."""
+    files = backfill.find_files(str(reports))
+    assert [path.name for path in files] == ["a_raw.csv", "b_cleaned.csv", "c_empty.csv"]
+
+    stats = backfill.backfill(db_path, files, workers=2)
+    assert (stats.files_loaded, stats.files_skipped, stats.files_failed, stats.rows_inserted) == (3, 0, 0, 3)
+    assert _checkpoints(db_path) == [
+        (str(reports.resolve() / "a_raw.csv"), 2, 0),
+        (str(reports.resolve() / "b_cleaned.csv"), 1, 0),
+        (str(reports.resolve() / "c_empty.csv"), 0, 0),
+    ]
+
+
+def test_rerun_only_loads_new_or_changed_files(db_path, reports):
+    """Checkpointed files are skipped, a file that changed since is loaded again with its old rows as duplicates."""
+    files = backfill.find_files(str(reports))
+    backfill.backfill(db_path, files, workers=1)
+    with (reports / "a_raw.csv").open("a") as f:
+        f.write(_raw("1/8/2025", 215))
+
+    stats = backfill.backfill(db_path, files, workers=1)
+    assert (stats.files_loaded, stats.files_skipped, stats.rows_inserted, stats.rows_duplicate) == (1, 2, 1, 2)
+    assert _checkpoints(db_path)[0] == (str(reports.resolve() / "a_raw.csv"), 1, 2)
+    assert backfill.backfill(db_path, files, workers=1).files_skipped == 3
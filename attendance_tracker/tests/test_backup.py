@@ -0,0 +1,84 @@
+"""Tests for online backups and restoring them."""
+
+import gzip
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import pytest
+
+from attendance_tracker.db import backup
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Db in WAL mode with some rows in it."""
+    db_path = tmp_path / "attendance_tracker.db"
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("CREATE TABLE input_data (room_id INTEGER, times_accessed INTEGER, date_entered TEXT)")
+        conn.executemany(
+            "INSERT INTO input_data VALUES (?,?,?)", [(i % 7, i, f"2025-01-{i % 28 + 1:02d}") for i in range(5_000)]
+        )
+        conn.commit()
+    return db_path
+
+
+def _rows(db_path):
+    with closing(sqlite3.connect(db_path)) as conn:
+        return conn.execute("SELECT * FROM input_data ORDER BY rowid").fetchall()
+
+
+def test_backup_restore_round_trip(db_path, tmp_path):
+    """A db restored from a backup has the same rows, and the run is logged as done."""
+    result = backup.backup(db_path, tmp_path / "backups", pages=8, sleep=0)
+    assert result.path.exists()
+    assert result.backup_bytes < result.db_bytes
+
+    restored = tmp_path / "restored.db"
+    backup.restore(result.path, restored)
+    assert _rows(restored) == _rows(db_path)
+    with closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("SELECT status, path FROM backup_log").fetchall() == [("done", str(result.path))]
+
+
+def test_restore_keeps_an_existing_db_without_force(db_path, tmp_path):
+    """Restoring over a db that already has data needs force, then replaces it."""
+    result = backup.backup(db_path, tmp_path / "backups", sleep=0)
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("DELETE FROM input_data")
+        conn.commit()
+
+    with pytest.raises(ValueError, match="already exists"):
+        backup.restore(result.path, db_path)
+    assert _rows(db_path) == []
+    backup.restore(result.path, db_path, force=True)
+    assert len(_rows(db_path)) == 5_000
+
+
+def test_restore_rejects_a_corrupt_backup(db_path, tmp_path):
+    """A backup that isn't a readable db is refused before the target is touched."""
+    bad = tmp_path / "bad.db.gz"
+    bad.write_bytes(gzip.compress(b"not a db" * 1_000))
+    with pytest.raises(ValueError):
+        backup.restore(bad, tmp_path / "restored.db")
+    assert not (tmp_path / "restored.db").exists()
+
+
+def test_backups_in_the_same_second_get_their_own_files(db_path, tmp_path, monkeypatch):
+    """Two backups started in the same second don't overwrite each other."""
+    frozen = datetime(2026, 10, 19, 2, 0, 0)
+    monkeypatch.setattr(backup, "datetime", type("FrozenDatetime", (datetime,), {"now": staticmethod(lambda: frozen)}))
+    first = backup.backup(db_path, tmp_path / "backups", sleep=0)
+    second = backup.backup(db_path, tmp_path / "backups", sleep=0)
+    assert first.path != second.path
+    assert sorted((tmp_path / "backups").iterdir()) == [first.path, second.path]
+
+
+def test_restored_backup_logs_itself_done(db_path, tmp_path):
+    """The backup_log row copied into a backup says done, not running."""
+    result = backup.backup(db_path, tmp_path / "backups", sleep=0)
+    restored = tmp_path / "restored.db"
+    backup.restore(result.path, restored)
+    with closing(sqlite3.connect(restored)) as conn:
+        assert conn.execute("SELECT status, path FROM backup_log").fetchall() == [("done", str(result.path))]
@@ -0,0 +1,87 @@
+"""Tests for bulk importing clubs and room assignments."""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.db import bulk_import
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+CLUBS = """club_name,club_president,club_email,club_size,club_advisor,club_advisor_email
+Chess Club,Ana Ruiz,chess@wsu.edu,10,Dr. Lee,lee@wsu.edu
+
+Robotics Club,Sam Kim,robots@wsu.edu,many,Dr. Fox,fox@wsu.edu
+Robotics Club,Sam Kim,robots@wsu.edu,25,Dr. Fox,fox@wsu.edu
+Chess Club,Someone Else,chess@wsu.edu,10,Dr. Lee,lee@wsu.edu
+"""
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """Db made by init-db."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    with closing(sqlite3.connect(db_path)) as conn:
+        yield conn
+
+
+@pytest.fixture
+def result(conn, tmp_path):
+    """Import CLUBS from a csv saved by excel, with a byte order mark."""
+    clubs_csv = tmp_path / "clubs.csv"
+    clubs_csv.write_text(CLUBS, encoding="utf-8-sig")
+    return bulk_import.import_clubs(conn, bulk_import.read_csv(clubs_csv))
+
+
+def test_bad_and_repeated_clubs_are_reported(conn, result):
+    """Rows that don't parse are rejected, a club repeated with other details keeps its first row."""
+    assert result.summary() == "4 rows read, 2 inserted, 0 updated, 0 unchanged, 1 conflicts, 1 rejected"
+    assert result.error_messages[0].startswith("line 4: ")
+    assert result.conflict_messages == ["line 6: Chess Club appears earlier in the file with other details"]
+    assert conn.execute("SELECT club_name, club_president, club_size FROM club_data ORDER BY 1").fetchall() == [
+        ("Chess Club", "Ana Ruiz", 10),
+        ("Robotics Club", "Sam Kim", 25),
+    ]
+
+
+@pytest.mark.usefixtures("result")
+def test_changed_clubs_are_only_updated_with_overwrite(conn):
+    """A club already in the db with other details is a conflict, applied only when overwrite is set."""
+    rows = [["Chess Club", "Ana Ruiz", "chess@wsu.edu", "12", "Dr. Lee", "lee@wsu.edu"]]
+    skipped = bulk_import.import_clubs(conn, rows)
+    assert (skipped.updated, skipped.conflicts) == (0, 1)
+    assert conn.execute("SELECT club_size FROM club_data WHERE club_name = 'Chess Club'").fetchone() == (10,)
+
+    applied = bulk_import.import_clubs(conn, rows, overwrite=True)
+    assert (applied.updated, applied.conflicts) == (1, 1)
+    assert conn.execute("SELECT club_size FROM club_data WHERE club_name = 'Chess Club'").fetchone() == (12,)
+    assert bulk_import.import_clubs(conn, rows).unchanged == 1
+
+
+@pytest.mark.usefixtures("result")
+def test_room_assignments(conn):
+    """Rooms are resolved through building aliases, unknown clubs are rejected and taken rooms are conflicts."""
+    result = bulk_import.import_room_assignments(
+        conn,
+        [
+            ["building", "room_num", "assigned_club"],
+            ["Dana Hall", "215", "Chess Club"],
+            ["Dana", "215", "Robotics Club"],
+            ["Sloan", "242", "Knitting Club"],
+            ["Sloan Hall", "242", "Robotics Club"],
+        ],
+    )
+    assert (result.inserted, result.rejected, result.conflicts) == (2, 1, 1)
+    assert result.conflict_messages == ["line 3: Dana 215 is given to Chess Club earlier in the file"]
+    assert result.error_messages == ["line 4: unknown club Knitting Club"]
+
+    moved = bulk_import.import_room_assignments(conn, [["Dana", "215", "Robotics Club"]], overwrite=True)
+    assert moved.conflict_messages == ["line 1: Dana 215 is already assigned to Chess Club"]
+    assert conn.execute(
+        "SELECT building, room_num, assigned_club FROM room_log JOIN rooms USING (room_id) ORDER BY 1"
+    ).fetchall() == [("Dana", 215, "Robotics Club"), ("Sloan", 242, "Robotics Club")]
@@ -0,0 +1,52 @@
+"""Tests for zero filled room activity series."""
+
+import sqlite3
+from datetime import date
+
+import pytest
+
+from attendance_tracker.db import calendar, rooms
+from attendance_tracker.types.tables import iso_date
+
+# the same room's rows in every date format found in csvs, input_data stores them as ISO
+ROWS = [(1, "2025-01-04"), (2, "01/05/2025"), (4, "1/6/2025"), (8, "1/07/2025"), (16, "12/31/2024")]
+
+
+@pytest.fixture
+def conn():
+    """In memory db with the calendar filled for a few weeks and one room's rows."""
+    conn = sqlite3.connect(":memory:")
+    for statement in rooms.CREATE_ROOM_TABLES:
+        conn.execute(statement)
+    conn.execute(rooms.CREATE_INPUT_DATA)
+    calendar.fill(conn, date(2024, 12, 1), date(2025, 2, 28))
+    room_id = conn.execute("INSERT INTO rooms (building, room_num) VALUES ('Dana', 215)").lastrowid
+    conn.executemany(
+        "INSERT INTO input_data VALUES (?,?,0,0,?)",
+        [(room_id, accesses, iso_date(day)) for accesses, day in ROWS],
+    )
+    yield conn
+    conn.close()
+
+
+def test_room_activity_matches_every_date_format(conn):
+    """Rows that came in as ISO, padded or unpadded US dates all land on their day."""
+    days = calendar.room_activity(conn, "Dana", 215, "2024-12-31", "2025-01-08")
+    assert [accesses for accesses, _ in days] == [16, 0, 0, 0, 1, 2, 4, 8, 0]
+    assert days[0][1] == "2024-12-31"
+
+
+def test_room_activity_agrees_with_series(conn):
+    """The sql series and one built from rows read elsewhere group the same rows the same way."""
+    for group in calendar.GROUPS:
+        expected = calendar.series(conn, ROWS, "2024-12-01", "2025-02-28", group)
+        assert calendar.room_activity(conn, "Dana", 215, "2024-12-01", "2025-02-28", group) == expected
+
+
+def test_unknown_room_is_all_zeros(conn):
+    """A room never seen gives zeros for every day instead of nothing."""
+    assert calendar.room_activity(conn, "Sloan", 1, "2025-01-01", "2025-01-03") == [
+        (0, "2025-01-01"),
+        (0, "2025-01-02"),
+        (0, "2025-01-03"),
+    ]
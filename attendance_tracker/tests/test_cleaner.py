@@ -0,0 +1,56 @@
+"""Tests for cleaning raw WSU Track csvs."""
+
+import csv
+import itertools
+
+import pytest
+
+from attendance_tracker.email import cleaner
+
+ROWS = [
+    f'"{building} Room {room} Number of Patron","Total Number Passed {n}","Total Number Failed 1",'
+    f'"Total Number of Transaction {n + 1}","1/{n % 28 + 1}/2025"'
+    for n in range(40)
+    for building, room in [("Dana Hall", 215), ("Sloan", "242A")]
+]
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    """Raw report with a title, blank lines and other rows between the patron records."""
+    raw_csv = tmp_path / "report.csv"
+    lines = ["VCEA Clubs Access Summary by Location", ""]
+    for i, row in enumerate(ROWS):
+        lines.append(row)
+        if i % 7 == 0:
+            lines.extend(["", '"Subtotal","80"'])
+    raw_csv.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return raw_csv
+
+
+def _read(path) -> list[list[str]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_ranges_cover_the_file_and_end_on_newlines(raw_csv):
+    """Ranges follow on from each other and never split a line."""
+    data = raw_csv.read_bytes()
+    ranges = cleaner.split_ranges(raw_csv, chunk_bytes=100)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(data)
+    assert all(end == start for (_, end), (start, _) in itertools.pairwise(ranges))
+    assert all(data[end - 1 : end] == b"\n" for _, end in ranges)
+
+
+def test_parallel_matches_serial(raw_csv, tmp_path):
+    """Splitting the file across workers writes the same rows in the same order as clean_csv."""
+    serial = cleaner.clean_csv(raw_csv, tmp_path / "serial.csv")
+    entries = cleaner.clean_csv_parallel(raw_csv, tmp_path / "parallel.csv", workers=2, chunk_bytes=200)
+
+    assert entries == len(serial) == len(ROWS)
+    assert _read(tmp_path / "parallel.csv") == _read(tmp_path / "serial.csv")
+    assert _read(tmp_path / "parallel.csv")[1:3] == [
+        ["Dana", "215", "1", "0", "1", "1/1/2025"],
+        ["Sloan", "242A", "1", "0", "1", "1/1/2025"],
+    ]
@@ -0,0 +1,94 @@
+"""Tests for the columnar analytics engine against the sql backend."""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.analytics.columnar import ColumnarSnapshot
+from attendance_tracker.controllers.analytics import _room_activity_result, _usage_result
+from attendance_tracker.db.connection import connect_read_only
+from attendance_tracker.db.ingest_log import record_ingest
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.db.upload_jobs import insert_rows
+from attendance_tracker.types import tables
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# dates in both formats csvs use, totals per room differ so usage order is the same on both backends
+LINES = [
+    ["Dana Hall", "215", "3", "3", "0", "2025-01-04"],
+    ["Dana Hall", "215", "5", "4", "1", "1/5/2025"],
+    ["Dana Hall", "215", "7", "7", "0", "01/06/2025"],
+    ["Sloan Hall", "242", "2", "2", "0", "1/5/2025"],
+    ["Sloan Hall", "242", "1", "1", "0", "2025-01-07"],
+    ["Todd Hall", "130", "40", "40", "0", "12/31/2024"],
+]
+
+
+def _load(db_path: Path, lines: list[list[str]], source: str) -> None:
+    """Insert csv lines the way uploads do."""
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        inserted, _ = insert_rows(conn, RoomLookup(conn), tables.InputDataBatch.from_lists(lines))
+        record_ingest(conn, source, inserted)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Db made by init-db with LINES loaded."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    _load(db_path, LINES, "test")
+    return db_path
+
+
+def _assert_backends_agree(db_path: Path, snapshot: ColumnarSnapshot) -> None:
+    with closing(connect_read_only(db_path)) as conn:
+        for start, end in [("2024-12-01", "2025-01-31"), ("2025-01-05", "2025-01-06"), ("2025-02-01", "2025-02-28")]:
+            for descending in (True, False):
+                assert _usage_result(conn, start, end, descending, snapshot) == _usage_result(
+                    conn, start, end, descending
+                )
+            for building, room in [("Dana", 215), ("Sloan", 242)]:
+                assert _room_activity_result(conn, building, room, start, end, snapshot) == _room_activity_result(
+                    conn, building, room, start, end
+                )
+
+
+def test_backends_agree_on_mixed_date_formats(db_path, tmp_path):
+    """Rows loaded with ISO and US dates are counted on the same days by sql and columnar queries."""
+    snapshot = ColumnarSnapshot(tmp_path / "columnar")
+    assert snapshot.refresh(db_path) == len(LINES)
+    with closing(connect_read_only(db_path)) as conn:
+        chart = _usage_result(conn, "2025-01-05", "2025-01-06", True)
+    assert chart["data"]["datasets"][0]["data"] == [12, 2]
+    _assert_backends_agree(db_path, snapshot)
+
+
+def test_refresh_appends_to_column_files(db_path, tmp_path):
+    """Rows loaded after a refresh are written onto the end of the same column files."""
+    snapshot = ColumnarSnapshot(tmp_path / "columnar")
+    snapshot.refresh(db_path)
+    column = tmp_path / "columnar" / "accessed.col"
+    inode = column.stat().st_ino
+    _load(db_path, [["Sloan Hall", "242", "30", "30", "0", "1/6/2025"]], "more")
+
+    assert snapshot.refresh(db_path) == 1
+    assert column.stat().st_ino == inode
+    assert column.stat().st_size == (len(LINES) + 1) * 8
+    _assert_backends_agree(db_path, snapshot)
+
+
+def test_refresh_rebuilds_after_delete(db_path, tmp_path):
+    """Rows removed below the last exported rowid make the next refresh start over."""
+    snapshot = ColumnarSnapshot(tmp_path / "columnar")
+    snapshot.refresh(db_path)
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute("DELETE FROM input_data WHERE date_entered = '2024-12-31'")
+        record_ingest(conn, "delete", 0)
+
+    assert snapshot.refresh(db_path) == len(LINES) - 1
+    _assert_backends_agree(db_path, snapshot)
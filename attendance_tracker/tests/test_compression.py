@@ -0,0 +1,81 @@
+"""Tests for the response compression middleware."""
+
+import gzip
+
+import flask
+import pytest
+
+from attendance_tracker import compression
+from attendance_tracker.compression import CompressionMiddleware
+
+BIG = "attendance " * 100
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Client for an app with big, small, streamed and event stream responses behind the middleware."""
+    monkeypatch.setattr(compression, "brotli", None)  # gzip whether or not brotli is installed
+    app = flask.Flask(__name__)
+
+    @app.get("/big")
+    def big():
+        response = flask.jsonify(text=BIG)
+        response.set_etag("abc")
+        return response
+
+    @app.get("/small")
+    def small():
+        return flask.jsonify(text="hi")
+
+    @app.get("/csv")
+    def csv():
+        return flask.Response((f"{i},{BIG}\n" for i in range(3)), mimetype="text/csv")
+
+    @app.get("/events")
+    def events():
+        return flask.Response((f"data: {BIG}\n\n" for _ in range(2)), mimetype="text/event-stream")
+
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=500)  # type: ignore
+    return app.test_client()
+
+
+def test_big_response_is_gzipped(client):
+    """Content-Length goes, Vary is added and a strong ETag becomes weak."""
+    response = client.get("/big", headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["ETag"] == 'W/"abc"'
+    assert "Content-Length" not in response.headers
+    assert flask.json.loads(gzip.decompress(response.data)) == {"text": BIG}
+
+
+def test_small_or_unaccepted_responses_are_sent_as_is(client):
+    """Bodies under min_size and clients that don't accept gzip get the plain body."""
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+    assert small.headers["Content-Length"] == str(len(small.data))
+
+    refused = client.get("/big", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in refused.headers
+    assert refused.json == {"text": BIG}
+
+
+def test_streams_are_compressed_but_event_streams_are_not(client):
+    """A streamed csv download is compressed as it goes, events are left alone so none are held back."""
+    csv = client.get("/csv", headers={"Accept-Encoding": "gzip"})
+    assert csv.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(csv.data).decode() == "".join(f"{i},{BIG}\n" for i in range(3))
+
+    events = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in events.headers
+    assert events.data.decode() == f"data: {BIG}\n\n" * 2
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected"),
+    [("", None), ("*", "gzip"), ("br;q=1, gzip;q=0.5", "gzip"), ("identity, gzip;q=bad", None)],
+)
+def test_pick_encoding(monkeypatch, accept_encoding, expected):
+    """Without brotli installed only gzip is offered, a q of 0 or one that doesn't parse turns it down."""
+    monkeypatch.setattr(compression, "brotli", None)
+    assert CompressionMiddleware(None).pick_encoding(accept_encoding) == expected
@@ -0,0 +1,48 @@
+"""Tests for the read only analytics connection."""
+
+import sqlite3
+import time
+
+import pytest
+
+from attendance_tracker.db.connection import QueryTimeoutError, ReadOnlyCursor, connect_read_only
+
+ENDLESS = "WITH RECURSIVE r(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM r) SELECT COUNT(*) FROM r"
+SHORT = "WITH RECURSIVE r(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM r WHERE x < 100000) SELECT COUNT(*) FROM r"
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """Read only connection with a short deadline on an empty db."""
+    db_path = tmp_path / "ro.db"
+    sqlite3.connect(db_path).close()
+    conn = connect_read_only(db_path, query_timeout=0.2)
+    yield conn
+    conn.close()
+
+
+def test_execute_is_cancelled(conn):
+    """Connection.execute stops a runaway query at the deadline."""
+    with pytest.raises(QueryTimeoutError):
+        conn.execute(ENDLESS).fetchall()
+
+
+def test_cursor_execute_is_cancelled(conn):
+    """Statements run through a cursor get a deadline too instead of running forever."""
+    cursor = conn.cursor()
+    assert isinstance(cursor, ReadOnlyCursor)
+    with pytest.raises(QueryTimeoutError):
+        cursor.execute(ENDLESS).fetchall()
+
+
+def test_cursor_execute_gets_a_fresh_deadline(conn):
+    """An old statement's expired deadline doesn't cancel the next statement run on a cursor."""
+    conn.execute("SELECT 1").fetchall()
+    time.sleep(0.3)  # past the first statement's deadline
+    assert conn.cursor().execute(SHORT).fetchall() == [(100000,)]
+
+
+def test_writes_are_rejected(conn):
+    """Connection refuses writes."""
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("CREATE TABLE t (x)")
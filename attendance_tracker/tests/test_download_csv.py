@@ -0,0 +1,91 @@
+"""Tests for loading csv attachments of report emails."""
+
+import sqlite3
+import types
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.db.upload_jobs import insert_rows
+from attendance_tracker.email import download_csv
+from attendance_tracker.types import tables
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+REPORT = "VCEA Clubs Access Summary by Location.csv"
+
+
+def _attachment(day: str, room: int = 215, filename: str = REPORT) -> types.SimpleNamespace:
+    """Csv attachment shaped like the WSU Track export, with one row for `room` on `day`."""
+    payload = (
+        "Report,header\n\n"
+        f'"Dana Hall Room {room} Number of Patron","Total Number Passed 3","Total Number Failed 1",'
+        f'"Total Number of Transaction 4","{day}"\n'
+    ).encode()
+    return types.SimpleNamespace(filename=filename, payload=payload)
+
+
+def _email(uid: str, *attachments: types.SimpleNamespace) -> types.SimpleNamespace:
+    return types.SimpleNamespace(uid=uid, from_="", subject="WSU Track", date="", text="", attachments=attachments)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Fresh db, with the working dir moved so downloaded csvs land in tmp_path."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    monkeypatch.chdir(tmp_path)
+    return db_path
+
+
+def _query(db_path: Path, sql: str) -> list[tuple]:
+    with closing(sqlite3.connect(db_path)) as conn:
+        return conn.execute(sql).fetchall()
+
+
+def test_same_payload_is_loaded_once(db_path):
+    """A csv forwarded in a second email, in the same sync or a later one, is skipped but its email is logged."""
+    download_csv._load_messages(
+        db_path,
+        [_email("1", _attachment("1/5/2025")), _email("2", _attachment("1/5/2025", filename="forwarded.csv"))],
+        workers=1,
+    )
+    download_csv._load_messages(db_path, [_email("3", _attachment("1/5/2025"))], workers=1)
+
+    assert _query(db_path, "SELECT email_id FROM email_log ORDER BY email_id") == [("1",), ("2",), ("3",)]
+    assert _query(db_path, "SELECT email_id, rows_loaded FROM attachment_log") == [("1", 1)]
+    assert _query(db_path, "SELECT date_entered, times_accessed FROM input_data") == [("2025-01-05", 4)]
+
+
+def test_failed_attachment_leaves_its_email_to_retry(db_path):
+    """Attachments cleaned across workers load on their own, one that fails doesn't stop the others."""
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        lines = [["Dana Hall", "217", "1", "1", "0", "1/6/2025"]]
+        insert_rows(conn, RoomLookup(conn), tables.InputDataBatch.from_lists(lines))
+
+    download_csv._load_messages(
+        db_path,
+        [
+            _email("1", _attachment("1/5/2025", 215), _attachment("1/5/2025", 216, "second.csv")),
+            _email("2", _attachment("1/6/2025", 217)),  # already in the db, the insert fails
+            _email("3", _attachment("1/7/2025", 215)),
+        ],
+        workers=2,
+    )
+
+    assert _query(db_path, "SELECT email_id FROM email_log ORDER BY email_id") == [("1",), ("3",)]
+    assert _query(db_path, "SELECT email_id, COUNT(*) FROM attachment_log GROUP BY 1 ORDER BY 1") == [
+        ("1", 2),
+        ("3", 1),
+    ]
+    assert _query(
+        db_path, "SELECT room_num, date_entered FROM input_data JOIN rooms USING (room_id) ORDER BY 1, 2"
+    ) == [
+        (215, "2025-01-05"),
+        (215, "2025-01-07"),
+        (216, "2025-01-05"),
+        (217, "2025-01-06"),
+    ]
@@ -0,0 +1,93 @@
+"""Tests for exporting input_data rows added since the last export."""
+
+import csv
+import sqlite3
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.db import export
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.db.upload_jobs import insert_rows
+from attendance_tracker.types import tables
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _lines(days: range) -> list[list[str]]:
+    return [["Dana Hall", "215", str(day), str(day), "0", f"2020-01-{day:02d}"] for day in days]
+
+
+def _load(db_path: Path, lines: list[list[str]]) -> None:
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        insert_rows(conn, RoomLookup(conn), tables.InputDataBatch.from_lists(lines))
+
+
+def _exported_days(result: export.ExportResult) -> list[str]:
+    return [row["date_entered"][-2:] for row in csv.DictReader(export.read_chunks(result.chunks))]
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Db made by init-db with five days loaded, exports are written two rows a chunk."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    monkeypatch.setattr(export, "CHUNK_ROWS", 2)
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    _load(db_path, _lines(range(1, 6)))
+    return db_path
+
+
+def test_only_new_rows_are_exported(db_path, tmp_path):
+    """The second export starts after the watermark left by the first."""
+    first = export.export_new_rows(db_path, tmp_path / "export")
+    assert (first.rows, len(first.chunks)) == (5, 3)
+    assert _exported_days(first) == ["01", "02", "03", "04", "05"]
+
+    _load(db_path, _lines(range(6, 8)))
+    second = export.export_new_rows(db_path, tmp_path / "export")
+    assert (second.export_id, second.rows) == (first.export_id + 1, 2)
+    assert _exported_days(second) == ["06", "07"]
+    assert export.export_new_rows(db_path, tmp_path / "export").rows == 0
+
+
+def test_interrupted_export_resumes_after_its_last_chunk(db_path, tmp_path):
+    """An export left running picks up from its watermark and keeps the chunks it already wrote."""
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute(export.CREATE_EXPORT_LOG)
+        conn.execute(
+            """
+            INSERT INTO export_log
+                (started_at, from_rowid, to_rowid, watermark, rows_exported, chunks, rows_purged, status)
+            VALUES ('2020-02-01T00:00:00', 0, 2, 2, 2, 1, 0, 'running')
+            """
+        )
+    (tmp_path / "export").mkdir()
+    export._write_chunk(export._chunk_path(tmp_path / "export", 1, 1), [("Dana", 215, 1, 1, 0, "2020-01-01")] * 2)
+
+    result = export.export_new_rows(db_path, tmp_path / "export")
+    assert (result.export_id, result.rows, len(result.chunks)) == (1, 3, 3)
+    with closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("SELECT rows_exported, chunks, status FROM export_log").fetchall() == [(5, 3, "done")]
+
+
+def test_purge_pulls_the_watermark_down(db_path, tmp_path):
+    """Purged rows are gone and rows loaded after the purge are still exported."""
+    result = export.export_new_rows(db_path, tmp_path / "export", retain_days=0)
+    assert result.purged == 5
+    with closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM input_data").fetchone() == (0,)
+
+    _load(db_path, _lines(range(9, 10)))
+    assert _exported_days(export.export_new_rows(db_path, tmp_path / "export")) == ["09"]
+
+
+def test_purge_keeps_rows_inside_the_retention_period(db_path, tmp_path):
+    """Only exported rows dated before the retention period are deleted."""
+    _load(db_path, [["Sloan Hall", "242", "1", "1", "0", date.today().isoformat()]])
+    assert export.export_new_rows(db_path, tmp_path / "export", retain_days=30).purged == 5
+    with closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("SELECT date_entered FROM input_data").fetchall() == [(date.today().isoformat(),)]
@@ -0,0 +1,112 @@
+"""Tests for the IMAP IDLE mailbox watcher."""
+
+import logging
+import re
+import sqlite3
+import types
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.email import idle_watch
+from attendance_tracker.email.idle_watch import IdleWatcher
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+REPORT = "VCEA Clubs Access Summary by Location.csv"
+
+
+def _email(uid: str, day: str) -> types.SimpleNamespace:
+    """Report email with one csv attachment shaped like the WSU Track export."""
+    payload = (
+        "Report,header\n\n"
+        f'"Dana Hall Room 215 Number of Patron","Total Number Passed 3","Total Number Failed 1",'
+        f'"Total Number of Transaction 4","{day}"\n'
+    ).encode()
+    attachment = types.SimpleNamespace(filename=REPORT, payload=payload)
+    return types.SimpleNamespace(uid=uid, from_="", subject="WSU Track", date="", text="", attachments=[attachment])
+
+
+class FakeMailbox:
+    """Mailbox that plays back a list of IDLE events, a new email or a dropped connection."""
+
+    def __init__(self, emails: list, events: list, fetched: list):
+        """Serve `emails`, `events` are handed out one per IDLE wait."""
+        self.emails = emails
+        self.events = events
+        self.fetched = fetched
+        self.idle = types.SimpleNamespace(wait=self._wait)
+
+    def __enter__(self):
+        """Be the mailbox, like a logged in imap_tools mailbox."""
+        return self
+
+    def __exit__(self, *exc):
+        """Let exceptions through to the watcher."""
+        return False
+
+    def uids(self, criteria):
+        """Get every email's uid, the watcher filters out logged ones itself."""
+        return [email.uid for email in self.emails]
+
+    def fetch(self, criteria):
+        """Get the emails with the uids asked for, remembering which those were."""
+        uids = re.search(r"UID ([^)]+)\)", str(criteria)).group(1).split(",")
+        self.fetched.append(uids)
+        return [email for email in self.emails if email.uid in uids]
+
+    def _wait(self, timeout):
+        return self.events.pop(0)()
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Fresh db, with the working dir moved so downloaded csvs land in tmp_path."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    monkeypatch.chdir(tmp_path)
+    return db_path
+
+
+def test_loads_new_emails_and_reconnects_after_backoff(db_path, monkeypatch, caplog):
+    """EXISTS loads the new email, a dropped connection is retried and already logged emails are skipped."""
+    monkeypatch.setattr(idle_watch, "MIN_BACKOFF", 0.01)
+    emails = [_email("1", "1/5/2025")]
+    fetched: list = []
+    connects = []
+
+    def arrive():
+        emails.append(_email("2", "1/6/2025"))
+        return [b"* 2 EXISTS"]
+
+    def drop():
+        emails.append(_email("3", "1/7/2025"))  # arrives while disconnected
+        raise ConnectionResetError("server went away")
+
+    def stop():
+        watcher.stop()
+        return []
+
+    sessions = [[arrive, drop], [stop]]
+
+    def connect():
+        connects.append(len(connects))
+        return FakeMailbox(emails, sessions.pop(0), fetched)
+
+    watcher = IdleWatcher(db_path, connect=connect, idle_timeout=0.01, workers=1)
+    with caplog.at_level(logging.INFO, logger=idle_watch.__name__):
+        watcher.run()
+
+    assert len(connects) == 2
+    assert fetched == [["1"], ["2"], ["3"]]  # each email downloaded once, across the reconnect too
+    assert watcher.loaded == 3
+    with closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("SELECT email_id FROM email_log ORDER BY email_id").fetchall() == [("1",), ("2",), ("3",)]
+        assert conn.execute("SELECT date_entered, times_accessed FROM input_data ORDER BY 1").fetchall() == [
+            ("2025-01-05", 4),
+            ("2025-01-06", 4),
+            ("2025-01-07", 4),
+        ]
+    assert any("connection lost: server went away" in record.getMessage() for record in caplog.records)
@@ -0,0 +1,25 @@
+"""Tests for data versions on dbs made before ingest_log existed."""
+
+import sqlite3
+from contextlib import closing
+
+from attendance_tracker.db.connection import connect_read_only
+from attendance_tracker.db.ingest_log import Changes, data_version, record_ingest
+
+
+def test_version_without_ingest_log(tmp_path):
+    """A db without ingest_log reads as version 0 instead of failing, even on a read only connection."""
+    db_path = tmp_path / "old.db"
+    sqlite3.connect(db_path).close()
+    with closing(connect_read_only(db_path)) as conn:
+        assert data_version(conn) == 0
+
+
+def test_first_load_creates_ingest_log(tmp_path):
+    """Recording a load on an old db creates ingest_log, starting from a time based version."""
+    with closing(sqlite3.connect(tmp_path / "old.db")) as conn:
+        version = record_ingest(conn, "upload", 3, Changes.of([1], ["2024-03-01"]))
+        conn.commit()
+        assert data_version(conn) == version
+        assert version > 1_000_000_000_000  # ms since epoch, not 1
+        assert record_ingest(conn, "upload", 1) == version + 1
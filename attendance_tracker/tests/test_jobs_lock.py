@@ -0,0 +1,30 @@
+"""Tests for keeping offline migrations and restore off a db that background jobs are using."""
+
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from attendance_tracker.db import jobs_lock, migrations
+
+
+def test_exclusive_refused_while_jobs_hold_the_lock(tmp_path):
+    """Commands needing the db to themselves fail fast while a web server holds the shared lock."""
+    db_path = tmp_path / "attendance_tracker.db"
+    with jobs_lock.hold_shared(db_path):
+        with pytest.raises(jobs_lock.JobsRunningError):
+            with jobs_lock.exclusive(db_path):
+                pass
+    with jobs_lock.exclusive(db_path):  # free again once the jobs process lets go
+        pass
+
+
+def test_migrate_refused_while_jobs_hold_the_lock(tmp_path):
+    """Migrate doesn't rename input_data while background jobs could be loading rows into it."""
+    db_path = tmp_path / "attendance_tracker.db"
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("CREATE TABLE input_data (building TEXT, room_num INTEGER, date_entered TEXT)")
+    with jobs_lock.hold_shared(db_path), pytest.raises(jobs_lock.JobsRunningError):
+        migrations.migrate(db_path)
+    with closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'input_data_old'").fetchone() is None
@@ -0,0 +1,85 @@
+"""Tests for the feed of data changed events sent to open analytics pages."""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.analytics.live import Change, ChangeFeed, FeedFullError
+from attendance_tracker.db.ingest_log import Changes, record_ingest
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.db.upload_jobs import insert_rows
+from attendance_tracker.types import tables
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Db made by init-db."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    return db_path
+
+
+def _load(db_path: Path, lines: list[list[str]], track_changes: bool = True) -> int:
+    """Insert csv lines and log the load, returns the new data version."""
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        changes = Changes() if track_changes else None
+        inserted, _ = insert_rows(conn, RoomLookup(conn), tables.InputDataBatch.from_lists(lines), changes)
+        return record_ingest(conn, "test", inserted, changes)
+
+
+def test_subscribers_see_the_rooms_and_days_a_load_touched(db_path):
+    """A poked feed hands waiting pages each new load, one without recorded changes could be any room."""
+    feed = ChangeFeed(db_path, poll_seconds=60)
+    subscription = feed.subscribe()
+    base = feed.latest()
+
+    first = _load(
+        db_path,
+        [["Dana Hall", "215", "3", "3", "0", "1/5/2025"], ["Sloan Hall", "242", "1", "1", "0", "2025-01-07"]],
+    )
+    second = _load(db_path, [["Dana Hall", "215", "2", "2", "0", "2025-01-08"]], track_changes=False)
+    feed.poke()
+    while feed.latest() < second:  # the first poll may have run between the two loads
+        feed.changes_after(feed.latest(), timeout=5)
+
+    changes = feed.changes_after(base, timeout=0)
+    assert changes == [
+        Change(first, ["Dana 215", "Sloan 242"], "2025-01-05", "2025-01-07"),
+        Change(second, None, None, None),
+    ]
+    assert changes[0].as_event() == (
+        f'id: {first}\nevent: data-changed\ndata: {{"rooms":["Dana 215","Sloan 242"],'
+        f'"start":"2025-01-05","end":"2025-01-07"}}\n\n'
+    )
+    assert feed.changes_after(second, timeout=0.01) == []
+    subscription.close()
+
+
+def test_page_from_before_the_feed_started_refetches_everything(db_path):
+    """A page reconnecting with a version the feed never saw is told to refetch every room."""
+    loaded = _load(db_path, [["Dana Hall", "215", "3", "3", "0", "2025-01-05"]])
+    feed = ChangeFeed(db_path, poll_seconds=60)
+    subscription = feed.subscribe()
+
+    assert feed.changes_after(loaded - 1, timeout=5) == [Change(loaded, None, None, None)]
+    assert feed.changes_after(loaded, timeout=0.01) == []
+    subscription.close()
+
+
+def test_subscriber_slots_are_limited(db_path):
+    """Pages past max_subscribers are turned away until one closes, closing twice gives back one slot."""
+    feed = ChangeFeed(db_path, poll_seconds=60, max_subscribers=1)
+    subscription = feed.subscribe()
+    with pytest.raises(FeedFullError):
+        feed.subscribe()
+
+    subscription.close()
+    subscription.close()
+    feed.subscribe().close()
+    assert feed._subscribers == 0
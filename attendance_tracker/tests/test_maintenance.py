@@ -0,0 +1,64 @@
+"""Tests for the nightly db maintenance run."""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.db import maintenance
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.db.upload_jobs import insert_rows
+from attendance_tracker.types import tables
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Db made by init-db, with enough rows loaded and then deleted to leave free pages behind."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    lines = [
+        ["Dana Hall", str(room), "1", "1", "0", f"2025-01-{day:02d}"] for room in range(500) for day in range(1, 29)
+    ]
+    with closing(sqlite3.connect(db_path)) as conn:
+        with conn:
+            insert_rows(conn, RoomLookup(conn), tables.InputDataBatch.from_lists(lines))
+        with conn:
+            conn.execute("DELETE FROM input_data")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # so the free pages are in the db file
+    return db_path
+
+
+def test_free_pages_are_handed_back(db_path):
+    """Every step runs, the freelist is emptied, the file shrinks and the run is logged."""
+    result = maintenance.run(db_path, vacuum_pages=64)
+
+    assert [step["step"] for step in result.steps] == ["analyze", "optimize", "incremental_vacuum", "wal_checkpoint"]
+    assert not any("error" in step for step in result.steps)
+    assert result.freelist_before > 0
+    assert result.freelist_after == 0
+    assert result.bytes_after < result.bytes_before
+    with closing(sqlite3.connect(db_path)) as conn:
+        (run,) = maintenance.recent(conn)
+    assert (run["status"], run["freelist_before"], run["freelist_after"]) == ("done", result.freelist_before, 0)
+    assert run["steps"][2]["detail"].endswith(" pages")  # nothing left for next time
+
+
+def test_vacuum_stops_at_the_budget(db_path):
+    """With no time left the vacuum step frees nothing and says what it left for next time."""
+    result = maintenance.run(db_path, budget_seconds=0)
+    assert result.freelist_after > 0
+    assert result.steps[2]["detail"] == f"freed 0 pages, {result.freelist_after} left for next time"
+
+
+def test_only_one_run_at_a_time(db_path):
+    """Asking for a run while one is going raises instead of queueing a second."""
+    with maintenance._running:
+        with pytest.raises(maintenance.MaintenanceRunningError):
+            maintenance.run(db_path)
+        with pytest.raises(maintenance.MaintenanceRunningError):
+            maintenance.run_in_background(db_path, 60, maintenance.VACUUM_PAGES)
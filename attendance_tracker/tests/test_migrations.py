@@ -0,0 +1,181 @@
+"""Tests for bringing a db made by the first schema up to date with flask migrate."""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.db import calendar, jobs_lock, migrations
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# sqlite/init.sql as first committed, before room ids and every table added since
+BASELINE_SCHEMA = """
+    CREATE TABLE club_data (
+        club_name TEXT,
+        club_president TEXT,
+        club_email TEXT,
+        club_size INTEGER,
+        club_advisor TEXT,
+        club_advisor_email TEXT,
+        PRIMARY KEY (club_name)
+    );
+    CREATE TABLE input_data (
+        building TEXT,
+        room_num INTEGER,
+        times_accessed INTEGER,
+        access_succeed INTEGER,
+        access_fail INTEGER,
+        date_entered TEXT,
+        PRIMARY KEY (building, room_num, date_entered)
+    );
+    CREATE TABLE room_log (
+        building TEXT,
+        room_num INTEGER,
+        assigned_club TEXT,
+        PRIMARY KEY (building, room_num),
+        FOREIGN KEY (assigned_club) REFERENCES CLUB_DATA (club_name)
+    );
+    CREATE TABLE auth (
+        username TEXT,
+        password_ TEXT,
+        PRIMARY KEY (username)
+    );
+    CREATE TABLE email_log(
+        email_id Text,
+        PRIMARY KEY (email_id)
+    );
+    CREATE TABLE admin_emails(
+        admin_email Text,
+        permanent Boolean,
+        PRIMARY KEY (admin_email)
+    );
+    """
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """Db on the first schema, with "Dana" and "Dana Hall" rows that become the same room."""
+    db_path = tmp_path / "attendance_tracker.db"
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+        conn.executemany(
+            "INSERT INTO input_data VALUES (?,?,?,?,?,?)",
+            [("Dana Hall", 215, 3, 2, 1, f"2025-01-{day:02d}") for day in range(1, 31)]
+            + [("Dana", 215, 4, 4, 0, "2025-01-05"), ("Sloan Hall", 242, 7, 6, 1, "2025-01-05")],
+        )
+        conn.execute("INSERT INTO room_log VALUES ('Dana Hall', 215, 'Chess Club')")
+        conn.commit()
+    return db_path
+
+
+def _schema(db_path: Path) -> dict:
+    """Every table's columns, keys and indexes, leaving out how the CREATE statements were written."""
+    with closing(sqlite3.connect(db_path)) as conn:
+        tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        schema: dict = {
+            "auto_vacuum": conn.execute("PRAGMA auto_vacuum").fetchone(),
+            "journal_mode": conn.execute("PRAGMA journal_mode").fetchone(),
+        }
+        for table in tables:
+            indexes = {
+                name: (unique, conn.execute(f"PRAGMA index_info({name})").fetchall())
+                for _, name, unique, _, _ in conn.execute(f"PRAGMA index_list({table})")
+                if not name.startswith("sqlite_autoindex")  # named after the table, so after a rename too
+            }
+            schema[table] = (
+                conn.execute(f"PRAGMA table_xinfo({table})").fetchall(),
+                conn.execute(f"PRAGMA foreign_key_list({table})").fetchall(),
+                indexes,
+            )
+        return schema
+
+
+def test_migrated_baseline_matches_init_db(baseline_db, tmp_path, monkeypatch):
+    """A migrated db ends up with the same tables, columns and indexes as one made by init-db."""
+    migrations.migrate(baseline_db, chunk_rows=7)
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    fresh_db = tmp_path / "fresh.db"
+    _init_db(fresh_db)
+    assert _schema(baseline_db) == _schema(fresh_db)
+
+
+def test_migrated_baseline_keeps_rows(baseline_db):
+    """Rows are copied over to room ids, with aliases of the same room summed, and nothing is left pending."""
+    migrations.migrate(baseline_db, chunk_rows=7)
+    with closing(sqlite3.connect(baseline_db)) as conn:
+        assert migrations.pending(conn) == []
+        rows = conn.execute(
+            """
+            SELECT r.building, r.room_num, SUM(i.times_accessed), COUNT(*)
+            FROM input_data i JOIN rooms r USING (room_id)
+            GROUP BY r.room_id ORDER BY r.building
+            """
+        ).fetchall()
+        assert rows == [("Dana", 215, 3 * 30 + 4, 30), ("Sloan", 242, 7, 1)]
+        # 3 + 4 for Dana, 7 for Sloan
+        assert conn.execute("SELECT times_accessed FROM input_data WHERE date_entered = '2025-01-05'").fetchall() == [
+            (7,),
+            (7,),
+        ]
+        assert conn.execute(
+            "SELECT r.building, r.room_num, l.assigned_club FROM room_log l JOIN rooms r USING (room_id)"
+        ).fetchall() == [("Dana", 215, "Chess Club")]
+        assert calendar.room_activity(conn, "Dana", 215, "2025-01-04", "2025-01-06") == [
+            (3, "2025-01-04"),
+            (7, "2025-01-05"),
+            (3, "2025-01-06"),
+        ]
+
+
+def test_room_id_backfill_resumes_after_interruption(baseline_db, monkeypatch):
+    """A backfill cut off part way keeps its committed chunks and carries on from them next run."""
+    pauses = []
+
+    def interrupt_second_pause(seconds):
+        pauses.append(seconds)
+        if len(pauses) == 2:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(migrations.time, "sleep", interrupt_second_pause)
+    with pytest.raises(KeyboardInterrupt):
+        migrations.migrate(baseline_db, chunk_rows=7, pause=0.01)
+    with closing(sqlite3.connect(baseline_db)) as conn:
+        assert conn.execute("SELECT backfill_rowid FROM schema_version WHERE version = 1").fetchone() == (14,)
+        assert conn.execute("SELECT COUNT(*) FROM input_data").fetchone() == (14,)
+
+    migrations.migrate(baseline_db, chunk_rows=7)
+    with closing(sqlite3.connect(baseline_db)) as conn:
+        assert conn.execute("SELECT COUNT(*), SUM(times_accessed) FROM input_data").fetchone() == (31, 3 * 30 + 4 + 7)
+        leftovers = conn.execute("SELECT name FROM sqlite_master WHERE name IN ('input_data_old', 'room_map')")
+        assert leftovers.fetchall() == []
+
+
+def test_us_dates_are_stored_as_iso(baseline_db):
+    """Rows loaded with M/D/YYYY dates are rewritten as ISO, a day loaded in both formats keeps the ISO row."""
+    with closing(sqlite3.connect(baseline_db)) as conn, conn:
+        conn.executemany(
+            "INSERT INTO input_data VALUES (?,?,?,?,?,?)",
+            [("Sloan Hall", 242, 5, 5, 0, "1/6/2025"), ("Sloan Hall", 242, 9, 9, 0, "01/05/2025")],
+        )
+    migrations.migrate(baseline_db, chunk_rows=7)
+    with closing(sqlite3.connect(baseline_db)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM input_data WHERE instr(date_entered, '/')").fetchone() == (0,)
+        assert calendar.room_activity(conn, "Sloan", 242, "2025-01-05", "2025-01-06") == [
+            (7, "2025-01-05"),
+            (5, "2025-01-06"),
+        ]
+
+
+def test_only_offline_migrations_need_background_jobs_stopped(baseline_db):
+    """Migrations that don't rewrite tables run while the app holds the jobs lock, the rest are refused."""
+    migrations.migrate(baseline_db, 6)
+    with jobs_lock.hold_shared(baseline_db):
+        assert [migration.version for migration in migrations.migrate(baseline_db)] == [7, 8]
+
+        with closing(sqlite3.connect(baseline_db)) as conn, conn:
+            conn.execute("DELETE FROM schema_version WHERE version = 4")  # VACUUMs the whole db
+        with pytest.raises(jobs_lock.JobsRunningError):
+            migrations.migrate(baseline_db)
@@ -0,0 +1,66 @@
+"""Tests for resolving building and room numbers to room ids."""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.db.upload_jobs import insert_rows
+from attendance_tracker.types import tables
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """Db made by init-db, building aliases are seeded and there are no rooms yet."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    with closing(sqlite3.connect(db_path)) as conn:
+        yield conn
+
+
+def test_aliases_resolve_to_one_room(conn):
+    """Building aliases in any case and padded room numbers get the id of the same room."""
+    lookup = RoomLookup(conn)
+    room_id = lookup.room_id("Dana Hall", "215")
+    assert lookup.room_id("dana", 215) == room_id
+    assert lookup.room_id(" Dana ", " 215 ") == room_id
+    assert lookup.room_id("Dana", "215A") != room_id
+    assert conn.execute("SELECT building, room_num FROM rooms ORDER BY room_id").fetchall() == [
+        ("Dana", 215),
+        ("Dana", "215A"),
+    ]
+
+
+def test_new_rooms_are_seen_by_later_lookups(conn):
+    """Rooms added while loading keep their ids once committed, unknown rooms are not added by find."""
+    with conn:
+        added = RoomLookup(conn).room_id("Sloan Hall", 242)
+
+    lookup = RoomLookup(conn)
+    assert lookup.find("Sloan", "242") == added
+    assert lookup.find("Todd Hall", 130) is None
+    assert conn.execute("SELECT COUNT(*) FROM rooms").fetchone() == (1,)
+
+
+def test_same_room_and_day_under_two_aliases_is_a_duplicate(conn):
+    """Rows for one room on one day are only loaded once whichever alias or date format they use."""
+    lines = [
+        ["Dana Hall", "215", "3", "3", "0", "2025-01-05"],
+        ["Dana", "215", "4", "4", "0", "1/5/2025"],
+        ["Sloan Hall", "242", "1", "1", "0", "1/5/2025"],
+    ]
+    with conn:
+        inserted, duplicates = insert_rows(conn, RoomLookup(conn), tables.InputDataBatch.from_lists(lines))
+
+    assert inserted == 2
+    assert duplicates == ["duplicate record for Dana 215 on 2025-01-05"]
+    assert conn.execute("SELECT room_id, times_accessed FROM input_data ORDER BY room_id").fetchall() == [
+        (1, 3),
+        (2, 1),
+    ]
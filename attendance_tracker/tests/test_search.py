@@ -0,0 +1,74 @@
+"""Tests for full text search and keyset pagination of clubs and admin emails."""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.db import search
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """Db made by init-db with rooms in two buildings assigned to clubs."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    with closing(sqlite3.connect(db_path)) as conn:
+        for room_id, (building, room_num) in enumerate([("Dana", n) for n in range(100, 105)] + [("Sloan", 242)], 1):
+            conn.execute(
+                "INSERT INTO rooms (room_id, building, room_num) VALUES (?,?,?)", (room_id, building, room_num)
+            )
+            conn.execute(
+                "INSERT INTO room_log VALUES (?,?)", (room_id, "Robotics Club" if room_id % 2 else "Chess Club")
+            )
+        conn.execute("INSERT INTO club_data VALUES ('Chess Club', 'Ana Ruiz', '', 10, '', '')")
+        conn.commit()
+        yield conn
+
+
+def _all_pages(search_fn, conn, text, limit):
+    pages = [search_fn(conn, text, None, limit)]
+    while pages[-1].next_cursor:
+        pages.append(search_fn(conn, text, pages[-1].next_cursor, limit))
+    return pages
+
+
+def test_club_pages_follow_on_without_gaps(conn):
+    """Walking the cursors visits every match once, in building and room order."""
+    pages = _all_pages(search.search_clubs, conn, "robot", 2)
+    assert [len(page.results) for page in pages] == [2, 1]
+    assert [(r["building"], r["room_num"]) for page in pages for r in page.results] == [
+        ("Dana", 100),
+        ("Dana", 102),
+        ("Dana", 104),
+    ]
+    # triggers keep the index in step with the president added after the rooms were assigned
+    assert [r["room_num"] for r in search.search_clubs(conn, "ana").results] == [101, 103, 242]
+
+
+def test_admin_emails_match_after_rowids_change(conn):
+    """Emails are found by their own key, so admin_emails rowids changing, as VACUUM may do, breaks nothing."""
+    conn.executemany("INSERT INTO admin_emails VALUES (?, 0)", [(f"admin{i}@wsu.edu",) for i in range(6)])
+    conn.execute("DELETE FROM admin_emails WHERE admin_email IN ('admin0@wsu.edu', 'admin2@wsu.edu')")
+    conn.execute("UPDATE admin_emails SET rowid = rowid + 100")
+    conn.commit()
+
+    pages = _all_pages(search.search_admin_emails, conn, "wsu", 3)
+    assert [r["email"] for page in pages for r in page.results] == [
+        "admin1@wsu.edu",
+        "admin3@wsu.edu",
+        "admin4@wsu.edu",
+        "admin5@wsu.edu",
+    ]
+    assert [r["email"] for r in search.search_admin_emails(conn, "admin4").results] == ["admin4@wsu.edu"]
+
+
+def test_tampered_cursor_is_rejected(conn):
+    """A cursor that doesn't decode to a sort key raises ValueError instead of running a query."""
+    with pytest.raises(ValueError, match="bad cursor"):
+        search.search_clubs(conn, "", search.encode_cursor(["Dana"]))
@@ -0,0 +1,67 @@
+"""Tests for coalescing identical analytics queries."""
+
+import threading
+import time
+
+import pytest
+
+from attendance_tracker.analytics.singleflight import SingleFlight, SingleFlightFullError
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_waiters_get_the_leaders_error():
+    """Callers coalesced onto a computation that fails see the same exception, and the key is free again."""
+    flight = SingleFlight()
+    release = threading.Event()
+    error = ValueError("query failed")
+
+    def compute():
+        release.wait()
+        raise error
+
+    seen = []
+
+    def call(compute):
+        try:
+            flight.do("usage", compute)
+        except ValueError as e:
+            seen.append(e)
+
+    leader = threading.Thread(target=call, args=(compute,))
+    leader.start()
+    _wait_for(lambda: flight.stats()["in_flight"] == 1)
+    waiter = threading.Thread(target=call, args=(lambda: "not run",))
+    waiter.start()
+    _wait_for(lambda: flight.stats()["coalesced"] == 1)
+    release.set()
+    leader.join()
+    waiter.join()
+
+    assert seen == [error, error]
+    assert flight.stats()["in_flight"] == 0
+    assert flight.do("usage", lambda: "ran") == "ran"  # a failure isn't cached
+
+
+def test_waiters_past_the_cap_are_rejected():
+    """Once max_waiters callers wait on a key the next one is turned away instead of piling up."""
+    flight = SingleFlight(max_waiters=1)
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=("usage", release.wait))
+    leader.start()
+    _wait_for(lambda: flight.stats()["in_flight"] == 1)
+    waiter = threading.Thread(target=flight.do, args=("usage", release.wait))
+    waiter.start()
+    _wait_for(lambda: flight.stats()["coalesced"] == 1)
+
+    with pytest.raises(SingleFlightFullError):
+        flight.do("usage", release.wait)
+    release.set()
+    leader.join()
+    waiter.join()
+    assert flight.stats()["rejected"] == 1
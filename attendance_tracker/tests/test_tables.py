@@ -0,0 +1,59 @@
+"""Tests for the column oriented InputData batch."""
+
+import sqlite3
+
+import pytest
+
+from attendance_tracker.db import rooms
+from attendance_tracker.types import tables
+
+LINES = [
+    ["Dana Hall", "215", "3", "2", "1", "1/5/2025"],
+    ["Sloan Hall", "242", "7", "7", "0", "2025-01-05"],
+    ["Dana Hall", "215", "4", "4", "0", "01/06/2025"],
+]
+
+
+def test_batch_keeps_rows_and_stores_iso_dates():
+    """Rows read back match the csv lines, with every date in the form input_data stores."""
+    batch = tables.InputDataBatch.from_lists(LINES)
+    assert list(batch) == [
+        tables.InputData("Dana Hall", "215", 3, 2, 1, "2025-01-05"),
+        tables.InputData("Sloan Hall", "242", 7, 7, 0, "2025-01-05"),
+        tables.InputData("Dana Hall", "215", 4, 4, 0, "2025-01-06"),
+    ]
+    assert batch[1] == tables.InputData("Sloan Hall", "242", 7, 7, 0, "2025-01-05")
+    assert batch.date_entered[0] is batch.date_entered[1]  # equal strs are shared, not one per row
+
+
+def test_bad_line_adds_nothing_or_is_reported():
+    """A bad count leaves the batch as it was, or with `errors` only the bad line is dropped."""
+    batch = tables.InputDataBatch.from_lists(LINES[:1])
+    with pytest.raises(ValueError):
+        batch.extend_columns(*zip(*[LINES[1], ["Dana Hall", "215", "x", "0", "0", "1/7/2025"]], strict=True))
+    assert len(batch) == 1 and len(batch.times_accessed) == 1
+
+    errors: list[str] = []
+    batch = tables.InputDataBatch.from_lists(
+        [*LINES, ["Dana Hall", "215", "1", "1", "0", "31/31/2025"], ["short"]], errors
+    )
+    assert len(batch) == len(LINES)
+    assert len(errors) == 2
+
+
+def test_fact_rows_insert_with_the_shared_statement():
+    """Rows resolved to room ids go in with the same insert str InputFact uses."""
+    conn = sqlite3.connect(":memory:")
+    for statement in rooms.CREATE_ROOM_TABLES:
+        conn.execute(statement)
+    conn.execute(rooms.CREATE_INPUT_DATA)
+    batch = tables.InputDataBatch.from_lists(LINES)
+    room_ids = batch.room_ids(rooms.RoomLookup(conn).room_id)
+
+    assert batch.insert_format is tables.InputFact(*next(batch.fact_rows(room_ids))).insert_format
+    conn.executemany(batch.insert_format, batch.fact_rows(room_ids))
+    assert conn.execute("SELECT room_id, times_accessed, date_entered FROM input_data ORDER BY rowid").fetchall() == [
+        (1, 3, "2025-01-05"),
+        (2, 7, "2025-01-05"),
+        (1, 4, "2025-01-06"),
+    ]
@@ -0,0 +1,97 @@
+"""Tests for loading uploaded csvs in background jobs."""
+
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.db import upload_jobs
+from attendance_tracker.types import tables
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+HEADER = ",".join(tables.InputData._fields)
+LINES = [f"Dana Hall,215,{day},{day},0,2025-01-{day:02d}" for day in range(1, 6)]
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Db made by init-db, jobs load two rows a batch."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    monkeypatch.setattr(upload_jobs, "BATCH_ROWS", 2)
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    return db_path
+
+
+def _submit(db_path: Path, spool_dir: Path, lines: list[str]) -> tuple[str, Path]:
+    job_id, spool_path = upload_jobs.new_job(spool_dir)
+    spool_path.write_text("\n".join([HEADER, *lines]) + "\n", encoding="utf-8")
+    upload_jobs.check_header(spool_path)
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        upload_jobs.submit(conn, job_id, "upload.csv", spool_path)
+    return job_id, spool_path
+
+
+def _status(db_path: Path, job_id: str) -> dict:
+    with closing(sqlite3.connect(db_path)) as conn:
+        return upload_jobs.status(conn, job_id)
+
+
+def test_queued_upload_is_loaded(db_path, tmp_path):
+    """Good rows go in, bad and duplicate rows are counted with a message each, and the spool file is removed."""
+    job_id, spool_path = _submit(db_path, tmp_path / "spool", [*LINES, "Dana Hall,215,x", LINES[0]])
+
+    assert upload_jobs.run_pending(db_path) == 1
+    job = _status(db_path, job_id)
+    assert (job["status"], job["rows_read"], job["rows_inserted"], job["rows_rejected"]) == ("done", 7, 5, 2)
+    assert job["bytes_read"] == job["bytes_total"]
+    assert len(job["errors"]) == 2
+    assert job["errors"][0].startswith("bad record")
+    assert job["errors"][1] == "duplicate record for Dana Hall 215 on 2025-01-01"
+    assert not spool_path.exists()
+    with closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("SELECT SUM(times_accessed) FROM input_data").fetchone() == (15,)
+    assert upload_jobs.run_pending(db_path) == 0
+
+
+def test_stale_job_resumes_from_its_last_batch(db_path, tmp_path):
+    """A job whose worker died carries on after the bytes it committed instead of starting over."""
+    job_id, spool_path = _submit(db_path, tmp_path / "spool", LINES)
+    committed = len(f"{HEADER}\n{LINES[0]}\n{LINES[1]}\n".encode())
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute(
+            """
+            UPDATE upload_jobs SET
+                status = 'running', bytes_read = ?, rows_read = 2, rows_inserted = 2, heartbeat = ?,
+                started_at = '2025-01-01T00:00:00'
+            WHERE
+                job_id = ?
+            """,
+            (committed, time.time() - upload_jobs.STALE_AFTER - 1, job_id),
+        )
+
+    assert upload_jobs.run_pending(db_path) == 1
+    job = _status(db_path, job_id)
+    assert (job["status"], job["rows_read"], job["rows_inserted"], job["rows_rejected"]) == ("done", 5, 5, 0)
+    with closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("SELECT SUM(times_accessed) FROM input_data").fetchone() == (12,)  # days 3 to 5
+
+
+def test_live_job_is_left_alone(db_path, tmp_path):
+    """A running job with a fresh heartbeat belongs to another worker and isn't claimed."""
+    job_id, _ = _submit(db_path, tmp_path / "spool", LINES)
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute("UPDATE upload_jobs SET status = 'running', heartbeat = ? WHERE job_id = ?", (time.time(), job_id))
+    assert upload_jobs.run_pending(db_path) == 0
+
+
+def test_wrong_header_is_rejected(tmp_path):
+    """Csvs without the input data columns are turned away before a job is queued."""
+    spool_path = tmp_path / "upload.csv"
+    spool_path.write_text("building,room\nDana Hall,215\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="mismatched columns"):
+        upload_jobs.check_header(spool_path)
@@ -0,0 +1,67 @@
+"""Tests for warming the analytics cache after a load."""
+
+import sqlite3
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from attendance_tracker import _init_db
+from attendance_tracker.analytics.cache import ResultCache
+from attendance_tracker.controllers import analytics
+from attendance_tracker.db import ingest_log
+from attendance_tracker.db.connection import connect_read_only
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.db.upload_jobs import insert_rows
+from attendance_tracker.types import tables
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+LINES = [
+    ["Dana Hall", "215", "3", "3", "0", date.today().isoformat()],
+    ["Sloan Hall", "242", "5", "5", "0", date.today().isoformat()],
+]
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Db made by init-db with rows in two rooms loaded today."""
+    monkeypatch.chdir(REPO_ROOT)  # init-db reads sqlite/init.sql from the working directory
+    db_path = tmp_path / "attendance_tracker.db"
+    _init_db(db_path)
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        inserted, _ = insert_rows(conn, RoomLookup(conn), tables.InputDataBatch.from_lists(LINES))
+        ingest_log.record_ingest(conn, "test", inserted)
+    return db_path
+
+
+def test_every_preset_is_cached(db_path):
+    """Usage in both orders and each room's activity are cached for every duration preset."""
+    cache = ResultCache()
+    warmed = analytics.warm_cache(db_path, cache, query_timeout=5, max_workers=2)
+
+    assert warmed == len(analytics.DURATION_PRESETS) * (2 + 2)
+    with closing(connect_read_only(db_path)) as conn:
+        version = ingest_log.data_version(conn)
+    misses = cache.stats()["misses"]
+    for d, unit in analytics.DURATION_PRESETS:
+        start, end = analytics._resolve_range(f"{d} {unit}", "", "")
+        usage = cache.get(cache.make_key("usage", start, end, True, version))
+        assert usage["data"]["datasets"][0]["data"] == [5, 3]
+        assert cache.get(cache.make_key("room_activity", "Dana", 215, start, end, "day", version)) is not None
+    assert cache.stats()["misses"] == misses
+
+
+def test_broken_hook_does_not_stop_the_rest(monkeypatch):
+    """A hook that raises is reported and the hooks after it still run."""
+    monkeypatch.setattr(ingest_log, "_ingest_hooks", [])
+    ran = []
+
+    def broken():
+        raise RuntimeError("boom")
+
+    ingest_log.on_ingest(broken)
+    ingest_log.on_ingest(lambda: ran.append("warm"))
+    ingest_log.notify_ingest()
+    assert ran == ["warm"]
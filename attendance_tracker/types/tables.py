@@ -1,6 +1,28 @@
 """Define tuple types representing sqlite tables."""
 
-from typing import ClassVar, NamedTuple, Self
+import sys
+from array import array
+from datetime import date, datetime
+from typing import Callable, ClassVar, Iterable, Iterator, NamedTuple, Self
+
+# uploads use the first, cleaned email csvs the second, input_data only stores the first
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y")
+
+
+def parse_date(date_entered: str) -> date:
+    """Parse a date_entered str in any of the formats found in csvs, archives and dbs not migrated yet."""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_entered.strip(), fmt).date()
+        except ValueError:
+            continue
+    msg = f"unrecognized date {date_entered}"
+    raise ValueError(msg)
+
+
+def iso_date(date_entered: str) -> str:
+    """Get a date_entered str in the YYYY-MM-DD form input_data stores, so date ranges compare as strs."""
+    return parse_date(date_entered).isoformat()
 
 
 class Table(NamedTuple):
@@ -48,8 +70,6 @@ class ClubData(NamedTuple):
 class InputData(NamedTuple):
     """Raw CSV input data straight from the source."""
 
-    TABLE_NAME = "INPUT_DATA"
-
     building: str
     room_num: str
     times_accessed: int
@@ -57,10 +77,15 @@ class InputData(NamedTuple):
     access_fail: int
     date_entered: str
 
-    def insert_format(self) -> str:
-        """Create insert string to be used with sqlite db."""
-        cols = ", ".join(self._fields)
-        return f"INSERT INTO {self.TABLE_NAME} ({cols}) VALUES (?,?,?,?,?,?)"
+    def to_fact(self, room_id: int) -> "InputFact":
+        """Swap building/room for its room_id so the row can be inserted into input_data."""
+        return InputFact(
+            room_id,
+            self.times_accessed,
+            self.access_succeed,
+            self.access_fail,
+            iso_date(self.date_entered),
+        )
 
     @classmethod
     def from_list(cls, csv_line: list[str]) -> Self:
@@ -80,8 +105,157 @@ class InputData(NamedTuple):
                 raise ValueError(msg)
 
 
+class InputFact(NamedTuple):
+    """Input data table instance, rooms are referenced by id from the rooms table."""
+
+    TABLE_NAME = "INPUT_DATA"
+
+    room_id: int
+    times_accessed: int
+    access_succeed: int
+    access_fail: int
+    date_entered: str
+
+    @property
+    def insert_format(self) -> str:
+        """Create insert string to be used with sqlite db, one shared str so the statement cache hits."""
+        return INSERT_INPUT_FACT
+
+
+INSERT_INPUT_FACT = f"INSERT INTO {InputFact.TABLE_NAME} ({', '.join(InputFact._fields)}) VALUES (?,?,?,?,?)"
+
+
+class InputDataBatch:
+    """Column oriented InputData rows, for loads too big to hold as a tuple per row.
+
+    Counts are kept in int64 arrays and building, room and date strs are interned, so
+    a buffered row costs three pointers and three machine ints instead of a tuple, three
+    int objects and three fresh strs. Rows go to executemany straight from the columns.
+    """
+
+    __slots__ = ("building", "room_num", "times_accessed", "access_succeed", "access_fail", "date_entered")
+
+    insert_format: ClassVar[str] = INSERT_INPUT_FACT
+
+    def __init__(self) -> None:
+        """Create an empty batch."""
+        self.building: list[str] = []
+        self.room_num: list[str] = []
+        self.times_accessed = array("q")
+        self.access_succeed = array("q")
+        self.access_fail = array("q")
+        self.date_entered: list[str] = []
+
+    def __len__(self) -> int:
+        """Count rows in the batch."""
+        return len(self.date_entered)
+
+    def __getitem__(self, i: int) -> InputData:
+        """Get one row back as an InputData tuple."""
+        return InputData(
+            self.building[i],
+            self.room_num[i],
+            self.times_accessed[i],
+            self.access_succeed[i],
+            self.access_fail[i],
+            self.date_entered[i],
+        )
+
+    def __iter__(self) -> Iterator[InputData]:
+        """Iterate over the rows as InputData tuples."""
+        return map(InputData._make, zip(*self._columns(), strict=True))
+
+    def _columns(self) -> tuple:
+        return (
+            self.building,
+            self.room_num,
+            self.times_accessed,
+            self.access_succeed,
+            self.access_fail,
+            self.date_entered,
+        )
+
+    @classmethod
+    def from_lists(cls, csv_lines: Iterable[list], errors: list[str] | None = None) -> Self:
+        """Create a batch from raw csv lines in InputData column order.
+
+        Bad lines raise ValueError like InputData.from_list, unless `errors` is given, then
+        a message per bad line is appended to it and the rest of the lines are kept.
+        """
+        batch = cls()
+        lines = list(csv_lines)
+        if errors is None:
+            good = lines
+        else:
+            good = [line for line in lines if len(line) == len(InputData._fields)]
+            errors.extend(f"unrecognized input str {line}" for line in lines if len(line) != len(InputData._fields))
+        if not good:
+            return batch
+        try:
+            batch.extend_columns(*zip(*good, strict=True))
+        except (ValueError, TypeError):
+            # some line is short or has a count that isn't a number, go line by line to find it
+            for line in good:
+                try:
+                    batch.append(InputData.from_list([str(cell) for cell in line]))
+                except ValueError as e:
+                    if errors is None:
+                        raise
+                    errors.append(str(e))
+        return batch
+
+    def extend_columns(
+        self,
+        building: Iterable,
+        room_num: Iterable,
+        times_accessed: Iterable,
+        access_succeed: Iterable,
+        access_fail: Iterable,
+        date_entered: Iterable,
+    ) -> None:
+        """Add rows given as one sequence per column, raises ValueError and adds nothing if a count or date is bad.
+
+        Dates are stored as ISO whichever format they come in, each distinct date is only parsed once.
+        """
+        # convert everything before touching the batch so a bad value can't leave columns of different lengths
+        dates = [str(value) for value in date_entered]
+        iso = {value: sys.intern(iso_date(value)) for value in set(dates)}
+        converted = (
+            [sys.intern(str(value)) for value in building],
+            [sys.intern(str(value)) for value in room_num],
+            array("q", map(int, times_accessed)),
+            array("q", map(int, access_succeed)),
+            array("q", map(int, access_fail)),
+            list(map(iso.__getitem__, dates)),
+        )
+        if len({len(column) for column in converted}) != 1:
+            msg = "columns have different lengths"
+            raise ValueError(msg)
+        for column, values in zip(self._columns(), converted, strict=True):
+            column.extend(values)
+
+    def append(self, row: InputData) -> None:
+        """Add one row."""
+        self.extend_columns(*([value] for value in row))
+
+    def extend(self, other: "InputDataBatch") -> None:
+        """Add every row of another batch."""
+        for column, values in zip(self._columns(), other._columns(), strict=True):
+            column.extend(values)
+
+    def room_ids(self, room_id: Callable[[str, str], int]) -> array:
+        """Resolve the room id of every row, room_id is called once per distinct building/room."""
+        keys = list(zip(self.building, self.room_num, strict=True))
+        ids = {key: room_id(*key) for key in dict.fromkeys(keys)}  # dict keeps first seen order for new rooms
+        return array("q", map(ids.__getitem__, keys))
+
+    def fact_rows(self, room_ids: array) -> Iterator[tuple[int, int, int, int, str]]:
+        """Get rows shaped like InputFact for executemany with insert_format, nothing is copied up front."""
+        return zip(room_ids, self.times_accessed, self.access_succeed, self.access_fail, self.date_entered, strict=True)
+
+
 class RoomLog(NamedTuple):
-    """Room to club relation table."""
+    """Room to club relation, room_log itself stores the room by room_id."""
 
     TABLE_NAME = "ROOM_LOG"
 
@@ -91,9 +265,8 @@ class RoomLog(NamedTuple):
 
     @property
     def insert_format(self) -> str:
-        """Create insert string to be used with sqlite db."""
-        cols = ", ".join(self._fields)
-        return f"INSERT INTO {self.TABLE_NAME} ({cols}) VALUES (?,?,?)"
+        """Create insert string to be used with sqlite db, first param is the room_id."""
+        return f"INSERT INTO {self.TABLE_NAME} (room_id, assigned_club) VALUES (?,?)"
 
     @classmethod
     def from_list(cls, csv_line: list[str]) -> Self:
@@ -1,9 +1,28 @@
+-- has to come before any table exists, for a db file that already had tables the VACUUM at the end applies it
+PRAGMA auto_vacuum = INCREMENTAL;
+
 DROP TABLE IF EXISTS club_data;
 DROP TABLE IF EXISTS input_data;
 DROP TABLE IF EXISTS room_log;
 DROP TABLE IF EXISTS auth;
 DROP TABLE IF EXISTS email_log;
 DROP TABLE IF EXISTS admin_emails;
+DROP TABLE IF EXISTS ingest_log;
+DROP TABLE IF EXISTS ingest_changes;
+DROP TABLE IF EXISTS rooms;
+DROP TABLE IF EXISTS building_aliases;
+DROP TABLE IF EXISTS archive_manifest;
+DROP TABLE IF EXISTS export_log;
+DROP TABLE IF EXISTS upload_jobs;
+DROP TABLE IF EXISTS attachment_log;
+DROP TABLE IF EXISTS backfill_log;
+DROP TABLE IF EXISTS schema_version;
+DROP TABLE IF EXISTS backup_log;
+DROP TABLE IF EXISTS maintenance_log;
+DROP TABLE IF EXISTS calendar;
+-- full text search tables, built by attendance_tracker/db/search.py once the tables below exist
+DROP TABLE IF EXISTS club_search;
+DROP TABLE IF EXISTS admin_email_search;
 
 CREATE TABLE club_data (
     club_name TEXT,
@@ -15,21 +34,34 @@ CREATE TABLE club_data (
     PRIMARY KEY (club_name)
 );
 
+CREATE TABLE rooms (
+    room_id INTEGER PRIMARY KEY,
+    building TEXT NOT NULL,
+    room_num INTEGER NOT NULL,
+    UNIQUE (building, room_num)
+);
+
+CREATE TABLE building_aliases (
+    alias TEXT COLLATE NOCASE,
+    building TEXT NOT NULL,
+    PRIMARY KEY (alias)
+);
+
 CREATE TABLE input_data (
-    building TEXT,
-    room_num INTEGER,
+    room_id INTEGER,
     times_accessed INTEGER,
     access_succeed INTEGER,
     access_fail INTEGER,
     date_entered TEXT,
-    PRIMARY KEY (building, room_num, date_entered)
+    PRIMARY KEY (room_id, date_entered),
+    FOREIGN KEY (room_id) REFERENCES rooms (room_id)
 );
 
 CREATE TABLE room_log (
-    building TEXT,
-    room_num INTEGER,
+    room_id INTEGER,
     assigned_club TEXT,
-    PRIMARY KEY (building, room_num),
+    PRIMARY KEY (room_id),
+    FOREIGN KEY (room_id) REFERENCES rooms (room_id),
     FOREIGN KEY (assigned_club) REFERENCES CLUB_DATA (club_name)
 );
 
@@ -44,8 +76,155 @@ CREATE TABLE email_log(
     PRIMARY KEY (email_id)
 );
 
+-- sha256 of every email attachment already loaded, the same csv sent twice is skipped
+CREATE TABLE attachment_log(
+    payload_hash TEXT,
+    filename TEXT,
+    email_id TEXT,
+    rows_loaded INTEGER,
+    loaded_at TEXT,
+    PRIMARY KEY (payload_hash)
+);
+
 CREATE TABLE admin_emails(
     admin_email Text,
     permanent Boolean,
     PRIMARY KEY (admin_email)
 );
+
+-- ingest_log down to maintenance_log are added to an older db by migration 5
+CREATE TABLE ingest_log(
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT,
+    rows_loaded INTEGER,
+    loaded_at TEXT
+);
+
+-- versions start at the current time in ms so a re-init never reuses a version
+-- that caches or snapshots built from the old db could still be holding on to
+INSERT INTO ingest_log (version, source, rows_loaded, loaded_at)
+VALUES (CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER), 'init', 0, datetime('now'));
+
+-- rooms and days each load touched, a version with no row here could have touched anything
+CREATE TABLE ingest_changes (
+    version INTEGER,
+    room_ids TEXT,
+    first_day TEXT,
+    last_day TEXT,
+    PRIMARY KEY (version)
+);
+
+-- one row per immutable gzipped csv partition of archived input_data rows
+CREATE TABLE archive_manifest (
+    month TEXT,
+    part INTEGER,
+    path TEXT NOT NULL,
+    rows_archived INTEGER,
+    first_day TEXT,
+    last_day TEXT,
+    room_ids TEXT,
+    checksum TEXT,
+    archived_at TEXT,
+    PRIMARY KEY (month, part)
+);
+
+-- one row per incremental export, watermark is the last input_data rowid written out
+CREATE TABLE export_log (
+    export_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT,
+    finished_at TEXT,
+    from_rowid INTEGER,
+    to_rowid INTEGER,
+    watermark INTEGER,
+    rows_exported INTEGER,
+    chunks INTEGER,
+    rows_purged INTEGER,
+    status TEXT
+);
+
+-- csv uploads waiting on or being loaded by the background job runner
+CREATE TABLE upload_jobs (
+    job_id TEXT,
+    filename TEXT,
+    spool_path TEXT,
+    status TEXT,
+    bytes_total INTEGER,
+    bytes_read INTEGER DEFAULT 0,
+    rows_read INTEGER DEFAULT 0,
+    rows_inserted INTEGER DEFAULT 0,
+    rows_rejected INTEGER DEFAULT 0,
+    errors TEXT,
+    error TEXT,
+    created_at TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    heartbeat REAL,
+    PRIMARY KEY (job_id)
+);
+
+-- files loaded by flask backfill, a file with the same size and mtime is not loaded again
+CREATE TABLE backfill_log (
+    path TEXT,
+    file_size INTEGER,
+    file_mtime INTEGER,
+    rows_inserted INTEGER,
+    rows_duplicate INTEGER,
+    loaded_at TEXT,
+    PRIMARY KEY (path)
+);
+
+-- one row per online backup, see attendance_tracker/db/backup.py
+CREATE TABLE backup_log (
+    backup_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT,
+    finished_at TEXT,
+    path TEXT,
+    status TEXT,
+    seconds REAL,
+    db_bytes INTEGER,
+    backup_bytes INTEGER,
+    restarts INTEGER,
+    error TEXT
+);
+
+-- one row per nightly maintenance run, see attendance_tracker/db/maintenance.py
+CREATE TABLE maintenance_log (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT,
+    seconds REAL,
+    bytes_before INTEGER,
+    bytes_after INTEGER,
+    freelist_before INTEGER,
+    freelist_after INTEGER,
+    steps TEXT,
+    status TEXT
+);
+
+-- one row per day, filled by attendance_tracker/db/calendar.py, migration 6
+CREATE TABLE calendar (
+    day TEXT,
+    week TEXT,
+    month TEXT,
+    term TEXT,
+    term_start TEXT,
+    PRIMARY KEY (day)
+) WITHOUT ROWID;
+
+-- covering index for date range scans, migration 2
+CREATE INDEX input_data_by_date ON input_data (date_entered, room_id, times_accessed);
+
+-- readers keep going while a load is written, migration 3
+PRAGMA journal_mode = WAL;
+
+-- migrations applied to this db, init-db marks every one applied since this script is kept up to date
+CREATE TABLE schema_version (
+    version INTEGER,
+    name TEXT,
+    applied_at TEXT,
+    backfill_rowid INTEGER,
+    finished_at TEXT,
+    PRIMARY KEY (version)
+);
+
+-- every table was just emptied so this is instant, and it switches on auto_vacuum from the top, migration 4
+VACUUM;
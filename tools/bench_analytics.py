@@ -0,0 +1,103 @@
+"""Compare sql and columnar analytics backends on generated data.
+
+Run from the repo root, needs the columnar extra installed:
+    python tools/bench_analytics.py --rooms 100 --days 1825
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable
+
+from attendance_tracker.analytics.columnar import ColumnarSnapshot
+from attendance_tracker.controllers.analytics import _room_activity_result, _usage_result
+from attendance_tracker.db import calendar, rooms
+from attendance_tracker.db.connection import connect_read_only
+from attendance_tracker.db.ingest_log import record_ingest
+from attendance_tracker.db.rooms import RoomLookup
+from attendance_tracker.db.upload_jobs import insert_rows
+from attendance_tracker.types import tables
+
+
+def _build_db(db_path: Path, num_rooms: int, num_days: int) -> None:
+    """Set up a db the way init-db does, then fill it with one row per room per day."""
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.executescript(Path("./sqlite/init.sql").read_text(encoding="utf-8"))
+        rooms.seed_aliases(conn)
+        calendar.fill(conn)  # room activity series are built against this, empty it would chart nothing
+        today = date.today()
+        rows = tables.InputDataBatch()
+        for d in range(num_days):
+            # every other day comes in as an email csv would have it, ingest stores both the same way
+            day = (today - timedelta(days=d)).strftime("%Y-%m-%d" if d % 2 else "%-m/%-d/%Y")
+            accessed = [random.randint(0, 40) for _ in range(num_rooms)]
+            rows.extend_columns(
+                ["Bench"] * num_rooms,
+                range(101, 101 + num_rooms),
+                accessed,
+                accessed,
+                [0] * num_rooms,
+                [day] * num_rooms,
+            )
+        inserted, _ = insert_rows(conn, RoomLookup(conn), rows)
+        record_ingest(conn, "bench", inserted)
+
+
+def _time(func: Callable[[], object], repeat: int) -> float:
+    """Best of `repeat` runs in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    """Generate data, build the snapshot and print timings for each backend."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        _build_db(db_path, args.rooms, args.days)
+        snapshot = ColumnarSnapshot(Path(tmp) / "columnar")
+        start = time.perf_counter()
+        snapshot.refresh(db_path)
+        print(f"{args.rooms * args.days} rows, snapshot built in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+        end = date.today().strftime("%Y-%m-%d")
+        with closing(connect_read_only(db_path, query_timeout=600)) as conn:
+            cases: dict[str, Callable[..., object]] = {}
+            for label, days in [("2 weeks", 14), ("3 months", 91), ("1 year", 365), ("all", args.days)]:
+                begin = (date.today() - timedelta(days=days)).strftime("%Y-%m-%d")
+                cases[f"usage {label}"] = lambda s=None, b=begin: _usage_result(conn, b, end, True, s)
+                cases[f"room_activity {label}"] = lambda s=None, b=begin: _room_activity_result(
+                    conn, "Bench", 101, b, end, s
+                )
+
+            # timings of a backend giving different answers would mean nothing
+            for name, run in cases.items():
+                if run() != run(snapshot):
+                    msg = f"{name}: sql and columnar backends returned different results"
+                    raise AssertionError(msg)
+
+            print(f"{'query':<28}{'sql ms':>10}{'columnar ms':>14}")
+            for name, run in cases.items():
+                sql_ms = _time(run, args.repeat)
+                columnar_ms = _time(lambda r=run: r(snapshot), args.repeat)
+                print(f"{name:<28}{sql_ms:>10.2f}{columnar_ms:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()